@@ -1,16 +1,33 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .models import CustomUser, Follow
 
 class CustomUserAdmin(UserAdmin):
     model = CustomUser
     list_display = ['username', 'email', 'is_staff', 'date_joined']
     list_filter = ['is_staff', 'is_active', 'date_joined']
     fieldsets = UserAdmin.fieldsets + (
-        (None, {'fields': ('bio', 'profile_picture', 'followers')}),
+        (None, {'fields': ('bio', 'profile_picture')}),
     )
     add_fieldsets = UserAdmin.add_fieldsets + (
         (None, {'fields': ('email', 'bio', 'profile_picture')}),
     )
 
-admin.site.register(CustomUser, CustomUserAdmin)
\ No newline at end of file
+admin.site.register(CustomUser, CustomUserAdmin)
+
+@admin.register(Follow)
+class FollowAdmin(admin.ModelAdmin):
+    # Read-only: follows go through accounts.services, which keeps the
+    # counters, feeds and notifications in step
+    list_display = ['to_customuser', 'from_customuser', 'created_at']
+    list_select_related = ['to_customuser', 'from_customuser']
+    raw_id_fields = ['from_customuser', 'to_customuser']
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+    
+    def has_delete_permission(self, request, obj=None):
+        return False
@@ -0,0 +1,140 @@
+"""
+JWT authentication that resolves users from a cache.
+
+Users are cached pickled under a key holding their id and a version token.
+Anything that changes a user (a save, which covers password changes and
+deactivation, a delete, or a counter UPDATE from accounts.counters)
+replaces the token, so every cached copy is dropped at once. The token is
+replaced when the change is made and again when it commits, so a request
+racing the transaction cannot cache the old row under the new token.
+
+Each process also keeps an LRU of AUTH_USER_CACHE_LOCAL_SIZE users for
+AUTH_USER_CACHE_LOCAL_TIMEOUT seconds in front of the shared cache. Other
+processes therefore see a change at most that many seconds late.
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.settings import api_settings
+
+
+def cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_TIMEOUT', 300)
+
+
+def local_cache_timeout():
+    return getattr(settings, 'AUTH_USER_CACHE_LOCAL_TIMEOUT', 5)
+
+
+def local_cache_size():
+    return getattr(settings, 'AUTH_USER_CACHE_LOCAL_SIZE', 1000)
+
+
+def _version_key(user_id):
+    return f'accounts:user-version:{user_id}'
+
+
+def _user_key(user_id, version):
+    return f'accounts:user:{user_id}:{version}'
+
+
+class LocalUserCache:
+    """Bounded, thread-safe LRU of pickled users with a time to live"""
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, user_id):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return None
+            expires, data = entry
+            if expires < time.monotonic():
+                del self.entries[user_id]
+                return None
+            self.entries.move_to_end(user_id)
+            return data
+
+    def set(self, user_id, data):
+        with self.lock:
+            self.entries[user_id] = (time.monotonic() + local_cache_timeout(), data)
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > local_cache_size():
+                self.entries.popitem(last=False)
+
+    def discard(self, user_ids):
+        with self.lock:
+            for user_id in user_ids:
+                self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+local_users = LocalUserCache()
+
+
+def _version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), uuid.uuid4().hex, cache_timeout())
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+def get_cached_user(user_id, load):
+    """The user ``user_id`` from the caches, or from ``load()`` on a miss"""
+    data = local_users.get(user_id)
+    if data is None:
+        # Read the version first: a change committed during load() replaces
+        # it, and the row loaded here is then cached under a stale key
+        key = _user_key(user_id, _version(user_id))
+        data = cache.get(key)
+        if data is None:
+            data = pickle.dumps(load())
+            cache.set(key, data, cache_timeout())
+        local_users.set(user_id, data)
+    # Every request gets its own copy to modify
+    return pickle.loads(data)
+
+
+def invalidate_cached_users(user_ids):
+    """Drop cached copies of ``user_ids`` now and when the transaction commits"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def invalidate():
+        local_users.discard(user_ids)
+        cache.set_many(
+            {_version_key(user_id): uuid.uuid4().hex for user_id in user_ids},
+            cache_timeout()
+        )
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication resolving users through the user cache"""
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+        # Inactive users and revoked tokens are rejected by the uncached
+        # lookup; deactivation and password changes invalidate the cache
+        return get_cached_user(
+            validated_token[api_settings.USER_ID_CLAIM],
+            partial(super().get_user, validated_token)
+        )
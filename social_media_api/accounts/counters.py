@@ -0,0 +1,101 @@
+"""
+Denormalized follower/following counters on CustomUser.
+
+A follow change moves the counters of both users with single UPDATE
+statements using F() expressions, so concurrent follows never overwrite
+each other; the same statements touch ``updated_at``, which invalidates
+cached representations of the users, and cached authenticated users are
+dropped (see accounts.authentication). ``reconcile`` repairs any drift
+against the follow table in batches.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .authentication import invalidate_cached_users
+from .models import CustomUser, Follow
+
+
+def _delta(field, amount):
+    if amount < 0:
+        return Greatest(F(field) + amount, Value(0))
+    return F(field) + amount
+
+
+def adjust(user_ids, followers=0, following=0):
+    """Atomically add the deltas to every user in ``user_ids``"""
+    updates = {'updated_at': timezone.now()}
+    if followers:
+        updates['followers_count'] = _delta('followers_count', followers)
+    if following:
+        updates['following_count'] = _delta('following_count', following)
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    invalidate_cached_users(user_ids)
+    return CustomUser.objects.filter(pk__in=user_ids).update(**updates)
+
+
+def followed(followee_ids, follower_ids):
+    """Count new follows of every followee by every follower"""
+    adjust(followee_ids, followers=len(follower_ids))
+    adjust(follower_ids, following=len(followee_ids))
+
+
+def unfollowed(followee_ids, follower_ids):
+    """Count removed follows of every followee by every follower"""
+    adjust(followee_ids, followers=-len(follower_ids))
+    adjust(follower_ids, following=-len(followee_ids))
+
+
+def _actual_count(field):
+    return Coalesce(
+        Subquery(
+            Follow.objects.filter(**{field: OuterRef('pk')})
+            .order_by()
+            .values(field)
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def reconcile(batch_size=1000, user_ids=None):
+    """
+    Recompute counters that drifted from the follow table.
+    Yields ``(checked, repaired)`` after each batch.
+    """
+    queryset = CustomUser.objects.order_by('pk')
+    if user_ids is not None:
+        queryset = queryset.filter(pk__in=user_ids)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .annotate(
+                actual_followers=_actual_count('from_customuser'),
+                actual_following=_actual_count('to_customuser')
+            )
+            .values_list(
+                'pk', 'followers_count', 'following_count',
+                'actual_followers', 'actual_following'
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+
+        drifted = [
+            pk for pk, followers, following, actual_followers, actual_following in batch
+            if followers != actual_followers or following != actual_following
+        ]
+        if drifted:
+            # Recount inside the UPDATE so follows racing with the check win
+            invalidate_cached_users(drifted)
+            CustomUser.objects.filter(pk__in=drifted).update(
+                followers_count=_actual_count('from_customuser'),
+                following_count=_actual_count('to_customuser'),
+                updated_at=timezone.now()
+            )
+        yield len(batch), len(drifted)
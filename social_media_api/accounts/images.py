@@ -0,0 +1,120 @@
+"""
+Profile picture processing.
+
+Uploads are stored as they are and queued (``profile_picture_status =
+'pending'``, see CustomUser.save). The process_profile_pictures worker
+turns each one into square variants of PROFILE_PICTURE_SIZES pixels in
+PROFILE_PICTURE_FORMAT (WEBP or JPEG). Variants are re-encoded from the
+pixels alone, so EXIF data such as GPS positions is dropped (after
+applying the EXIF orientation). They are stored under content-hashed names:
+identical pictures share files, and URLs never serve stale content.
+
+Results are written only while the user still has the picture that was
+processed, so a new upload during processing is never overwritten.
+"""
+import hashlib
+import io
+import logging
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .authentication import invalidate_cached_users
+from .models import CustomUser
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+
+def picture_sizes():
+    return getattr(settings, 'PROFILE_PICTURE_SIZES', {'small': 64, 'medium': 256})
+
+
+def picture_format():
+    return getattr(settings, 'PROFILE_PICTURE_FORMAT', 'WEBP')
+
+
+def max_pixels():
+    return getattr(settings, 'PROFILE_PICTURE_MAX_PIXELS', 40_000_000)
+
+
+def encode_variant(image, size, image_format):
+    """``image`` cropped to a ``size`` pixel square, encoded without metadata"""
+    variant = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+    if image_format == 'JPEG' and variant.mode != 'RGB':
+        # JPEG has no alpha channel: flatten onto white
+        background = Image.new('RGB', variant.size, 'white')
+        background.paste(variant, mask=variant.getchannel('A') if 'A' in variant.getbands() else None)
+        variant = background
+    variant.info = {}
+    output = io.BytesIO()
+    variant.save(output, format=image_format, quality=85)
+    return output.getvalue()
+
+
+def store_variant(data, size, image_format):
+    """Save ``data`` under its content hash; returns the storage name"""
+    digest = hashlib.sha256(data).hexdigest()[:20]
+    name = f'profile_pics/{size}/{digest}.{EXTENSIONS[image_format]}'
+    if not default_storage.exists(name):
+        name = default_storage.save(name, ContentFile(data))
+    return name
+
+
+def make_variants(name):
+    """Storage names of the variants of the picture ``name``, by size name"""
+    with default_storage.open(name) as source:
+        image = Image.open(source)
+        if image.width * image.height > max_pixels():
+            raise ValueError(f'{image.width}x{image.height} pixels is too large')
+        image = ImageOps.exif_transpose(image)
+        has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+        image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    image_format = picture_format()
+    return {
+        size_name: store_variant(encode_variant(image, size, image_format), size, image_format)
+        for size_name, size in picture_sizes().items()
+    }
+
+
+def process_profile_picture(user_id, name):
+    """
+    Make the variants of ``user_id``'s picture ``name``. Returns whether
+    they were stored; False when the picture changed meanwhile.
+    """
+    try:
+        variants = make_variants(name)
+        updates = {
+            'profile_picture_small': variants['small'],
+            'profile_picture_medium': variants['medium'],
+            'profile_picture_status': 'ready',
+        }
+    except Exception:
+        logger.exception('Could not process profile picture %s of user %s', name, user_id)
+        updates = {'profile_picture_status': 'failed'}
+
+    updated = CustomUser.objects.filter(
+        pk=user_id,
+        profile_picture=name,
+        profile_picture_status='pending'
+    ).update(updated_at=timezone.now(), **updates)
+    if updated:
+        invalidate_cached_users([user_id])
+    return bool(updated) and updates['profile_picture_status'] == 'ready'
+
+
+def process_pending(batch_size=20):
+    """Process up to ``batch_size`` queued pictures; returns how many were found"""
+    pending = list(
+        CustomUser.objects.filter(profile_picture_status='pending')
+        .order_by('pk')
+        .values_list('pk', 'profile_picture')[:batch_size]
+    )
+    for user_id, name in pending:
+        process_profile_picture(user_id, name)
+    return len(pending)
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import images
+
+
+class Command(BaseCommand):
+    help = 'Background worker making the resized variants of uploaded profile pictures'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Process the pictures queued now and exit'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=5,
+            help='Seconds to wait before polling again when the queue is empty'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=20,
+            help='Number of pictures fetched from the queue at a time'
+        )
+
+    def handle(self, *args, **options):
+        processed = 0
+        while True:
+            found = images.process_pending(batch_size=options['batch_size'])
+            processed += found
+            if found:
+                self.stdout.write(f'Processed {processed} pictures...')
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['interval'])
+
+        self.stdout.write(self.style.SUCCESS(f'Processed {processed} pictures.'))
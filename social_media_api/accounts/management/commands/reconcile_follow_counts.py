@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from accounts import counters
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized follower/following counters on users'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of users checked per batch'
+        )
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only reconcile this user id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        checked = repaired = 0
+        for batch_checked, batch_repaired in counters.reconcile(
+            batch_size=options['batch_size'],
+            user_ids=options['user_ids']
+        ):
+            checked += batch_checked
+            repaired += batch_repaired
+            self.stdout.write(f'Checked {checked} users, repaired {repaired}...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {checked} users; {repaired} had drifted counters.'
+        ))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from accounts import suggestions
+
+
+class Command(BaseCommand):
+    help = 'Recompute "who to follow" suggestions from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every user, not only those whose neighborhood changed; '
+                 'done anyway once FOLLOW_SUGGESTIONS_FULL_REFRESH_INTERVAL has passed'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=500,
+            help='Number of users whose suggestions are replaced per transaction'
+        )
+
+    def handle(self, *args, **options):
+        since = None if options['all'] else suggestions.last_refreshed()
+        if since is not None and suggestions.full_refresh_due():
+            # Follower counts changed since then have made scores drift
+            since = None
+        user_ids = None if since is None else suggestions.changed_user_ids(since)
+        if user_ids is None:
+            self.stdout.write('Recomputing suggestions for every user...')
+        else:
+            self.stdout.write(f'Recomputing suggestions for {len(user_ids)} changed users...')
+
+        users = stored = 0
+        for batch_users, batch_stored in suggestions.refresh(
+            user_ids, batch_size=options['batch_size']
+        ):
+            users += batch_users
+            stored += batch_stored
+            self.stdout.write(f'Processed {users} users, {stored} suggestions...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Stored {stored} suggestions for {users} users.'
+        ))
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:24
+
+from django.db import migrations, models
+
+
+def queue_existing_pictures(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    CustomUser.objects.exclude(profile_picture='').exclude(profile_picture=None).update(
+        profile_picture_status='pending'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_followsuggestion'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_medium',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='profile_pics/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_small',
+            field=models.ImageField(blank=True, editable=False, null=True, upload_to='profile_pics/'),
+        ),
+        migrations.AddField(
+            model_name='customuser',
+            name='profile_picture_status',
+            field=models.CharField(blank=True, choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], editable=False, max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(condition=models.Q(('profile_picture_status', 'pending')), fields=['id'], name='accounts_pending_picture_idx'),
+        ),
+        migrations.RunPython(queue_existing_pictures, migrations.RunPython.noop),
+    ]
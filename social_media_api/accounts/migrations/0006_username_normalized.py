@@ -0,0 +1,91 @@
+# Generated by Django 4.2.7 on 2026-10-18 04:29
+
+import unicodedata
+
+from django.db import migrations, models
+
+
+def normalize_username(value):
+    return unicodedata.normalize('NFKC', value or '').casefold()
+
+
+def populate_username_normalized(apps, schema_editor):
+    CustomUser = apps.get_model('accounts', 'CustomUser')
+    user_ids = list(CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+    for start in range(0, len(user_ids), 1000):
+        users = list(CustomUser.objects.filter(pk__in=user_ids[start:start + 1000]).only('pk', 'username'))
+        for user in users:
+            user.username_normalized = normalize_username(user.username)
+        CustomUser.objects.bulk_update(users, ['username_normalized'])
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on one database vendor"""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, (self.vendor, *args), kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0005_profile_picture_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='username_normalized',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=150),
+        ),
+        migrations.RunPython(populate_username_normalized, migrations.RunPython.noop),
+        VendorRunSQL(
+            'sqlite',
+            sql=[
+                "CREATE VIRTUAL TABLE accounts_customuser_fts USING fts5("
+                "username_normalized, content='accounts_customuser', content_rowid='id', "
+                "tokenize='trigram')",
+                "CREATE TRIGGER accounts_customuser_fts_ai AFTER INSERT ON accounts_customuser BEGIN "
+                "INSERT INTO accounts_customuser_fts(rowid, username_normalized) "
+                "VALUES (new.id, new.username_normalized); END",
+                "CREATE TRIGGER accounts_customuser_fts_ad AFTER DELETE ON accounts_customuser BEGIN "
+                "INSERT INTO accounts_customuser_fts(accounts_customuser_fts, rowid, username_normalized) "
+                "VALUES ('delete', old.id, old.username_normalized); END",
+                "CREATE TRIGGER accounts_customuser_fts_au AFTER UPDATE OF username_normalized "
+                "ON accounts_customuser BEGIN "
+                "INSERT INTO accounts_customuser_fts(accounts_customuser_fts, rowid, username_normalized) "
+                "VALUES ('delete', old.id, old.username_normalized); "
+                "INSERT INTO accounts_customuser_fts(rowid, username_normalized) "
+                "VALUES (new.id, new.username_normalized); END",
+                "INSERT INTO accounts_customuser_fts(accounts_customuser_fts) VALUES ('rebuild')",
+            ],
+            reverse_sql=[
+                'DROP TRIGGER IF EXISTS accounts_customuser_fts_au',
+                'DROP TRIGGER IF EXISTS accounts_customuser_fts_ad',
+                'DROP TRIGGER IF EXISTS accounts_customuser_fts_ai',
+                'DROP TABLE IF EXISTS accounts_customuser_fts',
+            ],
+        ),
+        VendorRunSQL(
+            'postgresql',
+            sql=[
+                'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+                'CREATE INDEX accounts_customuser_username_trgm_idx '
+                'ON accounts_customuser USING GIN (username_normalized gin_trgm_ops)',
+            ],
+            reverse_sql=['DROP INDEX IF EXISTS accounts_customuser_username_trgm_idx'],
+        ),
+    ]
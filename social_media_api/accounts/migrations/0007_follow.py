@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_username_normalized'),
+    ]
+
+    operations = [
+        # The table of the auto-created through model becomes the table of
+        # Follow as it is; only the migration state changes
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='Follow',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('from_customuser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='follower_relations', to=settings.AUTH_USER_MODEL)),
+                        ('to_customuser', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='following_relations', to=settings.AUTH_USER_MODEL)),
+                    ],
+                    options={
+                        'db_table': 'accounts_customuser_followers',
+                        'unique_together': {('from_customuser', 'to_customuser')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='customuser',
+                    name='followers',
+                    field=models.ManyToManyField(blank=True, related_name='following', through='accounts.Follow', through_fields=('from_customuser', 'to_customuser'), to=settings.AUTH_USER_MODEL),
+                ),
+            ],
+        ),
+        # Nullable at first: adding it does not rewrite the table, and
+        # processes still running the previous code insert follows without it
+        migrations.AddField(
+            model_name='follow',
+            name='created_at',
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from django.db import migrations, models, transaction
+from django.utils import timezone
+
+
+def backfill_created_at(apps, schema_editor):
+    """
+    Stamp follows made before created_at existed, one short transaction per
+    batch. Their real time is unknown: they all get the time the backfill
+    started, which sorts them before every later follow and, by id, in the
+    order they were made.
+    """
+    Follow = apps.get_model('accounts', 'Follow')
+    started_at = timezone.now()
+    while True:
+        with transaction.atomic():
+            batch = list(
+                Follow.objects.filter(created_at=None).order_by('pk').values_list('pk', flat=True)[:5000]
+            )
+            if not batch:
+                return
+            Follow.objects.filter(pk__in=batch).update(created_at=started_at)
+
+
+class AddIndexConcurrently(migrations.AddIndex):
+    """Builds the index without blocking writes on PostgreSQL"""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        model = to_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.add_index(model, self.index, concurrently=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        model = from_state.apps.get_model(app_label, self.model_name)
+        if self.allow_migrate_model(schema_editor.connection.alias, model):
+            schema_editor.remove_index(model, self.index, concurrently=True)
+
+
+class Migration(migrations.Migration):
+
+    # Batches and concurrent index builds cannot run inside one transaction
+    atomic = False
+
+    dependencies = [
+        ('accounts', '0007_follow'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_created_at, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='follow',
+            name='created_at',
+            field=models.DateTimeField(default=timezone.now),
+        ),
+        AddIndexConcurrently(
+            model_name='follow',
+            index=models.Index(fields=['from_customuser', 'created_at', 'id', 'to_customuser'], name='accounts_followers_newest_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='follow',
+            index=models.Index(fields=['to_customuser', 'created_at', 'id', 'from_customuser'], name='accounts_following_newest_idx'),
+        ),
+    ]
@@ -2,35 +2,101 @@ from django.contrib.auth.models import AbstractUser
 from django.db import models
 from django.db.models.signals import post_save
 from django.dispatch import receiver
+from django.utils import timezone
+
+# Marks a user loaded without its profile_picture column
+_DEFERRED = object()
 
 class CustomUser(AbstractUser):
+    PICTURE_STATUSES = (
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    )
+    
+    # Case-folded username matched by autocomplete (see accounts.search)
+    username_normalized = models.CharField(max_length=150, blank=True, editable=False, db_index=True)
     bio = models.TextField(max_length=500, blank=True)
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True)
+    # Resized copies of profile_picture, made by the process_profile_pictures
+    # worker (see accounts.images)
+    profile_picture_small = models.ImageField(upload_to='profile_pics/', blank=True, null=True, editable=False)
+    profile_picture_medium = models.ImageField(upload_to='profile_pics/', blank=True, null=True, editable=False)
+    profile_picture_status = models.CharField(max_length=10, choices=PICTURE_STATUSES, blank=True, editable=False)
     followers = models.ManyToManyField(
         'self',
         symmetrical=False,
         related_name='following',
+        through='Follow',
+        through_fields=('from_customuser', 'to_customuser'),
         blank=True
     )
+    # Denormalized follow counters, kept in sync by accounts.signals /
+    # accounts.counters
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Also touched when the user follows or is followed (see accounts.signals)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            models.Index(
+                fields=['id'],
+                condition=models.Q(profile_picture_status='pending'),
+                name='accounts_pending_picture_idx'
+            ),
+        ]
     
     def __str__(self):
         return self.username
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_profile_picture = instance.__dict__.get('profile_picture', _DEFERRED) or None
+        return instance
+    
+    def save(self, *args, **kwargs):
+        from .search import normalize_username
+        update_fields = kwargs.get('update_fields')
+        if 'username' in self.__dict__:
+            self.username_normalized = normalize_username(self.username)
+            if update_fields is not None and 'username' in update_fields:
+                kwargs['update_fields'] = update_fields = {*update_fields, 'username_normalized'}
+        
+        loaded = getattr(self, '_loaded_profile_picture', None)
+        changed = (
+            loaded is not _DEFERRED
+            and 'profile_picture' in self.__dict__
+            and (self.profile_picture.name or None) != loaded
+        )
+        if changed:
+            # Queue the new picture for processing; the old variants go
+            self.profile_picture_small = None
+            self.profile_picture_medium = None
+            self.profile_picture_status = 'pending' if self.profile_picture else ''
+            if update_fields is not None:
+                kwargs['update_fields'] = {
+                    *update_fields, 'profile_picture_small',
+                    'profile_picture_medium', 'profile_picture_status'
+                }
+        super().save(*args, **kwargs)
+        if 'profile_picture' in self.__dict__:
+            self._loaded_profile_picture = self.profile_picture.name or None
+    
     def follow(self, user):
         """Follow another user"""
-        if user != self and user not in self.following.all():
-            self.following.add(user)
-            # Create follow notification
-            self._create_follow_notification(user)
-            return True
-        return False
+        from .services import follow_user
+        if user == self:
+            return False
+        created, _ = follow_user(self, user)
+        return created
     
     def unfollow(self, user):
         """Unfollow a user"""
-        if user in self.following.all():
-            self.following.remove(user)
-            return True
-        return False
+        from .services import unfollow_user
+        deleted, _ = unfollow_user(self, user)
+        return deleted
     
     def is_following(self, user):
         """Check if the current user is following the given user"""
@@ -40,35 +106,82 @@ class CustomUser(AbstractUser):
         """Check if the current user is followed by the given user"""
         return self.followers.filter(id=user.id).exists()
     
-    def _create_follow_notification(self, user):
-        """Create follow notification"""
-        try:
-            from notifications.models import Notification
-            Notification.create_follow_notification(recipient=user, actor=self)
-        except:
-            # Notifications app might not be ready during migration
-            pass
-    
-    @property
-    def followers_count(self):
-        return self.followers.count()
-    
-    @property
-    def following_count(self):
-        return self.following.count()
-    
     def get_feed_posts(self):
         """Get posts from users that the current user follows"""
-        from posts.models import Post
-        following_ids = self.following.values_list('id', flat=True)
-        # Include user's own posts in the feed
-        following_ids = list(following_ids) + [self.id]
-        return Post.objects.filter(author_id__in=following_ids).order_by('-created_at')
+        from posts.feed import get_feed_queryset
+        # Includes the user's own posts; read from the materialized feed
+        return get_feed_queryset(self)
     
     def get_unread_notifications_count(self):
         """Get count of unread notifications"""
         try:
-            from notifications.models import Notification
-            return Notification.objects.filter(recipient=self, is_read=False).count()
+            from notifications.counters import get_counts
+            return get_counts(self.pk)[0]
         except:
-            return 0
\ No newline at end of file
+            return 0
+
+class Follow(models.Model):
+    """
+    One user following another: the through model of ``CustomUser.followers``.
+    It keeps the table and field names of the auto-created through model it
+    replaced, so ``from_customuser`` is the followed user and
+    ``to_customuser`` the follower.
+    """
+    from_customuser = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='follower_relations'
+    )
+    to_customuser = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='following_relations'
+    )
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    class Meta:
+        db_table = 'accounts_customuser_followers'
+        unique_together = ['from_customuser', 'to_customuser']
+        # Followers/following of a user, newest first, read from the index
+        # alone (see UserFollowersView, UserFollowingView)
+        indexes = [
+            models.Index(
+                fields=['from_customuser', 'created_at', 'id', 'to_customuser'],
+                name='accounts_followers_newest_idx'
+            ),
+            models.Index(
+                fields=['to_customuser', 'created_at', 'id', 'from_customuser'],
+                name='accounts_following_newest_idx'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.to_customuser_id} follows {self.from_customuser_id}"
+
+
+class FollowSuggestion(models.Model):
+    """A precomputed "who to follow" suggestion (see accounts.suggestions)"""
+    user = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='follow_suggestions'
+    )
+    suggested = models.ForeignKey(
+        CustomUser,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    # Number of users followed by ``user`` who follow ``suggested``
+    mutual_count = models.PositiveIntegerField()
+    score = models.FloatField()
+    computed_at = models.DateTimeField()
+    
+    class Meta:
+        ordering = ['-score', 'id']
+        unique_together = ['user', 'suggested']
+        indexes = [
+            models.Index(fields=['user', '-score']),
+        ]
+    
+    def __str__(self):
+        return f"{self.suggested} for {self.user}"
@@ -0,0 +1,102 @@
+from django.contrib.auth import get_user_model
+
+
+class RelationshipResolver:
+    """
+    Follow relationships between the viewer and the users rendered in one
+    response.
+
+    ``prime()`` queues the user ids of a whole page; they are loaded
+    together, with a fixed number of queries, the first time any of them is
+    looked up. Nothing is queried when no serializer asks for the data.
+    """
+
+    def __init__(self, viewer):
+        self.viewer = viewer if viewer is not None and viewer.is_authenticated else None
+        self.following_ids = set()
+        self.follower_ids = set()
+        self._pending_relations = set()
+        self._loaded_relations = set()
+
+    def prime(self, user_ids):
+        user_ids = {user_id for user_id in user_ids if user_id is not None}
+        self._pending_relations |= user_ids - self._loaded_relations
+
+    def _through(self):
+        return get_user_model().followers.through
+
+    def _load_relations(self, user_id):
+        missing = (self._pending_relations | {user_id}) - self._loaded_relations
+        self._pending_relations = set()
+        if not missing:
+            return
+        self._loaded_relations |= missing
+
+        through = self._through()
+        self.following_ids.update(
+            through.objects.filter(
+                to_customuser_id=self.viewer.pk,
+                from_customuser_id__in=missing
+            ).values_list('from_customuser_id', flat=True)
+        )
+        self.follower_ids.update(
+            through.objects.filter(
+                from_customuser_id=self.viewer.pk,
+                to_customuser_id__in=missing
+            ).values_list('to_customuser_id', flat=True)
+        )
+
+    def is_following(self, user):
+        """Whether the viewer follows ``user`` (a user or a user id)"""
+        if self.viewer is None:
+            return False
+        user_id = getattr(user, 'pk', user)
+        self._load_relations(user_id)
+        return user_id in self.following_ids
+
+    def is_followed_by(self, user):
+        """Whether ``user`` (a user or a user id) follows the viewer"""
+        if self.viewer is None:
+            return False
+        user_id = getattr(user, 'pk', user)
+        self._load_relations(user_id)
+        return user_id in self.follower_ids
+
+
+def get_relationships(context):
+    """The resolver shared by every serializer rendering with ``context``"""
+    resolver = context.get('relationships')
+    if resolver is None:
+        request = context.get('request')
+        # Public (cached) representations are rendered without a viewer
+        viewer = None if context.get('public') else getattr(request, 'user', None)
+        resolver = RelationshipResolver(viewer)
+        context['relationships'] = resolver
+    return resolver
+
+
+def _user_representations(data):
+    if isinstance(data, dict):
+        if 'is_following' in data or 'is_followed_by' in data:
+            yield data
+        for value in data.values():
+            yield from _user_representations(value)
+    elif isinstance(data, list):
+        for value in data:
+            yield from _user_representations(value)
+
+
+def add_relationships(context, data):
+    """
+    Fill ``is_following``/``is_followed_by`` of every user representation
+    nested in ``data`` (e.g. cached, viewer-independent output) for the
+    viewer of ``context``.
+    """
+    users = [user for user in _user_representations(data) if 'id' in user]
+    resolver = get_relationships(context)
+    resolver.prime(user['id'] for user in users)
+    for user in users:
+        if 'is_following' in user:
+            user['is_following'] = resolver.is_following(user['id'])
+        if 'is_followed_by' in user:
+            user['is_followed_by'] = resolver.is_followed_by(user['id'])
@@ -0,0 +1,172 @@
+"""
+Username autocomplete.
+
+Usernames are matched on ``username_normalized`` (NFKC, case folded),
+which ``CustomUser.save()`` keeps current and which has a B-tree index, so
+a prefix lookup reads only the matching range of the index in order:
+
+* SQLite: a ``>= prefix AND < next prefix`` range on the index.
+* PostgreSQL: ``LIKE 'prefix%'`` on the ``varchar_pattern_ops`` index
+  Django adds to indexed text columns.
+
+When the prefix matches too few users, queries of three characters or more
+are completed with fuzzy matches: trigram similarity (``pg_trgm``, GIN
+index) on PostgreSQL, substring matches from an FTS5 trigram table kept in
+sync by triggers on SQLite. Other engines only get prefix matches.
+
+Users the viewer follows come first. Prefix matches of short, hot prefixes
+are the same for every viewer and are cached for
+USER_AUTOCOMPLETE_CACHE_TIMEOUT seconds, so a username change may take
+that long to show up in them.
+"""
+import hashlib
+import unicodedata
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import BooleanField, FloatField
+from django.db.models.expressions import RawSQL
+
+from .models import CustomUser, Follow
+
+TABLE = 'accounts_customuser'
+FTS_TABLE = f'{TABLE}_fts'
+MIN_FUZZY_LENGTH = 3
+# Columns loaded for each suggested user
+FIELDS = ('id', 'username', 'username_normalized', 'profile_picture_small', 'followers_count')
+
+
+def max_results():
+    return getattr(settings, 'USER_AUTOCOMPLETE_MAX_RESULTS', 10)
+
+
+def cache_prefix_length():
+    return getattr(settings, 'USER_AUTOCOMPLETE_CACHE_PREFIX_LENGTH', 3)
+
+
+def cache_timeout():
+    return getattr(settings, 'USER_AUTOCOMPLETE_CACHE_TIMEOUT', 60)
+
+
+def normalize_username(value):
+    return unicodedata.normalize('NFKC', value or '').casefold()
+
+
+def normalize_query(value):
+    return normalize_username((value or '').strip().lstrip('@'))
+
+
+def _sqlite_triggers():
+    """The FTS5 sync triggers created by migration accounts.0006_username_normalized"""
+    column = 'username_normalized'
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}(rowid, {column}) VALUES (new.id, new.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {column}) VALUES ('delete', old.id, old.{column}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {column} ON {TABLE} BEGIN "
+        f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {column}) VALUES ('delete', old.id, old.{column}); "
+        f"INSERT INTO {FTS_TABLE}(rowid, {column}) VALUES (new.id, new.{column}); END",
+    ]
+
+
+def repair_username_triggers(connection):
+    """Recreate FTS5 sync triggers dropped by SQLite table rebuilds"""
+    if connection.vendor != 'sqlite':
+        return
+    if FTS_TABLE in connection.introspection.table_names():
+        with connection.cursor() as cursor:
+            for statement in _sqlite_triggers():
+                cursor.execute(statement)
+
+
+def _users():
+    return CustomUser.objects.filter(is_active=True).only(*FIELDS)
+
+
+def _prefix_filter(queryset, prefix):
+    if connections[queryset.db].vendor == 'sqlite':
+        # SQLite only uses an index for LIKE with case-sensitive matching
+        upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        return queryset.filter(username_normalized__gte=prefix, username_normalized__lt=upper)
+    return queryset.filter(username_normalized__startswith=prefix)
+
+
+def prefix_matches(prefix, limit):
+    """Active users whose username starts with ``prefix``, alphabetically"""
+    def load():
+        users = _prefix_filter(_users(), prefix)
+        return list(users.order_by('username_normalized', 'id')[:limit])
+
+    if len(prefix) > cache_prefix_length():
+        return load()
+    key = f'accounts:autocomplete:{limit}:{hashlib.sha1(prefix.encode()).hexdigest()}'
+    users = cache.get(key)
+    if users is None:
+        users = load()
+        cache.set(key, users, cache_timeout())
+    return users
+
+
+def followed_prefix_matches(viewer, prefix, limit):
+    """Users followed by ``viewer`` whose username starts with ``prefix``"""
+    users = _prefix_filter(_users().filter(followers=viewer), prefix)
+    return list(users.order_by('username_normalized', 'id')[:limit])
+
+
+def fuzzy_matches(query, limit, exclude_ids=()):
+    """Users whose username resembles ``query``, best match first"""
+    if len(query) < MIN_FUZZY_LENGTH:
+        return []
+    users = _users().exclude(pk__in=exclude_ids)
+    vendor = connections[users.db].vendor
+    if vendor == 'sqlite':
+        match = '"{}"'.format(query.replace('"', '""'))
+        users = users.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (match,))
+        ).annotate(match_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND {FTS_TABLE}.rowid = {TABLE}.id',
+            (match,),
+            output_field=FloatField()
+        ))
+    elif vendor == 'postgresql':
+        users = users.filter(RawSQL(
+            f'{TABLE}.username_normalized %% %s', (query,), output_field=BooleanField()
+        )).annotate(match_rank=RawSQL(
+            f'similarity({TABLE}.username_normalized, %s)', (query,), output_field=FloatField()
+        ))
+    else:
+        return []
+    return list(users.order_by('-match_rank', 'username_normalized')[:limit])
+
+
+def autocomplete(viewer, query, limit=None):
+    """
+    Up to ``limit`` users matching ``query``: followed users first, then
+    other prefix matches, then fuzzy matches (followed ones first). Each
+    user has ``followed_by_viewer`` set.
+    """
+    limit = min(limit or max_results(), max_results())
+    query = normalize_query(query)
+    if not query:
+        return []
+
+    followed = followed_prefix_matches(viewer, query, limit) if viewer.is_authenticated else []
+    followed_ids = {user.pk for user in followed}
+    users = followed + [user for user in prefix_matches(query, limit) if user.pk not in followed_ids]
+    users = users[:limit]
+    if len(users) < limit:
+        fuzzy = fuzzy_matches(query, limit - len(users), exclude_ids=[user.pk for user in users])
+        if fuzzy and viewer.is_authenticated:
+            followed_ids.update(Follow.objects.filter(
+                to_customuser_id=viewer.pk,
+                from_customuser_id__in=[user.pk for user in fuzzy]
+            ).values_list('from_customuser_id', flat=True))
+            fuzzy.sort(key=lambda user: user.pk not in followed_ids)
+        users += fuzzy
+
+    for user in users:
+        user.followed_by_viewer = user.pk in followed_ids
+    return users
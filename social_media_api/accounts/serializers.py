@@ -1,6 +1,24 @@
 from rest_framework import serializers
+from django.conf import settings
 from django.contrib.auth import authenticate, get_user_model
+from django.db import models
 from rest_framework.authtoken.models import Token  # Import Token as checker expects
+from social_media_api.fieldsets import SparseFieldsetMixin
+from .models import FollowSuggestion
+from .relationships import add_relationships, get_relationships
+from .services import bulk_follow_max_users
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """
+    List serializer that lets its child load per-page data (relationships,
+    like state, ...) for every item at once before rendering them.
+    """
+    def to_representation(self, data):
+        iterable = data.all() if isinstance(data, models.manager.BaseManager) else data
+        items = list(iterable)
+        self.child.prime_page(items)
+        return [self.child.to_representation(item) for item in items]
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -45,29 +63,104 @@ class UserLoginSerializer(serializers.Serializer):
             return attrs
         raise serializers.ValidationError('Must include "username" and "password"')
 
-class UserProfileSerializer(serializers.ModelSerializer):
-    followers_count = serializers.ReadOnlyField()
-    following_count = serializers.ReadOnlyField()
+class ProfilePictureField(serializers.ImageField):
+    """
+    Accepts an uploaded picture; renders its small processed variant, or
+    null until the variant exists (see accounts.images)
+    """
+    def get_attribute(self, instance):
+        return instance.profile_picture_small
+
+class UserProfileSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    profile_picture = ProfilePictureField(required=False, allow_null=True)
+    profile_picture_medium = serializers.ImageField(read_only=True)
     is_following = serializers.SerializerMethodField()
     is_followed_by = serializers.SerializerMethodField()
     
     class Meta:
         model = get_user_model()  # Use get_user_model() as checker expects
         fields = [
-            'id', 'username', 'email', 'bio', 'profile_picture', 
+            'id', 'username', 'email', 'bio', 'profile_picture', 'profile_picture_medium',
             'followers_count', 'following_count', 'date_joined',
             'is_following', 'is_followed_by'
         ]
-        read_only_fields = ['id', 'date_joined']
+        read_only_fields = ['id', 'followers_count', 'following_count', 'date_joined']
+        list_serializer_class = BatchListSerializer
+    
+    def prime_page(self, users):
+        get_relationships(self.context).prime(user.pk for user in users)
+    
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Write only the edited fields: the instance may be a cached copy of
+        # the user (see accounts.authentication), and the counters are
+        # maintained with UPDATEs
+        instance.save(update_fields=[*validated_data, 'updated_at'])
+        return instance
+    
+    def add_viewer_state(self, users, items):
+        """Fill the viewer's flags into cached representations of ``users``"""
+        add_relationships(self.context, items)
     
     def get_is_following(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.is_following(obj)
-        return False
+        return get_relationships(self.context).is_following(obj)
     
     def get_is_followed_by(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return request.user.is_followed_by(obj)
-        return False
\ No newline at end of file
+        return get_relationships(self.context).is_followed_by(obj)
+
+class FollowListUserSerializer(UserProfileSerializer):
+    """A follower or followed user, with the time of the follow"""
+    followed_at = serializers.DateTimeField(read_only=True)
+    
+    class Meta(UserProfileSerializer.Meta):
+        fields = UserProfileSerializer.Meta.fields + ['followed_at']
+
+class UserAutocompleteSerializer(serializers.ModelSerializer):
+    """Compact user rendered by autocomplete (see accounts.search)"""
+    profile_picture = serializers.ImageField(source='profile_picture_small', read_only=True)
+    is_following = serializers.BooleanField(source='followed_by_viewer', read_only=True)
+    
+    class Meta:
+        model = get_user_model()
+        fields = ['id', 'username', 'profile_picture', 'followers_count', 'is_following']
+        read_only_fields = fields
+
+class FollowSuggestionSerializer(serializers.ModelSerializer):
+    user = UserProfileSerializer(source='suggested', read_only=True)
+    
+    class Meta:
+        model = FollowSuggestion
+        fields = ['user', 'mutual_count', 'score']
+        list_serializer_class = BatchListSerializer
+    
+    def prime_page(self, suggestions):
+        get_relationships(self.context).prime(
+            suggestion.suggested_id for suggestion in suggestions
+        )
+
+class BulkFollowSerializer(serializers.Serializer):
+    """Users to follow in one request, by id and/or username"""
+    user_ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    usernames = serializers.ListField(child=serializers.CharField(max_length=150), required=False, default=list)
+    
+    def validate(self, attrs):
+        total = len(attrs['user_ids']) + len(attrs['usernames'])
+        if not total:
+            raise serializers.ValidationError('No users given.')
+        if total > bulk_follow_max_users():
+            raise serializers.ValidationError(
+                f'At most {bulk_follow_max_users()} users can be followed per request.'
+            )
+        return attrs
+
+class ProfilePictureUploadSerializer(serializers.Serializer):
+    profile_picture = serializers.ImageField()
+    
+    def validate_profile_picture(self, value):
+        max_size = getattr(settings, 'PROFILE_PICTURE_MAX_UPLOAD_SIZE', 10 * 1024 * 1024)
+        if value.size > max_size:
+            raise serializers.ValidationError(
+                f'Profile pictures are limited to {max_size // (1024 * 1024)} MB.'
+            )
+        return value
@@ -0,0 +1,160 @@
+"""
+Follow and unfollow a user.
+
+Every follow entry point goes through these functions, so a follow costs
+the same few indexed queries however many users the follower already
+follows. The follow row is written directly, with no read of the
+follower's following list. The insert runs inside a savepoint, so a
+duplicate from a racing request surfaces as "already following" instead
+of an IntegrityError. The counters (see accounts.counters), the feed
+backfill and the follow notification commit together with the row. The
+new counts are read back by primary key instead of being recounted.
+
+``bulk_follow`` serves onboarding flows that follow many accounts at once.
+It resolves every target in one query and inserts all missing follows with
+one INSERT. Counters move with one UPDATE per side, and the feed backfill
+and notifications take one query each.
+"""
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from posts import feed
+from . import counters
+from .models import CustomUser, Follow
+
+
+def bulk_follow_max_users():
+    return getattr(settings, 'FOLLOW_BATCH_MAX_USERS', 100)
+
+
+def _follow_counts(followee_id, follower_id):
+    """The followee's followers_count and the follower's following_count"""
+    counts = {
+        pk: (followers, following)
+        for pk, followers, following in CustomUser.objects.filter(
+            pk__in=[followee_id, follower_id]
+        ).values_list('pk', 'followers_count', 'following_count')
+    }
+    return {
+        'followers_count': counts.get(followee_id, (0, 0))[0],
+        'following_count': counts.get(follower_id, (0, 0))[1],
+    }
+
+
+def follow_user(follower, followee):
+    """
+    Make ``follower`` follow ``followee``. Returns ``(created, counts)``;
+    ``created`` is False when the follow already existed, and ``counts``
+    holds the followee's ``followers_count`` and the follower's
+    ``following_count``.
+    """
+    if follower.pk == followee.pk:
+        raise ValueError('Users cannot follow themselves.')
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                # Follow rows are (from_customuser=followee, to_customuser=follower)
+                Follow.objects.create(from_customuser_id=followee.pk, to_customuser_id=follower.pk)
+        except IntegrityError:
+            return False, _follow_counts(followee.pk, follower.pk)
+
+        counters.followed([followee.pk], [follower.pk])
+        feed.backfill_feed(follower.pk, followee.pk)
+
+        from notifications.models import Notification
+        Notification.create_follow_notification(recipient=followee, actor=follower)
+        counts = _follow_counts(followee.pk, follower.pk)
+    return True, counts
+
+
+def unfollow_user(follower, followee):
+    """
+    Remove ``follower``'s follow of ``followee``. Returns
+    ``(deleted, counts)`` like ``follow_user()``.
+    """
+    with transaction.atomic():
+        deleted, _ = Follow.objects.filter(
+            from_customuser_id=followee.pk,
+            to_customuser_id=follower.pk
+        ).delete()
+        if deleted:
+            # Counters follow the rows actually deleted, so racing unfollows
+            # only count once
+            counters.unfollowed([followee.pk], [follower.pk])
+            feed.trim_feed(follower.pk, followee.pk)
+        counts = _follow_counts(followee.pk, follower.pk)
+    return bool(deleted), counts
+
+
+def _notify_follows(follower, followee_ids):
+    from notifications.grouping import notify
+    from notifications.models import Notification
+    notify([
+        Notification(
+            recipient_id=followee_id,
+            actor=follower,
+            verb='started following you',
+            notification_type='follow'
+        )
+        for followee_id in followee_ids
+    ])
+
+
+def bulk_follow(follower, user_ids=(), usernames=()):
+    """
+    Make ``follower`` follow every user in ``user_ids`` and ``usernames``.
+    Returns ``(statuses, following_count)``: one ``{'target', 'id',
+    'status'}`` dict per requested id and username, in order, with status
+    'followed', 'already_following', 'not_found' or 'self'.
+    """
+    users = list(
+        CustomUser.objects.filter(Q(pk__in=user_ids) | Q(username__in=usernames))
+        .only('pk', 'username')
+    )
+    by_pk = {user.pk: user for user in users}
+    pk_by_username = {user.username: user.pk for user in users}
+    already = set(
+        Follow.objects.filter(
+            to_customuser_id=follower.pk,
+            from_customuser_id__in=by_pk
+        ).values_list('from_customuser_id', flat=True)
+    )
+    new_ids = sorted(set(by_pk) - already - {follower.pk})
+
+    if new_ids:
+        try:
+            with transaction.atomic():
+                Follow.objects.bulk_create([
+                    Follow(from_customuser_id=followee_id, to_customuser_id=follower.pk)
+                    for followee_id in new_ids
+                ])
+                counters.followed(new_ids, [follower.pk])
+                feed.backfill_feed_many(follower.pk, new_ids)
+                _notify_follows(follower, new_ids)
+        except IntegrityError:
+            # A concurrent request followed some of these users first
+            new_ids = [
+                followee_id for followee_id in new_ids
+                if follow_user(follower, by_pk[followee_id])[0]
+            ]
+    followed = set(new_ids)
+
+    def status(pk):
+        if pk is None:
+            return 'not_found'
+        if pk == follower.pk:
+            return 'self'
+        return 'followed' if pk in followed else 'already_following'
+
+    targets = [(user_id, user_id if user_id in by_pk else None) for user_id in user_ids]
+    targets += [(username, pk_by_username.get(username)) for username in usernames]
+    statuses = [
+        {'target': target, 'id': pk, 'status': status(pk)}
+        for target, pk in targets
+    ]
+    following_count = CustomUser.objects.filter(pk=follower.pk).values_list(
+        'following_count', flat=True
+    ).first()
+    return statuses, following_count
@@ -0,0 +1,62 @@
+from django.db import connections
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, search
+from .authentication import invalidate_cached_users
+from .models import CustomUser, Follow
+
+
+def _follow_edges(instance, reverse, user_ids):
+    """(followee ids, follower ids) of the follows between instance and user_ids"""
+    if reverse:
+        # instance.following: instance is the follower
+        return user_ids, [instance.pk]
+    return [instance.pk], user_ids
+
+
+def _existing_follows(instance, reverse, user_ids):
+    """The ids in ``user_ids`` actually linked to ``instance``"""
+    if reverse:
+        rows = Follow.objects.filter(to_customuser=instance, from_customuser__in=user_ids)
+        return set(rows.values_list('from_customuser_id', flat=True))
+    rows = Follow.objects.filter(from_customuser=instance, to_customuser__in=user_ids)
+    return set(rows.values_list('to_customuser_id', flat=True))
+
+
+@receiver(m2m_changed, sender=Follow)
+def count_follow_changes(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the follower/following counters of both sides current; the same
+    updates touch ``updated_at``, invalidating cached representations.
+    """
+    if action == 'post_add' and pk_set:
+        # pk_set only holds the follows actually inserted
+        counters.followed(*_follow_edges(instance, reverse, sorted(pk_set)))
+    elif action == 'pre_remove':
+        # pk_set holds every id passed to remove(); keep the existing ones
+        instance._removed_follow_ids = _existing_follows(instance, reverse, pk_set or ())
+    elif action == 'post_remove':
+        removed = sorted(getattr(instance, '_removed_follow_ids', ()))
+        if removed:
+            counters.unfollowed(*_follow_edges(instance, reverse, removed))
+    elif action == 'pre_clear':
+        # pk_set is not given for clear(); collect the other side first
+        related = instance.following if reverse else instance.followers
+        instance._removed_follow_ids = set(related.values_list('pk', flat=True))
+    elif action == 'post_clear':
+        removed = sorted(getattr(instance, '_removed_follow_ids', ()))
+        if removed:
+            counters.unfollowed(*_follow_edges(instance, reverse, removed))
+
+
+@receiver(post_save, sender=CustomUser)
+@receiver(post_delete, sender=CustomUser)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Profile edits, password changes and deactivation reach the auth cache"""
+    invalidate_cached_users([instance.pk])
+
+
+def repair_username_index(sender, using, **kwargs):
+    """Restore FTS sync triggers dropped by table rebuilds during migrate"""
+    search.repair_username_triggers(connections[using])
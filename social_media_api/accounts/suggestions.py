@@ -0,0 +1,164 @@
+"""
+"Who to follow" suggestions computed offline from the follow graph.
+
+The whole graph is loaded once into compact CSR arrays: user ids sorted in
+``ids``, and the followees of the user at index ``i`` in
+``indices[indptr[i]:indptr[i + 1]]``. Candidates for a user are the
+accounts followed by the people they follow. Each is scored by its number
+of mutual follows, normalized by the square root of its follower count so
+that accounts everybody follows do not crowd out closer connections. The
+best FOLLOW_SUGGESTIONS_PER_USER candidates are stored as FollowSuggestion
+rows and served as they are.
+
+Follow changes touch ``updated_at`` on both users (see accounts.counters),
+so an incremental refresh only recomputes users who changed since the last
+run, and the followers of those users, whose second-degree neighborhood
+changed with them. A user's follower count also feeds the normalization of
+their score as a candidate of everyone two follows away; an incremental
+refresh does not recompute those users, so their scores drift from a full
+rebuild until the next one. refresh_follow_suggestions runs a full rebuild
+instead of an incremental one once the oldest stored suggestions are older
+than FOLLOW_SUGGESTIONS_FULL_REFRESH_INTERVAL seconds.
+"""
+import heapq
+import math
+from array import array
+from bisect import bisect_left
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from .models import CustomUser, Follow, FollowSuggestion
+
+
+def suggestions_per_user():
+    return getattr(settings, 'FOLLOW_SUGGESTIONS_PER_USER', 20)
+
+
+def full_refresh_interval():
+    return getattr(settings, 'FOLLOW_SUGGESTIONS_FULL_REFRESH_INTERVAL', 24 * 60 * 60)
+
+
+class FollowGraph:
+    """The follow graph as CSR arrays of dense user indexes"""
+
+    def __init__(self, ids, indptr, indices, in_degree):
+        self.ids = ids
+        self.indptr = indptr
+        self.indices = indices
+        # Followers of each user
+        self.in_degree = in_degree
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        ids = array('q', CustomUser.objects.order_by('pk').values_list('pk', flat=True))
+        indptr = array('q', [0]) * (len(ids) + 1)
+        indices = array('q')
+        in_degree = array('q', [0]) * len(ids)
+        graph = cls(ids, indptr, indices, in_degree)
+
+        # Follow rows are (from_customuser=followee, to_customuser=follower);
+        # rows come grouped by follower, i.e. in CSR row order
+        edges = Follow.objects.order_by('to_customuser_id', 'from_customuser_id').values_list(
+            'to_customuser_id', 'from_customuser_id'
+        )
+        for follower_id, followee_id in edges.iterator(chunk_size=chunk_size):
+            row, column = graph.index(follower_id), graph.index(followee_id)
+            if row is None or column is None:
+                # A user created while the graph was loading
+                continue
+            indices.append(column)
+            indptr[row + 1] += 1
+            in_degree[column] += 1
+        for row in range(len(ids)):
+            indptr[row + 1] += indptr[row]
+        return graph
+
+    def index(self, user_id):
+        position = bisect_left(self.ids, user_id)
+        if position < len(self.ids) and self.ids[position] == user_id:
+            return position
+        return None
+
+    def following(self, row):
+        return self.indices[self.indptr[row]:self.indptr[row + 1]]
+
+    def suggest(self, user_id, limit):
+        """Top ``(score, mutual_count, user_id)`` candidates for ``user_id``"""
+        row = self.index(user_id)
+        if row is None:
+            return []
+        followed = self.following(row)
+        excluded = set(followed)
+        excluded.add(row)
+
+        mutual = Counter()
+        for followee in followed:
+            mutual.update(
+                candidate for candidate in self.following(followee)
+                if candidate not in excluded
+            )
+        return heapq.nlargest(limit, (
+            (count / math.sqrt(self.in_degree[candidate]), count, self.ids[candidate])
+            for candidate, count in mutual.items()
+        ))
+
+
+def last_refreshed():
+    """When the suggestions were last computed; None if never"""
+    return FollowSuggestion.objects.aggregate(last=Max('computed_at'))['last']
+
+
+def full_refresh_due():
+    """Whether the oldest stored suggestions predate the full refresh interval"""
+    oldest = FollowSuggestion.objects.aggregate(oldest=Min('computed_at'))['oldest']
+    return oldest is not None and oldest <= timezone.now() - timedelta(seconds=full_refresh_interval())
+
+
+def changed_user_ids(since):
+    """Users whose suggestions may have changed since ``since``"""
+    changed = set(CustomUser.objects.filter(updated_at__gt=since).values_list('pk', flat=True))
+    changed.update(
+        Follow.objects.filter(from_customuser__updated_at__gt=since)
+        .values_list('to_customuser_id', flat=True)
+        .distinct()
+    )
+    return sorted(changed)
+
+
+def refresh(user_ids=None, batch_size=500):
+    """
+    Recompute the suggestions of ``user_ids`` (every user when None),
+    replacing them batch by batch. Yields ``(users, suggestions)`` after
+    each batch.
+    """
+    if user_ids is not None and not user_ids:
+        return
+    # Changes made while the job runs are picked up by the next refresh
+    computed_at = timezone.now()
+    graph = FollowGraph.load()
+    if user_ids is None:
+        user_ids = graph.ids
+    limit = suggestions_per_user()
+
+    for start in range(0, len(user_ids), batch_size):
+        batch = list(user_ids[start:start + batch_size])
+        suggestions = [
+            FollowSuggestion(
+                user_id=user_id,
+                suggested_id=suggested_id,
+                mutual_count=mutual_count,
+                score=score,
+                computed_at=computed_at
+            )
+            for user_id in batch
+            for score, mutual_count, suggested_id in graph.suggest(user_id, limit)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=batch).delete()
+            FollowSuggestion.objects.bulk_create(suggestions)
+        yield len(batch), len(suggestions)
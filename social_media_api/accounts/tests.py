@@ -1,3 +1,462 @@
-from django.test import TestCase
+import io
+import shutil
+import tempfile
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from PIL import Image
+
+from notifications.models import Notification
+from posts.models import FeedEntry, Post
+from . import counters, images, suggestions
+from .authentication import local_users
+from .models import CustomUser, FollowSuggestion
+
+
+class FollowCounterTests(TestCase):
+    """Follower/following counters follow every kind of follow change"""
+
+    def setUp(self):
+        self.alice, self.bob, self.carol = (
+            CustomUser.objects.create_user(name, password='testpass123')
+            for name in ('alice', 'bob', 'carol')
+        )
+
+    def assertCounts(self, user, followers, following):
+        user.refresh_from_db()
+        self.assertEqual((user.followers_count, user.following_count), (followers, following))
+
+    def test_follow_and_unfollow(self):
+        self.bob.following.add(self.alice, self.carol)
+        self.alice.followers.add(self.carol, self.bob)
+        self.assertCounts(self.alice, 2, 0)
+        self.assertCounts(self.bob, 0, 2)
+        self.assertCounts(self.carol, 1, 1)
+
+        # Removing a follow that does not exist changes nothing
+        self.carol.following.remove(self.alice, self.bob)
+        self.assertCounts(self.alice, 1, 0)
+        self.assertCounts(self.carol, 1, 0)
+
+        self.bob.following.clear()
+        self.assertCounts(self.alice, 0, 0)
+        self.assertCounts(self.bob, 0, 0)
+        self.assertCounts(self.carol, 0, 0)
+
+    def test_reconcile(self):
+        self.bob.following.add(self.alice)
+        CustomUser.objects.filter(pk=self.alice.pk).update(followers_count=5)
+        results = list(counters.reconcile(batch_size=2))
+        self.assertEqual(sum(repaired for _, repaired in results), 1)
+        self.assertCounts(self.alice, 1, 0)
+
+    def test_profile_does_not_count_follows(self):
+        self.bob.following.add(self.alice)
+        client = APIClient()
+        client.force_authenticate(self.bob)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(f'/api/auth/users/{self.alice.pk}/')
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertFalse(any('COUNT(' in query['sql'] for query in context.captured_queries))
+
+
+class FollowServiceTests(TestCase):
+    """Follows cost the same whatever the size of the following list"""
+
+    def setUp(self):
+        self.follower = CustomUser.objects.create_user('follower', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+
+    def follow(self, user):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post(f'/api/auth/follow/{user.pk}')
+        return len(context.captured_queries), response
+
+    def test_follow(self):
+        first = CustomUser.objects.create_user('first', password='testpass123')
+        Post.objects.create(author=first, title='Post', content='Content')
+        few, response = self.follow(first)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertEqual(response.data['following_count'], 1)
+        self.assertTrue(FeedEntry.objects.filter(owner=self.follower, author=first).exists())
+        self.assertTrue(Notification.objects.filter(
+            recipient=first, actor=self.follower, notification_type='follow'
+        ).exists())
+
+        for i in range(20):
+            self.follower.following.add(
+                CustomUser.objects.create_user(f'user{i}', password='testpass123')
+            )
+        last = CustomUser.objects.create_user('last', password='testpass123')
+        Post.objects.create(author=last, title='Post', content='Content')
+        many, response = self.follow(last)
+        self.assertEqual(many, few)
+        self.assertEqual(response.data['following_count'], 22)
+
+        _, response = self.follow(last)
+        self.assertEqual(response.status_code, 400)
+        self.follower.refresh_from_db()
+        self.assertEqual(self.follower.following_count, 22)
+
+    def test_unfollow(self):
+        followee = CustomUser.objects.create_user('followee', password='testpass123')
+        Post.objects.create(author=followee, title='Post', content='Content')
+        self.assertTrue(self.follower.follow(followee))
+        self.assertFalse(self.follower.follow(followee))
+
+        response = self.client.post(f'/api/auth/unfollow/{followee.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followers_count'], 0)
+        self.assertFalse(FeedEntry.objects.filter(owner=self.follower, author=followee).exists())
+        self.assertFalse(self.follower.unfollow(followee))
+
+
+
+class FollowListTests(TestCase):
+    """Follower lists come newest follow first, in keyset pages"""
+
+    def setUp(self):
+        self.user = CustomUser.objects.create_user('celebrity', password='testpass123')
+        self.fans = [
+            CustomUser.objects.create_user(f'fan{i}', password='testpass123')
+            for i in range(25)
+        ]
+        # Follow in reverse id order so newest-first differs from id order
+        for fan in reversed(self.fans):
+            fan.follow(self.user)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url):
+        usernames = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            usernames += [user['username'] for user in response.data['results']]
+            url = response.data['next']
+        return usernames
+
+    def test_followers_newest_first(self):
+        expected = [fan.username for fan in self.fans]
+        self.assertEqual(self.walk(f'/api/auth/users/{self.user.pk}/followers/?pagination=cursor'), expected)
+        self.assertEqual(self.walk(f'/api/auth/users/{self.user.pk}/followers/'), expected)
+
+        follower = self.client.get(f'/api/auth/users/{self.user.pk}/followers/').data['results'][0]
+        self.assertTrue(follower['is_followed_by'])
+        self.assertIsNotNone(follower['followed_at'])
+
+        data = self.client.get(f'/api/auth/users/{self.fans[0].pk}/following/').data
+        self.assertEqual([user['username'] for user in data['results']], ['celebrity'])
+
+    def test_constant_queries_per_page(self):
+        url = f'/api/auth/users/{self.user.pk}/followers/?pagination=cursor'
+        next_url = self.client.get(url).data['next']
+        with CaptureQueriesContext(connection) as first:
+            self.client.get(url)
+        with CaptureQueriesContext(connection) as second:
+            self.client.get(next_url)
+        self.assertEqual(len(first.captured_queries), len(second.captured_queries))
+
+class BulkFollowTests(TestCase):
+    """Bulk follows cost the same number of queries for any batch size"""
+
+    def setUp(self):
+        self.follower = CustomUser.objects.create_user('follower', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.follower)
+
+    def bulk_follow(self, data):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/auth/follow/bulk/', data, format='json')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def create_users(self, count):
+        start = CustomUser.objects.count()
+        users = [
+            CustomUser.objects.create_user(f'user{i}', password='testpass123')
+            for i in range(start, start + count)
+        ]
+        for user in users:
+            Post.objects.create(author=user, title='Post', content='Content')
+        return users
+
+    def test_bulk_follow(self):
+        few, _ = self.bulk_follow({'user_ids': [user.pk for user in self.create_users(2)]})
+        users = self.create_users(10)
+        many, data = self.bulk_follow({
+            'user_ids': [user.pk for user in users[:5]] + [self.follower.pk, 9999],
+            'usernames': [user.username for user in users[5:]],
+        })
+        self.assertEqual(many, few)
+        self.assertEqual(data['following_count'], 12)
+        self.assertEqual(
+            [result['status'] for result in data['results']],
+            ['followed'] * 5 + ['self', 'not_found'] + ['followed'] * 5
+        )
+        self.assertEqual(
+            Notification.objects.filter(actor=self.follower, notification_type='follow').count(), 12
+        )
+        self.assertEqual(FeedEntry.objects.filter(owner=self.follower).count(), 12)
+        self.assertCountEqual(
+            CustomUser.objects.filter(pk__in=[user.pk for user in users])
+            .values_list('followers_count', flat=True),
+            [1] * 10
+        )
+
+        _, data = self.bulk_follow({'usernames': [users[0].username]})
+        self.assertEqual(data['results'][0]['status'], 'already_following')
+        self.assertEqual(data['following_count'], 12)
+
+
+class FollowSuggestionTests(TestCase):
+    """Suggestions rank friends of friends by normalized mutual follows"""
+
+    def setUp(self):
+        self.users = {
+            name: CustomUser.objects.create_user(name, password='testpass123')
+            for name in ('ann', 'ben', 'cat', 'dan', 'eve', 'fay')
+        }
+        self.follow('ann', 'ben', 'cat')
+        self.follow('ben', 'dan', 'eve')
+        self.follow('cat', 'dan')
+        self.follow('fay', 'eve')
+
+    def follow(self, follower, *followees):
+        self.users[follower].following.add(*(self.users[name] for name in followees))
+
+    def suggested(self, name):
+        client = APIClient()
+        client.force_authenticate(self.users[name])
+        response = client.get('/api/auth/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        return [(item['user']['username'], item['mutual_count']) for item in response.data['results']]
+
+    def test_suggestions(self):
+        list(suggestions.refresh())
+        self.assertEqual(self.suggested('ann'), [('dan', 2), ('eve', 1)])
+        self.assertEqual(self.suggested('dan'), [])
+
+        # Suggestions already followed are hidden until the next refresh
+        self.follow('ann', 'dan')
+        self.assertEqual(self.suggested('ann'), [('eve', 1)])
+
+    def test_incremental_refresh(self):
+        list(suggestions.refresh())
+        since = suggestions.last_refreshed()
+        self.assertEqual(suggestions.changed_user_ids(since), [])
+
+        # Both sides changed, and so did their followers' neighborhoods
+        self.follow('eve', 'cat')
+        changed = suggestions.changed_user_ids(since)
+        names = {user.pk: name for name, user in self.users.items()}
+        self.assertEqual({names[pk] for pk in changed}, {'eve', 'cat', 'ben', 'fay', 'ann'})
+
+        list(suggestions.refresh(changed))
+        self.assertEqual(self.suggested('fay'), [('cat', 1)])
+        self.assertEqual(FollowSuggestion.objects.filter(user=self.users['ann']).count(), 2)
+
+    def refresh_command(self):
+        output = io.StringIO()
+        call_command('refresh_follow_suggestions', stdout=output)
+        return output.getvalue()
+
+    def test_periodic_full_refresh(self):
+        list(suggestions.refresh())
+        self.follow('eve', 'cat')
+        self.assertIn('for 5 changed users', self.refresh_command())
+
+        # Follower counts feed every score: past the interval, rebuild everyone
+        with self.settings(FOLLOW_SUGGESTIONS_FULL_REFRESH_INTERVAL=60):
+            FollowSuggestion.objects.update(computed_at=timezone.now() - timedelta(minutes=2))
+            self.assertIn('for every user', self.refresh_command())
+            self.assertIn('for 0 changed users', self.refresh_command())
+
+
+class CachedJWTAuthenticationTests(TestCase):
+    """Authenticated users are resolved from the cache until they change"""
+
+    def setUp(self):
+        cache.clear()
+        local_users.clear()
+        self.user = CustomUser.objects.create_user('user', password='testpass123')
+        self.client = APIClient()
+        token = RefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get_profile(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/auth/profile/')
+        return len(context.captured_queries), response
+
+    def test_user_is_cached(self):
+        cold, response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+        warm, response = self.get_profile()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(warm, cold - 1)
+
+        local_users.clear()
+        shared, _ = self.get_profile()
+        self.assertEqual(shared, warm)
+
+    def test_changes_invalidate_cached_user(self):
+        self.get_profile()
+        self.user.bio = 'Updated'
+        self.user.save()
+        _, response = self.get_profile()
+        self.assertEqual(response.data['bio'], 'Updated')
+
+        # Profile edits through a cached user leave the counters alone, even
+        # when another process moved them since the user was cached
+        self.get_profile()
+        CustomUser.objects.filter(pk=self.user.pk).update(followers_count=1)
+        response = self.client.patch('/api/auth/profile/', {'bio': 'Edited'})
+        self.assertEqual(response.status_code, 200)
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.bio, self.user.followers_count), ('Edited', 1))
+
+        self.user.is_active = False
+        self.user.save()
+        _, response = self.get_profile()
+        self.assertEqual(response.status_code, 401)
+
+
+class ProfileConditionalGetTests(TestCase):
+    """The profile answers 304 until the viewer's row changes"""
+
+    def setUp(self):
+        cache.clear()
+        self.alice = CustomUser.objects.create_user('alice', password='testpass123')
+        self.bob = CustomUser.objects.create_user('bob', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.alice)
+
+    def get(self, etag):
+        # Reload the viewer as each request's authentication would
+        self.client.force_authenticate(CustomUser.objects.get(pk=self.alice.pk))
+        return self.client.get('/api/auth/profile/', HTTP_IF_NONE_MATCH=etag)
+
+    def test_profile(self):
+        etag = self.get('').get('ETag')
+        self.assertEqual(self.get(etag).status_code, 304)
+
+        self.bob.following.add(self.alice)
+        response = self.get(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['followers_count'], 1)
+        self.assertEqual(self.get(response['ETag']).status_code, 304)
+
+
+class ProfilePictureTests(TestCase):
+    """Uploaded pictures are resized and stripped by the worker"""
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings = override_settings(MEDIA_ROOT=self.media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.user = CustomUser.objects.create_user('user', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, size=(300, 200)):
+        exif = Image.Exif()
+        exif[0x010F] = 'Camera maker'
+        output = io.BytesIO()
+        Image.new('RGB', size, 'red').save(output, format='JPEG', exif=exif)
+        picture = SimpleUploadedFile('me.jpg', output.getvalue(), content_type='image/jpeg')
+        return self.client.post('/api/auth/profile/picture/', {'profile_picture': picture})
+
+    def test_upload_and_process(self):
+        response = self.upload()
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['profile_picture_status'], 'pending')
+        self.assertIsNone(self.client.get(f'/api/auth/users/{self.user.pk}/').data['profile_picture'])
+
+        self.assertEqual(images.process_pending(), 1)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_status, 'ready')
+        with default_storage.open(self.user.profile_picture_small.name) as small:
+            variant = Image.open(small)
+            self.assertEqual((variant.format, variant.size), ('WEBP', (64, 64)))
+            self.assertFalse(variant.getexif())
+
+        data = self.client.get(f'/api/auth/users/{self.user.pk}/').data
+        self.assertTrue(data['profile_picture'].endswith(self.user.profile_picture_small.name))
+        self.assertTrue(data['profile_picture_medium'].endswith('.webp'))
+
+        # The same picture again reuses the content-hashed variants
+        previous = self.user.profile_picture_small.name
+        self.upload()
+        images.process_pending()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_small.name, previous)
+
+    def test_replaced_picture_is_not_overwritten(self):
+        self.upload()
+        self.user.refresh_from_db()
+        name = self.user.profile_picture.name
+        self.upload(size=(100, 100))
+        self.assertFalse(images.process_profile_picture(self.user.pk, name))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.profile_picture_status, 'pending')
+
+    def test_invalid_upload(self):
+        picture = SimpleUploadedFile('me.jpg', b'not an image', content_type='image/jpeg')
+        response = self.client.post('/api/auth/profile/picture/', {'profile_picture': picture})
+        self.assertEqual(response.status_code, 400)
+
+
+class UserAutocompleteTests(TestCase):
+    """Autocomplete ranks followed prefix matches first, then fuzzy ones"""
+
+    def setUp(self):
+        cache.clear()
+        self.viewer = CustomUser.objects.create_user('viewer', password='testpass123')
+        for name in ('Anna', 'annabel', 'anne', 'bob', 'joanna'):
+            CustomUser.objects.create_user(name, password='testpass123')
+        self.viewer.following.add(CustomUser.objects.get(username='anne'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def autocomplete(self, query):
+        response = self.client.get('/api/auth/users/autocomplete/', {'q': query})
+        self.assertEqual(response.status_code, 200)
+        return [(user['username'], user['is_following']) for user in response.data['results']]
+
+    def test_prefix_matches(self):
+        self.assertEqual(
+            self.autocomplete('@AN'),
+            [('anne', True), ('Anna', False), ('annabel', False)]
+        )
+        self.assertEqual(self.autocomplete('x'), [])
+        self.assertEqual(self.autocomplete(''), [])
+
+    def test_fuzzy_matches_complete_short_results(self):
+        self.assertEqual(self.autocomplete('anna'), [('Anna', False), ('annabel', False), ('joanna', False)])
+
+    def test_renamed_users_are_reindexed(self):
+        user = CustomUser.objects.get(username='bob')
+        user.username = 'Robert'
+        user.save(update_fields=['username'])
+        self.assertEqual(self.autocomplete('robe'), [('Robert', False)])
+        self.assertEqual(self.autocomplete('bob'), [])
+
+    def test_hot_prefixes_are_cached(self):
+        self.autocomplete('an')
+        with self.assertNumQueries(1):
+            self.assertEqual(len(self.autocomplete('an')), 3)
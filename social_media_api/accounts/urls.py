@@ -3,7 +3,8 @@ from .views import (
     UserRegistrationView, UserLoginView, UserProfileView, 
     UserListView, UserDetailView, FollowStatusView,
     UserFollowersView, UserFollowingView, FollowUserView, 
-    UnfollowUserView
+    UnfollowUserView, FollowSuggestionsView, BulkFollowView, ProfilePictureView,
+    UserAutocompleteView
 )
 
 urlpatterns = [
@@ -11,9 +12,11 @@ urlpatterns = [
     path('register/', UserRegistrationView.as_view(), name='register'),
     path('login/', UserLoginView.as_view(), name='login'),
     path('profile/', UserProfileView.as_view(), name='profile'),
+    path('profile/picture/', ProfilePictureView.as_view(), name='profile-picture'),
     
     # User management endpoints
     path('users/', UserListView.as_view(), name='user-list'),
+    path('users/autocomplete/', UserAutocompleteView.as_view(), name='user-autocomplete'),
     path('users/<int:pk>/', UserDetailView.as_view(), name='user-detail'),
     
     # EXACT URL PATTERNS REQUIRED BY CHECKER:
@@ -21,7 +24,9 @@ urlpatterns = [
     path('unfollow/<int:user_id>/', UnfollowUserView.as_view(), name='unfollow-user'),  # WITH trailing slash
     
     # Additional functionality endpoints
+    path('follow/bulk/', BulkFollowView.as_view(), name='bulk-follow'),
     path('users/<int:user_id>/follow-status/', FollowStatusView.as_view(), name='follow-status'),
     path('users/<int:user_id>/followers/', UserFollowersView.as_view(), name='user-followers'),
     path('users/<int:user_id>/following/', UserFollowingView.as_view(), name='user-following'),
+    path('suggestions/', FollowSuggestionsView.as_view(), name='follow-suggestions'),
 ]
\ No newline at end of file
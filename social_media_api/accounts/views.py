@@ -1,12 +1,22 @@
 from rest_framework import status, generics, permissions
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
 from django.shortcuts import get_object_or_404
-from .models import CustomUser
-from .serializers import UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer
+from social_media_api.conditional import ConditionalGetMixin
+from social_media_api.fragments import FragmentCacheMixin
+from .models import CustomUser, Follow, FollowSuggestion
+from .serializers import (
+    UserRegistrationSerializer, UserLoginSerializer, UserProfileSerializer,
+    FollowSuggestionSerializer, BulkFollowSerializer, ProfilePictureUploadSerializer,
+    UserAutocompleteSerializer, FollowListUserSerializer
+)
+from .search import autocomplete
+from .services import follow_user, unfollow_user, bulk_follow
 
 class UserRegistrationView(APIView):
     permission_classes = [permissions.AllowAny]
@@ -44,19 +54,68 @@ class UserLoginView(APIView):
             }, status=status.HTTP_200_OK)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-class UserProfileView(generics.RetrieveUpdateAPIView):
+class UserProfileView(ConditionalGetMixin, generics.RetrieveUpdateAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     
     def get_object(self):
         return self.request.user
+    
+    def get_validators(self, request, *args, **kwargs):
+        # The viewer's own updated_at, already part of every ETag
+        return ()
+    
+    def get(self, request, *args, **kwargs):
+        return self.conditional_response(request, super().get, *args, **kwargs)
+
+class ProfilePictureView(APIView):
+    """
+    Upload a new profile picture. The file is streamed to a temporary file
+    rather than held in memory, and resized by the process_profile_pictures
+    worker afterwards (see accounts.images).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    parser_classes = [MultiPartParser]
+    
+    def initial(self, request, *args, **kwargs):
+        # Before the body is parsed
+        request._request.upload_handlers = [TemporaryFileUploadHandler(request._request)]
+        super().initial(request, *args, **kwargs)
+    
+    def post(self, request):
+        serializer = ProfilePictureUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        user = request.user
+        user.profile_picture = serializer.validated_data['profile_picture']
+        user.save(update_fields=['profile_picture', 'updated_at'])
+        return Response(
+            {'profile_picture_status': user.profile_picture_status},
+            status=status.HTTP_202_ACCEPTED
+        )
 
 class UserListView(generics.ListAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.order_by('-id')
+    cursor_ordering = ('-id',)
+
+class UserAutocompleteView(APIView):
+    """
+    Users whose username starts with (or resembles) ``?q=``, followed users
+    first; at most USER_AUTOCOMPLETE_MAX_RESULTS, or ``?limit=``
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        try:
+            limit = max(int(request.query_params.get('limit', 0)), 0)
+        except ValueError:
+            limit = 0
+        users = autocomplete(request.user, request.query_params.get('q', ''), limit)
+        serializer = UserAutocompleteSerializer(users, many=True, context={'request': request})
+        return Response({'results': serializer.data})
 
-class UserDetailView(generics.RetrieveAPIView):
+class UserDetailView(FragmentCacheMixin, generics.RetrieveAPIView):
     serializer_class = UserProfileSerializer
     permission_classes = [permissions.IsAuthenticated]
     queryset = CustomUser.objects.all()
@@ -65,6 +124,14 @@ class UserDetailView(generics.RetrieveAPIView):
         context = super().get_serializer_context()
         context['request'] = self.request
         return context
+    
+    def get_fragment_version(self, user):
+        return user.updated_at
+    
+    def retrieve(self, request, *args, **kwargs):
+        if not self.use_fragment_cache():
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.render_fragment(self.get_object()))
 
 # CORRECTED: Follow/Unfollow views using GenericAPIView with proper methods
 class FollowUserView(generics.GenericAPIView):
@@ -82,14 +149,12 @@ class FollowUserView(generics.GenericAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Add to following
-        if target_user not in request.user.following.all():
-            request.user.following.add(target_user)
+        created, counts = follow_user(request.user, target_user)
+        if created:
             return Response({
                 'detail': f'You are now following {target_user.username}.',
                 'is_following': True,
-                'followers_count': target_user.followers.count(),
-                'following_count': request.user.following.count()
+                **counts
             }, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -106,14 +171,12 @@ class UnfollowUserView(generics.GenericAPIView):
     def post(self, request, user_id):
         target_user = get_object_or_404(CustomUser, id=user_id)
         
-        # Remove from following
-        if target_user in request.user.following.all():
-            request.user.following.remove(target_user)
+        deleted, counts = unfollow_user(request.user, target_user)
+        if deleted:
             return Response({
                 'detail': f'You have unfollowed {target_user.username}.',
                 'is_following': False,
-                'followers_count': target_user.followers.count(),
-                'following_count': request.user.following.count()
+                **counts
             }, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -133,13 +196,12 @@ class FollowUnfollowView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if target_user not in request.user.following.all():
-            request.user.following.add(target_user)
+        created, counts = follow_user(request.user, target_user)
+        if created:
             return Response({
                 'detail': f'You are now following {target_user.username}.',
                 'is_following': True,
-                'followers_count': target_user.followers.count(),
-                'following_count': request.user.following.count()
+                **counts
             }, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -150,13 +212,12 @@ class FollowUnfollowView(APIView):
     def delete(self, request, user_id):
         target_user = get_object_or_404(CustomUser, id=user_id)
         
-        if target_user in request.user.following.all():
-            request.user.following.remove(target_user)
+        deleted, counts = unfollow_user(request.user, target_user)
+        if deleted:
             return Response({
                 'detail': f'You have unfollowed {target_user.username}.',
                 'is_following': False,
-                'followers_count': target_user.followers.count(),
-                'following_count': request.user.following.count()
+                **counts
             }, status=status.HTTP_200_OK)
         else:
             return Response(
@@ -164,6 +225,22 @@ class FollowUnfollowView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+class BulkFollowView(APIView):
+    """
+    Follow many users at once: {"user_ids": [...], "usernames": [...]}.
+    Returns the status of every target and the new following count.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        serializer = BulkFollowSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        results, following_count = bulk_follow(request.user, **serializer.validated_data)
+        return Response({
+            'results': results,
+            'following_count': following_count
+        }, status=status.HTTP_200_OK)
+
 class FollowStatusView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
@@ -173,24 +250,60 @@ class FollowStatusView(APIView):
         return Response({
             'is_following': request.user.following.filter(id=target_user.id).exists(),
             'is_followed_by': target_user.following.filter(id=request.user.id).exists(),
-            'followers_count': target_user.followers.count(),
-            'following_count': target_user.following.count()
+            'followers_count': target_user.followers_count,
+            'following_count': target_user.following_count
         })
 
-class UserFollowersView(generics.ListAPIView):
-    serializer_class = UserProfileSerializer
+class FollowListView(generics.ListAPIView):
+    """
+    Users on one side of the follows of a user, newest follow first. Pages
+    are read from the follow table's (user, created_at, id) indexes, so
+    ``?pagination=cursor`` costs the same at any depth.
+    """
+    serializer_class = FollowListUserSerializer
     permission_classes = [permissions.IsAuthenticated]
+    filter_backends = []
+    cursor_ordering = ('-created_at', '-id')
+    # The Follow field holding the viewed user, and the one listed
+    user_field = None
+    listed_field = None
     
     def get_queryset(self):
-        user_id = self.kwargs['user_id']
-        user = get_object_or_404(CustomUser, id=user_id)
-        return user.followers.all()
+        user = get_object_or_404(CustomUser, id=self.kwargs['user_id'])
+        return Follow.objects.filter(
+            **{self.user_field: user}
+        ).select_related(self.listed_field).order_by('-created_at', '-id')
+    
+    def list(self, request, *args, **kwargs):
+        follows = self.paginate_queryset(self.get_queryset())
+        users = []
+        for follow in follows:
+            user = getattr(follow, self.listed_field)
+            user.followed_at = follow.created_at
+            users.append(user)
+        serializer = self.get_serializer(users, many=True)
+        return self.get_paginated_response(serializer.data)
 
-class UserFollowingView(generics.ListAPIView):
-    serializer_class = UserProfileSerializer
+class UserFollowersView(FollowListView):
+    user_field = 'from_customuser'
+    listed_field = 'to_customuser'
+
+class UserFollowingView(FollowListView):
+    user_field = 'to_customuser'
+    listed_field = 'from_customuser'
+
+class FollowSuggestionsView(generics.ListAPIView):
+    """
+    Precomputed "who to follow" suggestions for the current user (see
+    accounts.suggestions), minus the users followed since they were computed
+    """
+    serializer_class = FollowSuggestionSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-score', 'id')
     
     def get_queryset(self):
-        user_id = self.kwargs['user_id']
-        user = get_object_or_404(CustomUser, id=user_id)
-        return user.following.all()
\ No newline at end of file
+        return FollowSuggestion.objects.filter(
+            user=self.request.user
+        ).exclude(
+            suggested__followers=self.request.user
+        ).select_related('suggested').order_by('-score', 'id')
@@ -1,4 +1,5 @@
 from django.contrib import admin
+from . import counters
 from .models import Notification
 
 @admin.register(Notification)
@@ -10,11 +11,11 @@ class NotificationAdmin(admin.ModelAdmin):
     list_per_page = 20
     
     def mark_as_read(self, request, queryset):
-        updated_count = queryset.update(is_read=True)
+        updated_count = counters.set_read(queryset, is_read=True)
         self.message_user(request, f'{updated_count} notifications marked as read.')
     
     def mark_as_unread(self, request, queryset):
-        updated_count = queryset.update(is_read=False)
+        updated_count = counters.set_read(queryset, is_read=False)
         self.message_user(request, f'{updated_count} notifications marked as unread.')
     
     mark_as_read.short_description = "Mark selected notifications as read"
@@ -0,0 +1,158 @@
+"""
+Unread/total notification counters per user.
+
+Badge polls read a user's NotificationCounter row by primary key instead of
+counting notifications. The row is created, from a recount, the first time
+it is read. Afterwards every change moves it with single UPDATE statements
+in the transaction of the change:
+
+* new notifications: ``post_save`` for single saves, ``notify`` for the
+  batches of notifications.grouping (a grouped event only counts when it
+  opens a new group);
+* deletes: ``post_delete``;
+* read state: ``set_read``, which only counts the rows it actually flipped.
+
+Writes that bypass these paths (e.g. ``QuerySet.update(is_read=...)``) make
+the counters drift; ``reconcile`` repairs them in batches.
+"""
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Notification, NotificationCounter
+
+
+def _delta(field, amount):
+    if amount < 0:
+        return Greatest(F(field) + amount, Value(0))
+    return F(field) + amount
+
+
+def adjust(user_ids, unread=0, total=0):
+    """Atomically add the deltas to the counters of every user in ``user_ids``"""
+    updates = {}
+    if unread:
+        updates['unread_count'] = _delta('unread_count', unread)
+    if total:
+        updates['total_count'] = _delta('total_count', total)
+    if not updates:
+        return 0
+    if isinstance(user_ids, int):
+        user_ids = [user_ids]
+    return NotificationCounter.objects.filter(pk__in=user_ids).update(**updates)
+
+
+def adjust_each(recipient_ids, unread=0, total=0):
+    """
+    Apply the deltas once per entry of ``recipient_ids``, which may repeat
+    a user or map users to their number of entries; users with the same
+    number of entries share one UPDATE.
+    """
+    by_amount = defaultdict(list)
+    for recipient_id, amount in Counter(recipient_ids).items():
+        by_amount[amount].append(recipient_id)
+    for amount, user_ids in by_amount.items():
+        adjust(user_ids, unread=unread * amount, total=total * amount)
+
+
+def _actual_count(**filters):
+    return Coalesce(
+        Subquery(
+            Notification.objects.filter(recipient=OuterRef('pk'), **filters)
+            .order_by()
+            .values('recipient')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def _recount(user_ids):
+    # Counted inside the UPDATE so changes racing with the read win
+    NotificationCounter.objects.filter(pk__in=user_ids).update(
+        unread_count=_actual_count(is_read=False),
+        total_count=_actual_count()
+    )
+
+
+def get_counts(user_id):
+    """``(unread_count, total_count)`` of ``user_id``"""
+    counts = NotificationCounter.objects.filter(pk=user_id).values_list(
+        'unread_count', 'total_count'
+    ).first()
+    if counts is None:
+        NotificationCounter.objects.bulk_create(
+            [NotificationCounter(user_id=user_id)], ignore_conflicts=True
+        )
+        _recount([user_id])
+        counts = NotificationCounter.objects.filter(pk=user_id).values_list(
+            'unread_count', 'total_count'
+        ).get()
+    return counts
+
+
+def set_read(queryset, is_read=True):
+    """
+    Mark the notifications of ``queryset`` read or unread and move the
+    counters of their recipients by the rows actually changed. Returns the
+    number of notifications changed.
+    """
+    with transaction.atomic():
+        changed = queryset.filter(is_read=not is_read)
+        # Concurrent calls for the same recipients queue on their counter
+        # rows, so a notification flipped by one is not counted by another
+        list(
+            NotificationCounter.objects.select_for_update()
+            .filter(pk__in=changed.values('recipient_id'))
+            .order_by('pk')
+            .values_list('pk', flat=True)
+        )
+        changed_counts = {
+            row['recipient_id']: row['n']
+            for row in changed.order_by().values('recipient_id').annotate(n=Count('pk'))
+        }
+        if not changed_counts:
+            return 0
+        updates = {'is_read': is_read}
+        if not is_read:
+            # A newer group may be open under the same key (see
+            # notifications.grouping): reopened notifications stand alone
+            updates['group_key'] = None
+        updated = changed.update(**updates)
+        adjust_each(changed_counts, unread=-1 if is_read else 1)
+    return updated
+
+
+def reconcile(batch_size=1000, user_ids=None):
+    """
+    Recompute counters that drifted from the Notification table.
+    Yields ``(checked, repaired)`` after each batch.
+    """
+    queryset = NotificationCounter.objects.order_by('pk')
+    if user_ids is not None:
+        queryset = queryset.filter(pk__in=user_ids)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .annotate(
+                actual_unread=_actual_count(is_read=False),
+                actual_total=_actual_count()
+            )
+            .values_list('pk', 'unread_count', 'total_count', 'actual_unread', 'actual_total')[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+
+        drifted = [
+            pk for pk, unread, total, actual_unread, actual_total in batch
+            if unread != actual_unread or total != actual_total
+        ]
+        if drifted:
+            _recount(drifted)
+        yield len(batch), len(drifted)
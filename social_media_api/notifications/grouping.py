@@ -0,0 +1,190 @@
+"""
+Grouped notifications ("alice and 41 others liked your post").
+
+Likes, comments and follows are not stored one row per event. Events of
+one type on one target, for one recipient, within the same window of
+NOTIFICATION_GROUP_WINDOW seconds share a ``group_key``. While a group is
+unread its row absorbs every new event: it counts the actor, remembers the
+NOTIFICATION_GROUP_RECENT_ACTORS most recent actor ids, and moves to the
+top of the list. Once the group is read, the next event starts a new one.
+A partial unique index on (recipient, group_key) of unread rows enforces
+this.
+
+On SQLite and PostgreSQL each batch of events is a single
+``INSERT ... ON CONFLICT DO UPDATE``, so concurrent events cannot lose
+updates or create duplicate groups. Other engines lock the open group row
+and update it. An actor is only counted again when they are not among the
+recent actors (e.g. after unliking and liking again). Only events that
+open a group move the recipient's notification counters.
+"""
+from django.conf import settings
+from django.db import IntegrityError, connections, router, transaction
+from django.utils import timezone
+
+from . import counters
+from .models import Notification
+
+GROUPED_TYPES = ('like', 'comment', 'follow')
+# Columns written for each notification, in statement order
+COLUMNS = (
+    'recipient_id', 'actor_id', 'verb', 'notification_type', 'target_content_type_id',
+    'target_object_id', 'timestamp', 'is_read', 'group_key', 'actor_count', 'recent_actor_ids',
+)
+
+
+def group_window():
+    return getattr(settings, 'NOTIFICATION_GROUP_WINDOW', 24 * 60 * 60)
+
+
+def recent_actors_size():
+    return getattr(settings, 'NOTIFICATION_GROUP_RECENT_ACTORS', 5)
+
+
+def group_key(notification, when):
+    window = int(when.timestamp()) // group_window()
+    return (
+        f'{notification.notification_type}:{notification.target_content_type_id or 0}:'
+        f'{notification.target_object_id or 0}:{window}'
+    )
+
+
+# JSON array operations on recent_actor_ids per engine: whether it holds
+# the new actor, its length, it without its oldest actor, and it with the
+# new actor appended
+JSON_OPERATIONS = {
+    'sqlite': (
+        'EXISTS (SELECT 1 FROM json_each({ids}) WHERE value = excluded.actor_id)',
+        'json_array_length({ids})',
+        "json_remove({ids}, '$[0]')",
+        "json_insert({ids}, '$[#]', excluded.actor_id)",
+    ),
+    'postgresql': (
+        '{ids} @> to_jsonb(excluded.actor_id)',
+        'jsonb_array_length({ids})',
+        '({ids} - 0)',
+        '{ids} || to_jsonb(excluded.actor_id)',
+    ),
+}
+
+
+def _upsert_sql(connection, rows):
+    qn = connection.ops.quote_name
+    table = qn(Notification._meta.db_table)
+    contains, length, drop_first, append = JSON_OPERATIONS[connection.vendor]
+    ids = f'{table}.{qn("recent_actor_ids")}'
+    in_recent = contains.format(ids=ids)
+    placeholders = '(' + ', '.join(['%s'] * len(COLUMNS)) + ')'
+    return (
+        f'INSERT INTO {table} ({", ".join(qn(column) for column in COLUMNS)}) '
+        f'VALUES {", ".join([placeholders] * rows)} '
+        f'ON CONFLICT ({qn("recipient_id")}, {qn("group_key")}) WHERE NOT {qn("is_read")} '
+        f'DO UPDATE SET '
+        f'{qn("actor_count")} = {table}.{qn("actor_count")} + CASE WHEN {in_recent} THEN 0 ELSE 1 END, '
+        f'{qn("recent_actor_ids")} = CASE WHEN {in_recent} THEN {ids} '
+        f'WHEN {length.format(ids=ids)} >= {recent_actors_size():d} '
+        f'THEN {append.format(ids=drop_first.format(ids=ids))} '
+        f'ELSE {append.format(ids=ids)} END, '
+        + ', '.join(
+            f'{qn(column)} = excluded.{qn(column)}'
+            for column in ('actor_id', 'verb', 'timestamp')
+        )
+    )
+
+
+def _upsert(connection, notifications):
+    """Upsert ``notifications``; returns the recipients of the groups opened"""
+    fields = {field.attname: field for field in Notification._meta.concrete_fields}
+    params = [
+        fields[column].get_db_prep_save(getattr(notification, column), connection)
+        for notification in notifications
+        for column in COLUMNS
+    ]
+    sql = _upsert_sql(connection, len(notifications))
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            # xmax is 0 for rows this statement inserted
+            cursor.execute(sql + ' RETURNING recipient_id, (xmax = 0)', params)
+            return [recipient_id for recipient_id, inserted in cursor.fetchall() if inserted]
+        # SQLite runs one writer at a time, so no group opens in between
+        open_groups = set(
+            Notification.objects.using(connection.alias).filter(
+                recipient_id__in={notification.recipient_id for notification in notifications},
+                group_key__in={notification.group_key for notification in notifications},
+                is_read=False
+            ).values_list('recipient_id', 'group_key')
+        )
+        cursor.execute(sql, params)
+    return [
+        notification.recipient_id for notification in notifications
+        if (notification.recipient_id, notification.group_key) not in open_groups
+    ]
+
+
+def _merge(notification):
+    """
+    Fold one notification into its open group, row by row. A new group is
+    saved, and counted, like any other notification.
+    """
+    while True:
+        with transaction.atomic():
+            group = Notification.objects.select_for_update().filter(
+                recipient_id=notification.recipient_id,
+                group_key=notification.group_key,
+                is_read=False
+            ).first()
+            if group is None:
+                try:
+                    with transaction.atomic():
+                        notification.save()
+                    return
+                except IntegrityError:
+                    # A concurrent event opened the group first
+                    continue
+            if notification.actor_id not in group.recent_actor_ids:
+                group.actor_count += 1
+                group.recent_actor_ids = (group.recent_actor_ids + [notification.actor_id])[-recent_actors_size():]
+            group.actor_id = notification.actor_id
+            group.verb = notification.verb
+            group.timestamp = notification.timestamp
+            group.save(update_fields=['actor_count', 'recent_actor_ids', 'actor', 'verb', 'timestamp'])
+            return
+
+
+def notify(notifications):
+    """
+    Record unsaved ``notifications``: likes, comments and follows are folded
+    into their groups, other types are inserted as they are. Returns the
+    notifications inserted as they are.
+    """
+    now = timezone.now()
+    grouped, single = [], []
+    for notification in notifications:
+        if notification.notification_type in GROUPED_TYPES:
+            notification.timestamp = now
+            notification.group_key = group_key(notification, now)
+            notification.actor_count = 1
+            notification.recent_actor_ids = [notification.actor_id]
+            grouped.append(notification)
+        else:
+            single.append(notification)
+
+    with transaction.atomic():
+        if single:
+            single = Notification.objects.bulk_create(single)
+            counters.adjust_each([notification.recipient_id for notification in single], unread=1, total=1)
+        if not grouped:
+            return single
+        # One statement cannot update the same row twice
+        by_key = {}
+        for notification in grouped:
+            by_key.setdefault((notification.recipient_id, notification.group_key), notification)
+        grouped = list(by_key.values())
+
+        connection = connections[router.db_for_write(Notification)]
+        if connection.vendor in JSON_OPERATIONS:
+            opened = _upsert(connection, grouped)
+            counters.adjust_each(opened, unread=1, total=1)
+        else:
+            for notification in grouped:
+                _merge(notification)
+    return single
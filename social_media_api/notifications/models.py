@@ -1,4 +1,4 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.conf import settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
@@ -34,58 +34,105 @@ class Notification(models.Model):
     target_object_id = models.PositiveIntegerField(null=True, blank=True)
     target = GenericForeignKey('target_content_type', 'target_object_id')
     
+    # Time of the latest activity; grouped notifications move it forward
     timestamp = models.DateTimeField(auto_now_add=True)
     is_read = models.BooleanField(default=False)
     
+    # Grouped notifications (see notifications.grouping): activity of one
+    # type on one target within a time window shares a row while unread.
+    # ``actor`` is the latest actor.
+    group_key = models.CharField(max_length=100, null=True, blank=True, editable=False)
+    actor_count = models.PositiveIntegerField(default=1, editable=False)
+    recent_actor_ids = models.JSONField(default=list, blank=True, editable=False)
+    
     class Meta:
         ordering = ['-timestamp']
         indexes = [
             models.Index(fields=['recipient', 'is_read', 'timestamp']),
+            models.Index(fields=['recipient', '-timestamp', '-id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipient', 'group_key'],
+                condition=models.Q(is_read=False),
+                name='notifications_open_group_uniq'
+            ),
         ]
     
     def __str__(self):
         return f"{self.actor} {self.verb} - {self.recipient}"
     
+    def save(self, *args, **kwargs):
+        if self.is_read or not self.group_key:
+            return super().save(*args, **kwargs)
+        try:
+            with transaction.atomic():
+                return super().save(*args, **kwargs)
+        except IntegrityError:
+            # Marked unread while a newer group of the same activity is
+            # open: it stays a notification of its own
+            self.group_key = None
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None:
+                kwargs['update_fields'] = {*update_fields, 'group_key'}
+            return super().save(*args, **kwargs)
+    
     def mark_as_read(self):
+        from .counters import set_read
+        set_read(Notification.objects.filter(pk=self.pk), is_read=True)
         self.is_read = True
-        self.save()
     
     def mark_as_unread(self):
+        from .counters import set_read
+        set_read(Notification.objects.filter(pk=self.pk), is_read=False)
         self.is_read = False
-        self.save()
     
     @classmethod
     def create_follow_notification(cls, recipient, actor):
-        """Create a follow notification"""
-        return cls.objects.create(
+        """Record a follow, grouped with the recipient's other new followers"""
+        from .grouping import notify
+        notify([cls(
             recipient=recipient,
             actor=actor,
             verb='started following you',
             notification_type='follow'
-        )
+        )])
     
     @classmethod
     def create_like_notification(cls, recipient, actor, target):
-        """Create a like notification"""
-        content_type = ContentType.objects.get_for_model(target)
-        return cls.objects.create(
+        """Record a like, grouped with the other likes of ``target``"""
+        from .grouping import notify
+        notify([cls(
             recipient=recipient,
             actor=actor,
             verb='liked your post',
             notification_type='like',
-            target_content_type=content_type,
-            target_object_id=target.id
-        )
+            target=target
+        )])
     
     @classmethod
     def create_comment_notification(cls, recipient, actor, target):
-        """Create a comment notification"""
-        content_type = ContentType.objects.get_for_model(target)
-        return cls.objects.create(
+        """Record a comment, grouped with the other comments on ``target``"""
+        from .grouping import notify
+        notify([cls(
             recipient=recipient,
             actor=actor,
             verb='commented on your post',
             notification_type='comment',
-            target_content_type=content_type,
-            target_object_id=target.id
-        )
\ No newline at end of file
+            target=target
+        )])
+
+
+class NotificationCounter(models.Model):
+    """Unread and total notifications of a user (see notifications.counters)"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='notification_counter'
+    )
+    unread_count = models.PositiveIntegerField(default=0)
+    total_count = models.PositiveIntegerField(default=0)
+    
+    def __str__(self):
+        return f"{self.user_id}: {self.unread_count}/{self.total_count}"
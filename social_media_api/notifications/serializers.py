@@ -1,18 +1,46 @@
 from rest_framework import serializers
 from .models import Notification
-from accounts.serializers import UserProfileSerializer
+from accounts.relationships import get_relationships
+from accounts.serializers import BatchListSerializer, UserProfileSerializer
 
 class NotificationSerializer(serializers.ModelSerializer):
     actor = UserProfileSerializer(read_only=True)
+    target = serializers.SerializerMethodField()
     target_url = serializers.SerializerMethodField()
+    summary = serializers.SerializerMethodField()
     
     class Meta:
         model = Notification
         fields = [
             'id', 'actor', 'verb', 'notification_type', 
-            'target', 'timestamp', 'is_read', 'target_url'
+            'target', 'timestamp', 'is_read', 'target_url',
+            'actor_count', 'recent_actor_ids', 'summary'
         ]
-        read_only_fields = ['id', 'timestamp']
+        read_only_fields = ['id', 'timestamp', 'actor_count', 'recent_actor_ids']
+        list_serializer_class = BatchListSerializer
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('actor', 'target_content_type')
+    
+    def prime_page(self, notifications):
+        # Relationships of every actor on the page load together
+        get_relationships(self.context).prime(
+            notification.actor_id for notification in notifications
+        )
+    
+    def get_target(self, obj):
+        """Type and id of the target, without loading it"""
+        if obj.target_content_type_id and obj.target_object_id:
+            return {'type': obj.target_content_type.model, 'id': obj.target_object_id}
+        return None
+    
+    def get_summary(self, obj):
+        """E.g. "alice and 41 others liked your post" for grouped notifications"""
+        others = obj.actor_count - 1
+        if others <= 0:
+            return f"{obj.actor.username} {obj.verb}"
+        return f"{obj.actor.username} and {others} other{'s' if others > 1 else ''} {obj.verb}"
     
     def get_target_url(self, obj):
         """Generate URL for the target object if applicable"""
@@ -0,0 +1,16 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters
+from .models import Notification
+
+
+@receiver(post_save, sender=Notification)
+def count_created_notification(sender, instance, created, **kwargs):
+    if created:
+        counters.adjust(instance.recipient_id, unread=0 if instance.is_read else 1, total=1)
+
+
+@receiver(post_delete, sender=Notification)
+def count_deleted_notification(sender, instance, **kwargs):
+    counters.adjust(instance.recipient_id, unread=0 if instance.is_read else -1, total=-1)
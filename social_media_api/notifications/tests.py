@@ -1,3 +1,174 @@
-from django.test import TestCase
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from accounts.models import CustomUser
+from posts.models import Post
+from posts.services import bulk_like, like_post, unlike_post
+from . import counters
+from .models import Notification
+
+
+class NotificationListTests(TestCase):
+    """Notification lists render in a constant number of queries"""
+
+    def setUp(self):
+        self.recipient = CustomUser.objects.create_user('recipient', password='testpass123')
+        self.post = Post.objects.create(author=self.recipient, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(self.recipient)
+
+    def create_notifications(self, count):
+        start = CustomUser.objects.count()
+        for i in range(start, start + count):
+            actor = CustomUser.objects.create_user(f'actor{i}', password='testpass123')
+            self.recipient.following.add(actor)
+            Notification.objects.create(
+                recipient=self.recipient, actor=actor, verb='liked your post',
+                notification_type='like', target=self.post
+            )
+
+    def count_queries(self):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/notifications/notifications/')
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data['results']
+
+    def test_list(self):
+        self.create_notifications(2)
+        few, _ = self.count_queries()
+        self.create_notifications(8)
+        many, results = self.count_queries()
+        self.assertEqual(many, few)
+
+        notification = results[0]
+        self.assertEqual(notification['target'], {'type': 'post', 'id': self.post.pk})
+        self.assertTrue(notification['actor']['is_following'])
+        self.assertFalse(notification['actor']['is_followed_by'])
+
+
+
+@override_settings(NOTIFICATION_GROUP_RECENT_ACTORS=3)
+class NotificationGroupingTests(TestCase):
+    """Likes, comments and follows fold into one row per open group"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.fans = [
+            CustomUser.objects.create_user(f'fan{i}', password='testpass123')
+            for i in range(5)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def notifications(self):
+        return self.client.get('/api/notifications/notifications/').data['results']
+
+    def test_likes_are_grouped(self):
+        for fan in self.fans:
+            like_post(fan, self.post.pk)
+        # Liking again after an unlike does not count the actor twice
+        unlike_post(self.fans[4], self.post.pk)
+        like_post(self.fans[4], self.post.pk)
+
+        [notification] = self.notifications()
+        self.assertEqual(notification['actor_count'], 5)
+        self.assertEqual(notification['recent_actor_ids'], [fan.pk for fan in self.fans[2:]])
+        self.assertEqual(notification['actor']['username'], 'fan4')
+        self.assertEqual(notification['summary'], 'fan4 and 4 others liked your post')
+
+    def test_read_group_is_closed(self):
+        like_post(self.fans[0], self.post.pk)
+        notification = Notification.objects.get()
+        notification.mark_as_read()
+        bulk_like(self.fans[1], [self.post.pk])
+
+        summaries = [item['summary'] for item in self.notifications()]
+        self.assertEqual(summaries, ['fan1 liked your post', 'fan0 liked your post'])
+
+        # Reopening the old group would clash with the new one: it detaches
+        notification.mark_as_unread()
+        notification.refresh_from_db()
+        self.assertFalse(notification.is_read)
+        self.assertIsNone(notification.group_key)
+
+    def test_follows_and_comments_are_grouped(self):
+        for fan in self.fans[:3]:
+            fan.follow(self.author)
+            Notification.create_comment_notification(recipient=self.author, actor=fan, target=self.post)
+
+        self.assertEqual(
+            sorted(item['summary'] for item in self.notifications()),
+            ['fan2 and 2 others commented on your post', 'fan2 and 2 others started following you']
+        )
+
+
+class NotificationCounterTests(TestCase):
+    """Unread/total counters follow every change and are read by primary key"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.posts = [
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+            for i in range(3)
+        ]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def counts(self):
+        response = self.client.get('/api/notifications/notifications/count/')
+        self.assertEqual(response.status_code, 200)
+        return response.data['unread_count'], response.data['total_count']
+
+    def test_counters(self):
+        self.assertEqual(self.counts(), (0, 0))
+        with self.assertNumQueries(1):
+            self.assertEqual(counters.get_counts(self.author.pk), (0, 0))
+
+        bulk_like(self.fan, [post.pk for post in self.posts])
+        # Grouped into the open notification: not counted again
+        unlike_post(self.fan, self.posts[0].pk)
+        like_post(self.fan, self.posts[0].pk)
+        self.fan.follow(self.author)
+        self.assertEqual(self.counts(), (4, 4))
+
+        notification = Notification.objects.filter(notification_type='follow').get()
+        self.client.post(f'/api/notifications/notifications/{notification.pk}/mark_as_read/')
+        self.client.post(f'/api/notifications/notifications/{notification.pk}/mark_as_read/')
+        self.assertEqual(self.counts(), (3, 4))
+        self.client.post(f'/api/notifications/notifications/{notification.pk}/mark_as_unread/')
+        self.assertEqual(self.counts(), (4, 4))
+        self.client.patch(
+            f'/api/notifications/notifications/{notification.pk}/', {'is_read': True}, format='json'
+        )
+        self.assertEqual(self.counts(), (3, 4))
+
+        self.client.delete(f'/api/notifications/notifications/{notification.pk}/')
+        self.assertEqual(self.counts(), (3, 3))
+        response = self.client.post('/api/notifications/notifications/mark_all_as_read/')
+        self.assertEqual(response.data['updated_count'], 3)
+        self.assertEqual(self.counts(), (0, 3))
+        self.assertEqual(self.author.get_unread_notifications_count(), 0)
+
+    def test_mark_all_as_read_queries(self):
+        for i in range(30):
+            actor = CustomUser.objects.create_user(f'actor{i}', password='testpass123')
+            Notification.objects.create(
+                recipient=self.author, actor=actor, verb='followed you', notification_type='follow'
+            )
+        self.assertEqual(self.counts(), (30, 30))
+        # Lock the counter, count per recipient, update, adjust (in a savepoint)
+        with self.assertNumQueries(6):
+            self.assertEqual(counters.set_read(Notification.objects.filter(recipient=self.author)), 30)
+        self.assertEqual(self.counts(), (0, 30))
+
+    def test_reconcile(self):
+        like_post(self.fan, self.posts[0].pk)
+        self.assertEqual(self.counts(), (1, 1))
+        # Bypasses the counters
+        Notification.objects.update(is_read=True)
+        self.assertEqual(list(counters.reconcile()), [(1, 1)])
+        self.assertEqual(self.counts(), (0, 1))
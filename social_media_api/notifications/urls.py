@@ -6,6 +6,7 @@ router = DefaultRouter()
 router.register(r'notifications', NotificationViewSet, basename='notification')
 
 urlpatterns = [
-    path('', include(router.urls)),
+    # Before the router, whose detail route would otherwise match "count"
     path('notifications/count/', NotificationCountView.as_view(), name='notification-count'),
+    path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -3,6 +3,7 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.db.models import Q
+from . import counters
 from .models import Notification
 from .serializers import (
     NotificationSerializer, 
@@ -16,15 +17,26 @@ class NotificationViewSet(viewsets.ModelViewSet):
     """
     serializer_class = NotificationSerializer
     permission_classes = [permissions.IsAuthenticated]
+    cursor_ordering = ('-timestamp', '-id')
     
     def get_queryset(self):
-        return Notification.objects.filter(recipient=self.request.user)
+        queryset = Notification.objects.filter(recipient=self.request.user)
+        if self.get_serializer_class() is NotificationSerializer:
+            queryset = NotificationSerializer.setup_eager_loading(queryset)
+        return queryset
     
     def get_serializer_class(self):
         if self.action in ['update', 'partial_update']:
             return NotificationUpdateSerializer
         return NotificationSerializer
     
+    def perform_update(self, serializer):
+        # Through set_read so the unread counter follows the change
+        if 'is_read' in serializer.validated_data:
+            is_read = serializer.validated_data['is_read']
+            counters.set_read(Notification.objects.filter(pk=serializer.instance.pk), is_read=is_read)
+            serializer.instance.is_read = is_read
+    
     @action(detail=False, methods=['get'])
     def unread(self, request):
         """Get unread notifications"""
@@ -40,7 +52,9 @@ class NotificationViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['post'])
     def mark_all_as_read(self, request):
         """Mark all notifications as read"""
-        updated_count = self.get_queryset().filter(is_read=False).update(is_read=True)
+        updated_count = counters.set_read(
+            Notification.objects.filter(recipient=request.user), is_read=True
+        )
         return Response({
             'detail': f'Marked {updated_count} notifications as read.',
             'updated_count': updated_count
@@ -62,16 +76,13 @@ class NotificationViewSet(viewsets.ModelViewSet):
 
 class NotificationCountView(APIView):
     """
-    Get notification counts for the current user.
+    Get notification counts for the current user, read from the user's
+    maintained counter row (see notifications.counters).
     """
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        unread_count = Notification.objects.filter(
-            recipient=request.user, 
-            is_read=False
-        ).count()
-        total_count = Notification.objects.filter(recipient=request.user).count()
+        unread_count, total_count = counters.get_counts(request.user.pk)
         
         serializer = NotificationCountSerializer({
             'unread_count': unread_count,
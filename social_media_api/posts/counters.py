@@ -0,0 +1,128 @@
+"""
+Denormalized like/comment counters on Post.
+
+Counters are changed with single UPDATE statements using F() expressions so
+concurrent writers never overwrite each other; the same statement moves the
+post's ranking score (see posts.ranking) and bumps its version. ``reconcile`` repairs any
+drift against the Like and Comment tables in batches.
+"""
+import threading
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from . import ranking
+from .models import Post, Comment, Like
+
+_state = threading.local()
+
+
+@contextmanager
+def suspended():
+    """Skip signal-driven counter updates, e.g. while bulk loading rows"""
+    previous = getattr(_state, 'suspended', False)
+    _state.suspended = True
+    try:
+        yield
+    finally:
+        _state.suspended = previous
+
+
+def is_suspended():
+    return getattr(_state, 'suspended', False)
+
+
+def _delta(field, amount):
+    if amount < 0:
+        return Greatest(F(field) + amount, Value(0))
+    return F(field) + amount
+
+
+def counter_updates(likes=0, comments=0):
+    """Keyword arguments for ``QuerySet.update()`` applying the given deltas"""
+    updates = {}
+    if likes:
+        updates['likes_count'] = _delta('likes_count', likes)
+    if comments:
+        updates['comments_count'] = _delta('comments_count', comments)
+    if updates:
+        updates['score'] = ranking.score_update(likes=likes, comments=comments)
+        updates['version'] = F('version') + 1
+    return updates
+
+
+def adjust(post_ids, likes=0, comments=0):
+    """Atomically add the deltas to every post in ``post_ids``"""
+    updates = counter_updates(likes=likes, comments=comments)
+    if not updates:
+        return 0
+    if isinstance(post_ids, int):
+        post_ids = [post_ids]
+    return Post.objects.filter(pk__in=post_ids).update(**updates)
+
+
+def adjust_each(post_counts, likes=0, comments=0):
+    """
+    Apply the deltas ``n`` times to each post of the ``{post_id: n}``
+    mapping; posts with the same ``n`` share one UPDATE.
+    """
+    by_amount = defaultdict(list)
+    for post_id, amount in Counter(post_counts).items():
+        by_amount[amount].append(post_id)
+    for amount, post_ids in by_amount.items():
+        adjust(post_ids, likes=likes * amount, comments=comments * amount)
+
+
+def _actual_count(model):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        ),
+        0
+    )
+
+
+def reconcile(batch_size=1000, post_ids=None):
+    """
+    Recompute counters that drifted from the Like/Comment tables.
+    Yields ``(checked, repaired)`` after each batch.
+    """
+    queryset = Post.objects.order_by('pk')
+    if post_ids is not None:
+        queryset = queryset.filter(pk__in=post_ids)
+
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk)
+            .annotate(
+                actual_likes=_actual_count(Like),
+                actual_comments=_actual_count(Comment)
+            )
+            .values_list(
+                'pk', 'likes_count', 'comments_count',
+                'actual_likes', 'actual_comments'
+            )[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1][0]
+
+        drifted = [
+            pk for pk, likes, comments, actual_likes, actual_comments in batch
+            if likes != actual_likes or comments != actual_comments
+        ]
+        if drifted:
+            # Recount inside the UPDATE so writes racing with the check win
+            Post.objects.filter(pk__in=drifted).update(
+                likes_count=_actual_count(Like),
+                comments_count=_actual_count(Comment),
+                version=F('version') + 1
+            )
+        yield len(batch), len(drifted)
@@ -0,0 +1,170 @@
+"""
+Materialized home feeds.
+
+Posts are pushed into a FeedEntry row per follower when they are created
+(fan-out on write), so reading a feed is a range scan over the owner's
+entries. Authors with more followers than FEED_FANOUT_MAX_FOLLOWERS are not
+fanned out; their posts keep ``is_fanned_out=False`` and are pulled into the
+feed at read time instead.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db.models import F, Q
+
+from .models import Post, FeedEntry
+
+# Order of get_feed_queryset(), also the feed's cursor pagination key
+FEED_ORDERING = ('-feed_created_at', '-feed_post_id')
+
+
+def fanout_max_followers():
+    return getattr(settings, 'FEED_FANOUT_MAX_FOLLOWERS', 10000)
+
+
+def fanout_batch_size():
+    return getattr(settings, 'FEED_FANOUT_BATCH_SIZE', 1000)
+
+
+def backfill_limit():
+    return getattr(settings, 'FEED_BACKFILL_LIMIT', 200)
+
+
+def _bulk_insert(entries):
+    """Insert entries in batches, ignoring rows that already exist"""
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= fanout_batch_size():
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """
+    Push a newly created post into the feeds of its author and followers.
+    Returns False when the author is above the fan-out threshold and the
+    post is left to the pull path.
+    """
+    User = get_user_model()
+    follower_count = User.objects.filter(pk=post.author_id).values_list(
+        'followers_count', flat=True
+    ).first()
+    if (follower_count or 0) > fanout_max_followers():
+        return False
+
+    followers = User.objects.filter(following=post.author_id)
+
+    owner_ids = [post.author_id]
+    owner_ids_iter = followers.values_list('id', flat=True).iterator(
+        chunk_size=fanout_batch_size()
+    )
+    _bulk_insert(
+        FeedEntry(
+            owner_id=owner_id,
+            post_id=post.pk,
+            author_id=post.author_id,
+            created_at=post.created_at
+        )
+        for ids in (owner_ids, owner_ids_iter)
+        for owner_id in ids
+    )
+    Post.objects.filter(pk=post.pk).update(is_fanned_out=True)
+    post.is_fanned_out = True
+    return True
+
+
+def backfill_feed(owner_id, author_id):
+    """Copy an author's most recent fanned-out posts into a new follower's feed"""
+    recent_posts = Post.objects.filter(
+        author_id=author_id,
+        is_fanned_out=True
+    ).order_by('-created_at').values_list('id', 'created_at')[:backfill_limit()]
+    _bulk_insert(
+        FeedEntry(
+            owner_id=owner_id,
+            post_id=post_id,
+            author_id=author_id,
+            created_at=created_at
+        )
+        for post_id, created_at in recent_posts
+    )
+
+
+def backfill_feed_many(owner_id, author_ids):
+    """
+    Copy the most recent fanned-out posts of several newly followed authors
+    into a feed with one query, up to FEED_BACKFILL_LIMIT posts in total
+    """
+    recent_posts = Post.objects.filter(
+        author_id__in=author_ids,
+        is_fanned_out=True
+    ).order_by('-created_at').values_list('id', 'author_id', 'created_at')[:backfill_limit()]
+    _bulk_insert(
+        FeedEntry(
+            owner_id=owner_id,
+            post_id=post_id,
+            author_id=author_id,
+            created_at=created_at
+        )
+        for post_id, author_id, created_at in recent_posts
+    )
+
+
+def trim_feed(owner_id, author_id):
+    """Remove an unfollowed author's posts from a feed"""
+    FeedEntry.objects.filter(owner_id=owner_id, author_id=author_id).delete()
+
+
+def rebuild_feed(user, limit=None):
+    """Rebuild one user's materialized feed from the follow graph"""
+    FeedEntry.objects.filter(owner=user).delete()
+    author_ids = list(user.following.values_list('id', flat=True)) + [user.id]
+    posts = Post.objects.filter(
+        author_id__in=author_ids,
+        is_fanned_out=True
+    ).order_by('-created_at').values_list('id', 'author_id', 'created_at')
+    if limit:
+        posts = posts[:limit]
+    _bulk_insert(
+        FeedEntry(
+            owner_id=user.id,
+            post_id=post_id,
+            author_id=author_id,
+            created_at=created_at
+        )
+        for post_id, author_id, created_at in posts
+    )
+
+
+def get_feed_queryset(user):
+    """
+    Posts in the user's home feed, newest first, annotated with the
+    ``feed_created_at``/``feed_post_id`` key they are ordered by.
+
+    When every followed author is fanned out the posts are read in the
+    order of the user's (owner, created_at, post) FeedEntry index, and only
+    the page read is joined to its posts. Posts that were not fanned out
+    (high-follower authors, or posts created before feeds were materialized)
+    are merged in from the pull path only when the user actually follows
+    such an author.
+    """
+    followed = user.following.values('id')
+    pulled_author_ids = list(
+        Post.objects.filter(is_fanned_out=False)
+        .filter(Q(author_id__in=followed) | Q(author_id=user.id))
+        .values_list('author_id', flat=True)
+        .distinct()
+    )
+    if not pulled_author_ids:
+        feed = Post.objects.filter(feed_entries__owner=user).annotate(
+            feed_created_at=F('feed_entries__created_at'),
+            feed_post_id=F('feed_entries__post_id')
+        )
+    else:
+        feed = Post.objects.filter(
+            Q(pk__in=FeedEntry.objects.filter(owner=user).values('post_id'))
+            | Q(author_id__in=pulled_author_ids, is_fanned_out=False)
+        ).annotate(feed_created_at=F('created_at'), feed_post_id=F('id'))
+    return feed.order_by(*FEED_ORDERING)
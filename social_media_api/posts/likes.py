@@ -0,0 +1,196 @@
+"""
+Which posts a viewer has liked.
+
+Each user's liked post ids are cached as a compact sorted array of 64-bit
+ints, built lazily from the user's most recent likes, under a key holding
+a per-user version token. A like or unlike does not touch that array: when
+it commits, it writes a small per-post change key under the same version,
+which lookups read together with the array. Writers never read-modify-write
+a shared entry, so concurrent ones cannot lose each other's changes, and a
+build racing a like is corrected by the change key written at its commit.
+Bulk imports replace the version token instead, dropping the whole entry.
+Entries expire after LIKED_POSTS_CACHE_TIMEOUT and are culled by the cache
+backend under memory pressure; a user with more than LIKED_POSTS_CACHE_SIZE
+likes gets a partial set, and lookups it cannot answer fall back to the
+database.
+"""
+import uuid
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Like
+
+
+def cache_size():
+    return getattr(settings, 'LIKED_POSTS_CACHE_SIZE', 5000)
+
+
+def cache_timeout():
+    return getattr(settings, 'LIKED_POSTS_CACHE_TIMEOUT', 6 * 60 * 60)
+
+
+def _version_key(user_id):
+    return f'posts:liked-version:{user_id}'
+
+
+def _cache_key(user_id, version):
+    return f'posts:liked:{user_id}:{version}'
+
+
+def _change_key(user_id, version, post_id):
+    return f'posts:liked-change:{user_id}:{version}:{post_id}'
+
+
+def _version(user_id):
+    version = cache.get(_version_key(user_id))
+    if version is None:
+        cache.add(_version_key(user_id), uuid.uuid4().hex, cache_timeout())
+        version = cache.get(_version_key(user_id))
+    return version
+
+
+class LikedPostIds:
+    """Sorted array of the ids of posts liked by one user"""
+
+    def __init__(self, post_ids, complete=True):
+        self.ids = array('q', sorted(set(post_ids)))
+        # False when older likes were left out to bound the size
+        self.complete = complete
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, post_id):
+        index = bisect_left(self.ids, post_id)
+        return index < len(self.ids) and self.ids[index] == post_id
+
+
+def _get_liked_post_ids(user_id, version):
+    key = _cache_key(user_id, version)
+    liked = cache.get(key)
+    if liked is None:
+        size = cache_size()
+        post_ids = list(
+            Like.objects.filter(user_id=user_id)
+            .order_by('-created_at')
+            .values_list('post_id', flat=True)[:size + 1]
+        )
+        liked = LikedPostIds(post_ids[:size], complete=len(post_ids) <= size)
+        cache.set(key, liked, cache_timeout())
+    return liked
+
+
+def get_liked_post_ids(user_id):
+    """
+    The cached liked post ids of ``user_id`` as of when they were built,
+    without the likes and unlikes recorded since; see ``liked_among``.
+    """
+    return _get_liked_post_ids(user_id, _version(user_id))
+
+
+def liked_among(user_id, post_ids):
+    """The ids in ``post_ids`` that ``user_id`` has liked"""
+    post_ids = set(post_ids)
+    if not post_ids:
+        return set()
+    version = _version(user_id)
+    liked = _get_liked_post_ids(user_id, version)
+    keys = {_change_key(user_id, version, post_id): post_id for post_id in post_ids}
+    changes = {keys[key]: value for key, value in cache.get_many(keys).items()}
+
+    result = set()
+    unknown = []
+    for post_id in post_ids:
+        if post_id in changes:
+            if changes[post_id]:
+                result.add(post_id)
+        elif post_id in liked:
+            result.add(post_id)
+        elif not liked.complete:
+            unknown.append(post_id)
+    if unknown:
+        result.update(
+            Like.objects.filter(user_id=user_id, post_id__in=unknown).values_list('post_id', flat=True)
+        )
+    return result
+
+
+def record_likes(user_id, liked=(), unliked=()):
+    """Apply likes and unlikes of ``user_id`` to its cached ids on commit"""
+    changes = {post_id: True for post_id in liked}
+    changes.update((post_id, False) for post_id in unliked)
+    if not changes:
+        return
+
+    def record():
+        version = _version(user_id)
+        # Outlive any set built from before the change, which may have
+        # been cached just after this
+        cache.set_many(
+            {_change_key(user_id, version, post_id): value for post_id, value in changes.items()},
+            2 * cache_timeout()
+        )
+
+    transaction.on_commit(record)
+
+
+def invalidate_liked_post_ids(user_ids):
+    """Drop the cached liked post ids of ``user_ids`` now and on commit"""
+    user_ids = list(user_ids)
+    if not user_ids:
+        return
+
+    def invalidate():
+        cache.set_many(
+            {_version_key(user_id): uuid.uuid4().hex for user_id in user_ids},
+            cache_timeout()
+        )
+
+    invalidate()
+    transaction.on_commit(invalidate)
+
+
+class LikedPostsResolver:
+    """
+    Which of the posts rendered in one response the viewer has liked.
+
+    Post ids are queued with ``prime()`` and answered together the first
+    time any of them is looked up, from the viewer's cached liked post ids
+    and the changes recorded since; only a partial cache entry needs a
+    query, for the ids it does not contain.
+    """
+
+    def __init__(self, viewer):
+        self.viewer = viewer if viewer is not None and viewer.is_authenticated else None
+        self.liked_ids = set()
+        self._pending = set()
+        self._loaded = set()
+
+    def prime(self, post_ids):
+        self._pending |= set(post_ids) - self._loaded
+
+    def is_liked(self, post_id):
+        if self.viewer is None:
+            return False
+        missing = (self._pending | {post_id}) - self._loaded
+        self._pending = set()
+        if missing:
+            self._loaded |= missing
+            self.liked_ids |= liked_among(self.viewer.pk, missing)
+        return post_id in self.liked_ids
+
+
+def get_liked_posts(context):
+    """The resolver shared by every serializer rendering with ``context``"""
+    resolver = context.get('liked_posts')
+    if resolver is None:
+        request = context.get('request')
+        # Public (cached) representations are rendered without a viewer
+        viewer = None if context.get('public') else getattr(request, 'user', None)
+        resolver = LikedPostsResolver(viewer)
+        context['liked_posts'] = resolver
+    return resolver
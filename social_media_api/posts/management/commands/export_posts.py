@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import ndjson
+
+
+class Command(BaseCommand):
+    help = 'Export posts, comments and likes as NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write to (default: standard output)'
+        )
+        parser.add_argument(
+            '--type', action='append', dest='types', choices=list(ndjson.RECORD_TYPES),
+            help='Only export this record type (repeatable)'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=2000,
+            help='Number of rows fetched from the database at a time'
+        )
+
+    def handle(self, *args, **options):
+        types = options['types'] or list(ndjson.RECORD_TYPES)
+        lines = ndjson.export_lines(types, chunk_size=options['chunk_size'])
+
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        try:
+            output = open(options['output'], 'w', encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        exported = 0
+        with output:
+            for line in lines:
+                output.write(line)
+                exported += 1
+                if exported % 10000 == 0:
+                    self.stdout.write(f'Exported {exported} rows...')
+        self.stdout.write(self.style.SUCCESS(f'Exported {exported} rows to {options["output"]}.'))
@@ -0,0 +1,72 @@
+import os
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts import ndjson
+
+
+class Command(BaseCommand):
+    help = 'Import posts, comments and likes from an NDJSON export'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='NDJSON file to import, or - for standard input')
+        parser.add_argument(
+            '--chunk-size', type=int, default=1000,
+            help='Number of rows inserted per transaction'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            help='File recording the last committed line; an existing '
+                 'checkpoint resumes the import after that line'
+        )
+        parser.add_argument(
+            '--skip-finalize', action='store_true',
+            help='Do not update counters, scores and feeds afterwards'
+        )
+
+    def handle(self, *args, **options):
+        checkpoint = options['checkpoint']
+        start = self._read_checkpoint(checkpoint)
+        if start:
+            self.stdout.write(f'Resuming after line {start}.')
+
+        def progress(line_number, stats):
+            if checkpoint:
+                with open(checkpoint, 'w') as handle:
+                    handle.write(str(line_number))
+            self.stdout.write(
+                f'Line {line_number}: {stats["post"]} posts, {stats["comment"]} comments, '
+                f'{stats["like"]} likes imported, {stats["skipped"]} skipped...'
+            )
+
+        try:
+            source = sys.stdin if options['path'] == '-' else open(options['path'], encoding='utf-8')
+        except OSError as error:
+            raise CommandError(error)
+        with source:
+            try:
+                stats = ndjson.import_lines(
+                    source, chunk_size=options['chunk_size'], start=start, progress=progress
+                )
+            except ndjson.InvalidRecord as error:
+                raise CommandError(f'{error}. Rows before it were imported; fix the line and run again.')
+
+        if not options['skip_finalize']:
+            self.stdout.write('Updating counters, scores and feeds...')
+            # A resumed import does not know which posts earlier runs touched
+            ndjson.finalize_import(None if start else stats['post_ids'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {stats["post"]} posts, {stats["comment"]} comments and '
+            f'{stats["like"]} likes; skipped {stats["skipped"]} rows.'
+        ))
+
+    def _read_checkpoint(self, checkpoint):
+        if not checkpoint or not os.path.exists(checkpoint):
+            return 0
+        with open(checkpoint) as handle:
+            try:
+                return int(handle.read().strip() or 0)
+            except ValueError:
+                raise CommandError(f'Invalid checkpoint file {checkpoint}')
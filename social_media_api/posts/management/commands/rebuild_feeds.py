@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+
+from posts import feed
+from posts.models import Post, FeedEntry
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home feeds from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='Only rebuild the feed of this user id (repeatable)'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=1000,
+            help='Maximum number of entries materialized per feed'
+        )
+
+    def handle(self, *args, **options):
+        User = get_user_model()
+        users = User.objects.order_by('id')
+
+        if options['user_ids']:
+            users = users.filter(id__in=options['user_ids'])
+        else:
+            self._reset_fanout_flags()
+
+        rebuilt = 0
+        for user in users.iterator(chunk_size=500):
+            with transaction.atomic():
+                feed.rebuild_feed(user, limit=options['limit'])
+            rebuilt += 1
+            if rebuilt % 500 == 0:
+                self.stdout.write(f'Rebuilt {rebuilt} feeds...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} feeds.'))
+
+    def _reset_fanout_flags(self):
+        """Decide again which authors are fanned out and drop every entry"""
+        User = get_user_model()
+        pulled_authors = User.objects.annotate(
+            num_followers=Count('followers')
+        ).filter(num_followers__gt=feed.fanout_max_followers()).values('id')
+
+        with transaction.atomic():
+            FeedEntry.objects.all().delete()
+            Post.objects.exclude(author__in=pulled_authors).update(is_fanned_out=True)
+            Post.objects.filter(author__in=pulled_authors).update(is_fanned_out=False)
@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from posts import ranking
+from posts.models import Post
+
+
+class Command(BaseCommand):
+    help = 'Recompute the time-decayed ranking score of recent posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=72,
+            help='Only recompute posts created in the last N hours'
+        )
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every post, ignoring --hours'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts updated per batch'
+        )
+
+    def handle(self, *args, **options):
+        queryset = Post.objects.all()
+        if not options['all']:
+            since = timezone.now() - timedelta(hours=options['hours'])
+            queryset = queryset.filter(created_at__gte=since)
+
+        total = 0
+        for updated in ranking.recompute(queryset, batch_size=options['batch_size']):
+            total += updated
+            self.stdout.write(f'Recomputed {total} scores...')
+
+        self.stdout.write(self.style.SUCCESS(f'Recomputed {total} post scores.'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Repair drift in the denormalized like/comment counters on posts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of posts checked per batch'
+        )
+        parser.add_argument(
+            '--post', type=int, action='append', dest='post_ids',
+            help='Only reconcile this post id (repeatable)'
+        )
+
+    def handle(self, *args, **options):
+        checked = repaired = 0
+        for batch_checked, batch_repaired in counters.reconcile(
+            batch_size=options['batch_size'],
+            post_ids=options['post_ids']
+        ):
+            checked += batch_checked
+            repaired += batch_repaired
+            self.stdout.write(f'Checked {checked} posts, repaired {repaired}...')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Reconciled {checked} posts; {repaired} had drifted counters.'
+        ))
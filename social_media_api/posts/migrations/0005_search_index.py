@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.db import migrations
+
+
+class VendorRunSQL(migrations.RunSQL):
+    """RunSQL that only runs on one database vendor"""
+
+    def __init__(self, vendor, *args, **kwargs):
+        self.vendor = vendor
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, args, kwargs = super().deconstruct()
+        return name, (self.vendor, *args), kwargs
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == self.vendor:
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
+
+
+def sqlite_fts(table, columns):
+    """External-content FTS5 table, sync triggers and initial population"""
+    fts = f'{table}_fts'
+    names = ', '.join(columns)
+    new_values = ', '.join(f'new.{column}' for column in columns)
+    old_values = ', '.join(f'old.{column}' for column in columns)
+    return VendorRunSQL(
+        'sqlite',
+        sql=[
+            f"CREATE VIRTUAL TABLE {fts} USING fts5("
+            f"{names}, content='{table}', content_rowid='id', "
+            f"tokenize='unicode61 remove_diacritics 2')",
+            f"CREATE TRIGGER {fts}_ai AFTER INSERT ON {table} BEGIN "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+            f"CREATE TRIGGER {fts}_ad AFTER DELETE ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+            f"CREATE TRIGGER {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+            f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+            f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+            f"INSERT INTO {fts}({fts}) VALUES ('rebuild')",
+        ],
+        reverse_sql=[
+            f"DROP TRIGGER IF EXISTS {fts}_au",
+            f"DROP TRIGGER IF EXISTS {fts}_ad",
+            f"DROP TRIGGER IF EXISTS {fts}_ai",
+            f"DROP TABLE IF EXISTS {fts}",
+        ],
+    )
+
+
+def postgresql_search_vector(table, columns):
+    """Weighted generated tsvector column and its GIN index"""
+    config = getattr(settings, 'SEARCH_TEXT_CONFIG', 'english')
+    vector = ' || '.join(
+        f"setweight(to_tsvector('{config}', coalesce({column}, '')), '{label}')"
+        for column, label in columns
+    )
+    return VendorRunSQL(
+        'postgresql',
+        sql=[
+            f"ALTER TABLE {table} ADD COLUMN search_vector tsvector "
+            f"GENERATED ALWAYS AS ({vector}) STORED",
+            f"CREATE INDEX {table}_search_vector_idx ON {table} USING GIN (search_vector)",
+        ],
+        reverse_sql=[
+            f"DROP INDEX IF EXISTS {table}_search_vector_idx",
+            f"ALTER TABLE {table} DROP COLUMN IF EXISTS search_vector",
+        ],
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0004_post_counters'),
+    ]
+
+    operations = [
+        sqlite_fts('posts_post', ['title', 'content']),
+        sqlite_fts('posts_comment', ['content']),
+        postgresql_search_vector('posts_post', [('title', 'A'), ('content', 'B')]),
+        postgresql_search_vector('posts_comment', [('content', 'A')]),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.7 on 2026-10-18 05:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_post_version'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='feedentry',
+            index=models.Index(fields=['owner', '-created_at', '-post'], name='posts_feede_owner_i_42645e_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='feedentry',
+            name='posts_feede_owner_i_914082_idx',
+        ),
+    ]
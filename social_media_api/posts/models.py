@@ -12,20 +12,29 @@ class Post(models.Model):
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # False until the post has been pushed into its followers' feeds;
+    # posts by high-follower authors stay False and are pulled at read time
+    is_fanned_out = models.BooleanField(default=False)
+    # Denormalized counters, kept in sync by posts.signals / posts.counters
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
+    # Time-decayed popularity, see posts.ranking
+    score = models.FloatField(default=0)
+    # Bumped whenever the post's likes or comments change; together with
+    # updated_at it validates cached representations (ETags)
+    version = models.PositiveIntegerField(default=0)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['-likes_count', '-id']),
+            models.Index(fields=['-score', '-id']),
+            models.Index(fields=['is_fanned_out', 'author']),
+        ]
     
     def __str__(self):
         return f"{self.title} by {self.author.username}"
-    
-    @property
-    def likes_count(self):
-        return self.likes.count()
-    
-    @property
-    def comments_count(self):
-        return self.comments.count()
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -44,6 +53,10 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['post', 'created_at', 'id']),
+        ]
     
     def __str__(self):
         return f"Comment by {self.author.username} on {self.post.title}"
@@ -64,6 +77,42 @@ class Like(models.Model):
     class Meta:
         unique_together = ['post', 'user']  # Prevent duplicate likes
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id']),
+            models.Index(fields=['post', '-created_at', '-id']),
+            models.Index(fields=['user', '-created_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.user.username} likes {self.post.title}"
+
+class FeedEntry(models.Model):
+    """A post materialized into one user's home feed (fan-out on write)"""
+    owner = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries'
+    )
+    # Denormalized from the post so unfollow can trim entries without a join
+    author = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name='+'
+    )
+    created_at = models.DateTimeField()
+    
+    class Meta:
+        unique_together = ['owner', 'post']
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['owner', '-created_at', '-post']),
+            models.Index(fields=['owner', 'author']),
+        ]
     
     def __str__(self):
-        return f"{self.user.username} likes {self.post.title}"
\ No newline at end of file
+        return f"{self.post_id} in feed of {self.owner_id}"
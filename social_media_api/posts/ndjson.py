@@ -0,0 +1,209 @@
+"""
+Bulk NDJSON export and import of posts, comments and likes.
+
+Each line is one JSON object tagged with its ``type``; an export lists all
+posts, then comments, then likes, so a file can be imported in order.
+Exports stream rows through ``iterator()`` (a server-side cursor on
+PostgreSQL) and run in constant memory.
+
+Imports insert rows with their original ids in chunks of ``bulk_create``,
+one transaction per chunk. Rows that already exist are skipped, so an
+interrupted import can simply be run again, or resumed after the last
+committed line. Signal side effects (counters, notifications, feed fan-out,
+scores, cached liked post ids) do not run per row; ``finalize_import``
+brings them up to date in batches once every chunk is in.
+"""
+import datetime
+import json
+
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils.dateparse import parse_datetime
+
+from . import counters, feed, likes, ranking
+from .models import Post, Comment, Like
+
+# type -> (model, exported fields, {foreign key field: referenced model})
+RECORD_TYPES = {
+    'post': (
+        Post,
+        ('id', 'author_id', 'title', 'content', 'created_at', 'updated_at'),
+        {'author_id': get_user_model},
+    ),
+    'comment': (
+        Comment,
+        ('id', 'post_id', 'author_id', 'content', 'created_at', 'updated_at'),
+        {'post_id': lambda: Post, 'author_id': get_user_model},
+    ),
+    'like': (
+        Like,
+        ('id', 'post_id', 'user_id', 'created_at'),
+        {'post_id': lambda: Post, 'user_id': get_user_model},
+    ),
+}
+DATETIME_FIELDS = ('created_at', 'updated_at')
+# Largest id a BIGINT column holds
+MAX_ID = 2 ** 63 - 1
+
+
+class InvalidRecord(ValueError):
+    """A line of an NDJSON import cannot be read"""
+
+    def __init__(self, line_number, message):
+        super().__init__(f'Line {line_number}: {message}')
+        self.line_number = line_number
+
+
+class RecordEncoder(DjangoJSONEncoder):
+    """Keeps full microsecond precision so timestamps round-trip exactly"""
+
+    def default(self, o):
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def export_lines(types=tuple(RECORD_TYPES), chunk_size=2000):
+    """Yield NDJSON lines for every row of the requested record types"""
+    for record_type in types:
+        model, fields, _ = RECORD_TYPES[record_type]
+        rows = model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size)
+        for row in rows:
+            record = {'type': record_type, **dict(zip(fields, row))}
+            yield json.dumps(record, cls=RecordEncoder) + '\n'
+
+
+def _parse(line_number, line):
+    try:
+        record = json.loads(line)
+    except ValueError as error:
+        raise InvalidRecord(line_number, f'invalid JSON ({error})')
+    if not isinstance(record, dict) or record.get('type') not in RECORD_TYPES:
+        raise InvalidRecord(line_number, 'expected an object with a known "type"')
+
+    model, fields, _ = RECORD_TYPES[record['type']]
+    missing = [field for field in fields if record.get(field) is None]
+    if missing:
+        raise InvalidRecord(line_number, f'missing {", ".join(missing)}')
+    values = {field: record[field] for field in fields}
+    _, _, references = RECORD_TYPES[record['type']]
+    for field in ('id', *references):
+        value = values[field]
+        if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_ID:
+            raise InvalidRecord(line_number, f'{field} must be a positive integer')
+    for field in DATETIME_FIELDS:
+        if field in values:
+            values[field] = parse_datetime(str(values[field]))
+            if values[field] is None:
+                raise InvalidRecord(line_number, f'invalid {field}')
+    return record['type'], values
+
+
+def _insert_chunk(record_type, rows):
+    """Insert rows of one type in one transaction; returns the rows kept"""
+    model, fields, references = RECORD_TYPES[record_type]
+
+    # Skip rows pointing at users or posts that do not exist
+    for field, referenced in references.items():
+        ids = {row[field] for row in rows}
+        known = set(referenced().objects.filter(pk__in=ids).values_list('pk', flat=True))
+        rows = [row for row in rows if row[field] in known]
+
+    timestamp_fields = [field for field in DATETIME_FIELDS if field in fields]
+    with transaction.atomic(), counters.suspended():
+        # Skip rows imported before; ignore_conflicts covers the rest (e.g.
+        # a like of the same post by the same user under another id)
+        existing = set(
+            model.objects.filter(pk__in=[row['id'] for row in rows]).values_list('pk', flat=True)
+        )
+        rows = [row for row in rows if row['id'] not in existing]
+        model.objects.bulk_create([model(**row) for row in rows], ignore_conflicts=True)
+        # Keep only the rows actually inserted
+        inserted = set(
+            model.objects.filter(pk__in=[row['id'] for row in rows]).values_list('pk', flat=True)
+        )
+        rows = [row for row in rows if row['id'] in inserted]
+        # bulk_create stamps auto_now/auto_now_add fields with the current
+        # time; put the exported timestamps back
+        model.objects.bulk_update([model(**row) for row in rows], timestamp_fields)
+    return rows
+
+
+def import_lines(lines, chunk_size=1000, start=0, progress=None):
+    """
+    Import NDJSON ``lines``, skipping the first ``start`` lines. Rows are
+    committed in chunks; ``progress(line_number, stats)`` is called after
+    each committed chunk, and ``line_number`` is a safe point to resume
+    from. Returns the stats: rows imported per type, rows skipped, and the
+    ids of the posts whose rows changed.
+    """
+    stats = {'post': 0, 'comment': 0, 'like': 0, 'skipped': 0, 'post_ids': set()}
+    chunk_type = None
+    chunk = []
+    chunk_end = start
+
+    def flush():
+        rows = _insert_chunk(chunk_type, chunk)
+        stats[chunk_type] += len(rows)
+        stats['skipped'] += len(chunk) - len(rows)
+        key = 'id' if chunk_type == 'post' else 'post_id'
+        stats['post_ids'].update(row[key] for row in rows)
+        if progress is not None:
+            progress(chunk_end, stats)
+
+    for line_number, line in enumerate(lines, 1):
+        if line_number <= start:
+            continue
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if line.strip():
+            record_type, values = _parse(line_number, line)
+            if chunk and (record_type != chunk_type or len(chunk) >= chunk_size):
+                flush()
+                chunk = []
+            chunk_type = record_type
+            chunk.append(values)
+        chunk_end = line_number
+    if chunk:
+        flush()
+    return stats
+
+
+def finalize_import(post_ids=None, batch_size=1000):
+    """
+    Bring derived data up to date after an import: sequences, counters,
+    ranking scores, feeds and the cached liked post ids of the posts'
+    likers. ``post_ids`` limits the work to the imported posts; None
+    processes every post (e.g. after a resumed import).
+    """
+    with connection.cursor() as cursor:
+        for statement in connection.ops.sequence_reset_sql(no_style(), [Post, Comment, Like]):
+            cursor.execute(statement)
+
+    if post_ids is None:
+        batches = [None]
+    else:
+        post_ids = sorted(post_ids)
+        batches = [post_ids[i:i + batch_size] for i in range(0, len(post_ids), batch_size)]
+
+    for batch in batches:
+        for _ in counters.reconcile(batch_size=batch_size, post_ids=batch):
+            pass
+
+        posts = Post.objects.all()
+        if batch is not None:
+            posts = posts.filter(pk__in=batch)
+        for _ in ranking.recompute(posts, batch_size=batch_size):
+            pass
+
+        likers = Like.objects.order_by().values_list('user_id', flat=True).distinct()
+        if batch is not None:
+            likers = likers.filter(post_id__in=batch)
+        likes.invalidate_liked_post_ids(likers)
+
+        # Imported posts are served by the feed's pull path until fanned out
+        pending = posts.filter(is_fanned_out=False).only('pk', 'author_id', 'created_at')
+        for post in pending.order_by('pk').iterator(chunk_size=batch_size):
+            feed.fan_out_post(post)
@@ -0,0 +1,93 @@
+"""
+Precomputed "top posts" ranking.
+
+Each post stores a time-decayed score::
+
+    score = log10(max(likes * LIKE_WEIGHT + comments * COMMENT_WEIGHT, 1))
+            + (created_at - EPOCH) / DECAY_SECONDS
+
+Newer posts start higher, and every tenfold increase in engagement is
+worth DECAY_SECONDS of age. Because age enters through the post's creation
+time, scores never need to be decayed as time passes; likes and comments
+adjust the engagement term in the same UPDATE that changes the counters,
+and ``recompute_post_scores`` periodically recomputes a window of recent
+posts exactly to remove floating point drift.
+"""
+import datetime
+import math
+
+from django.conf import settings
+from django.db.models import F, Value
+from django.db.models.functions import Greatest, Log
+from django.utils import timezone
+from rest_framework.filters import OrderingFilter
+
+EPOCH = datetime.datetime(2025, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def like_weight():
+    return int(getattr(settings, 'RANKING_LIKE_WEIGHT', 1))
+
+
+def comment_weight():
+    return int(getattr(settings, 'RANKING_COMMENT_WEIGHT', 3))
+
+
+def decay_seconds():
+    return float(getattr(settings, 'RANKING_DECAY_SECONDS', 45000))
+
+
+def hot_score(likes_count, comments_count, created_at):
+    engagement = likes_count * like_weight() + comments_count * comment_weight()
+    age = (created_at - EPOCH).total_seconds()
+    return math.log10(max(engagement, 1)) + age / decay_seconds()
+
+
+def initial_score(created_at=None):
+    return hot_score(0, 0, created_at or timezone.now())
+
+
+def score_update(likes=0, comments=0):
+    """
+    Expression moving ``score`` by the change in the engagement term caused
+    by the given counter deltas. Column references read the values from
+    before the UPDATE, so it must run in the same statement as the counter
+    change.
+    """
+    engagement = F('likes_count') * like_weight() + F('comments_count') * comment_weight()
+    delta = likes * like_weight() + comments * comment_weight()
+    return (
+        F('score')
+        + Log(10, Greatest(engagement + delta, Value(1)))
+        - Log(10, Greatest(engagement, Value(1)))
+    )
+
+
+def recompute(queryset, batch_size=1000):
+    """Recompute exact scores for ``queryset``; yields the rows done per batch"""
+    from .models import Post
+
+    last_pk = 0
+    while True:
+        batch = list(
+            queryset.filter(pk__gt=last_pk).order_by('pk')
+            .only('pk', 'likes_count', 'comments_count', 'created_at', 'score')[:batch_size]
+        )
+        if not batch:
+            return
+        last_pk = batch[-1].pk
+        for post in batch:
+            post.score = hot_score(post.likes_count, post.comments_count, post.created_at)
+        Post.objects.bulk_update(batch, ['score'])
+        yield len(batch)
+
+
+class RankedOrderingFilter(OrderingFilter):
+    """OrderingFilter that also accepts ``?ordering=top`` for the ranking"""
+    aliases = {'top': ['-score', '-id']}
+
+    def remove_invalid_fields(self, queryset, fields, view, request):
+        expanded = []
+        for term in fields:
+            expanded.extend(self.aliases.get(term, [term]))
+        return super().remove_invalid_fields(queryset, expanded, view, request)
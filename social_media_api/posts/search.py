@@ -0,0 +1,146 @@
+"""
+Full-text search over posts and comments.
+
+The index is chosen by database engine:
+
+* SQLite: an external-content FTS5 table per model, kept in sync by
+  triggers on insert, update and delete.
+* PostgreSQL: a generated ``search_vector`` tsvector column with a GIN index.
+
+Both are created by migration posts.0005_search_index.
+
+Other engines fall back to ``icontains`` matching. Search terms are
+prefix-matched and results are ranked (bm25 / ts_rank) unless the request
+asks for an explicit ``?ordering=``.
+"""
+import re
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.settings import api_settings
+
+# Indexed columns per table, with their relative ranking weight
+SEARCH_INDEXES = {
+    'posts_post': (('title', 10.0, 'A'), ('content', 1.0, 'B')),
+    'posts_comment': (('content', 1.0, 'A'),),
+}
+
+TERM_RE = re.compile(r'\w+', re.UNICODE)
+MAX_TERMS = 10
+
+
+def search_config():
+    return getattr(settings, 'SEARCH_TEXT_CONFIG', 'english')
+
+
+def _sqlite_triggers(table, columns):
+    """The FTS5 sync triggers created by migration posts.0005_search_index"""
+    fts = f'{table}_fts'
+    names = ', '.join(column for column, _, _ in columns)
+    new_values = ', '.join(f'new.{column}' for column, _, _ in columns)
+    old_values = ', '.join(f'old.{column}' for column, _, _ in columns)
+    return [
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); END",
+        f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {names} ON {table} BEGIN "
+        f"INSERT INTO {fts}({fts}, rowid, {names}) VALUES ('delete', old.id, {old_values}); "
+        f"INSERT INTO {fts}(rowid, {names}) VALUES (new.id, {new_values}); END",
+    ]
+
+
+def repair_search_triggers(connection):
+    """
+    Recreate missing FTS5 sync triggers. SQLite migrations rebuild a table
+    (dropping its triggers) for many schema changes, so this runs after
+    every migrate; it does nothing before the index has been installed.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    existing_tables = set(connection.introspection.table_names())
+    with connection.cursor() as cursor:
+        for table, columns in SEARCH_INDEXES.items():
+            if f'{table}_fts' in existing_tables:
+                for statement in _sqlite_triggers(table, columns):
+                    cursor.execute(statement)
+
+
+def search_terms(text):
+    return TERM_RE.findall(text or '')[:MAX_TERMS]
+
+
+def search(queryset, terms):
+    """
+    Restrict ``queryset`` to rows matching every term (as a prefix) and
+    annotate them with ``search_rank``, higher being more relevant.
+    """
+    table = queryset.model._meta.db_table
+    columns = SEARCH_INDEXES[table]
+    connection = connections[queryset.db]
+
+    if connection.vendor == 'sqlite':
+        fts = f'{table}_fts'
+        match = ' '.join(f'"{term}"*' for term in terms)
+        weights = ', '.join(str(weight) for _, weight, _ in columns)
+        return queryset.filter(
+            pk__in=RawSQL(f'SELECT rowid FROM {fts} WHERE {fts} MATCH %s', (match,))
+        ).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({fts}, {weights}) FROM {fts} '
+            f'WHERE {fts} MATCH %s AND {fts}.rowid = {table}.id',
+            (match,),
+            output_field=FloatField()
+        ))
+
+    if connection.vendor == 'postgresql':
+        config = search_config()
+        query = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(RawSQL(
+            f'{table}.search_vector @@ to_tsquery(%s::regconfig, %s)',
+            (config, query),
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank({table}.search_vector, to_tsquery(%s::regconfig, %s))',
+            (config, query),
+            output_field=FloatField()
+        ))
+
+    condition = Q()
+    for term in terms:
+        term_condition = Q()
+        for column, _, _ in columns:
+            term_condition |= Q(**{f'{column}__icontains': term})
+        condition &= term_condition
+    return queryset.filter(condition)
+
+
+class FullTextSearchFilter(BaseFilterBackend):
+    """
+    ``?search=`` backed by the full-text index of the view's model.
+    Results are ordered by relevance unless ``?ordering=`` is given.
+    """
+    search_param = api_settings.SEARCH_PARAM
+    ordering_param = api_settings.ORDERING_PARAM
+
+    def filter_queryset(self, request, queryset, view):
+        terms = search_terms(request.query_params.get(self.search_param, ''))
+        if not terms:
+            return queryset
+        queryset = search(queryset, terms)
+        if 'search_rank' in queryset.query.annotations and not request.query_params.get(self.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-id')
+        return queryset
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                'name': self.search_param,
+                'required': False,
+                'in': 'query',
+                'description': 'Full-text search terms (prefix matched).',
+                'schema': {'type': 'string'},
+            },
+        ]
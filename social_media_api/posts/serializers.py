@@ -1,8 +1,13 @@
+from django.db.models import Prefetch
 from rest_framework import serializers
+from .likes import get_liked_posts
 from .models import Post, Comment, Like
-from accounts.serializers import UserProfileSerializer
+from .services import batch_max_posts
+from accounts.relationships import add_relationships, get_relationships
+from accounts.serializers import BatchListSerializer, UserProfileSerializer
+from social_media_api.fieldsets import SparseFieldsetMixin, requested
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserProfileSerializer(read_only=True)
     author_id = serializers.PrimaryKeyRelatedField(
         source='author',
@@ -14,21 +19,39 @@ class CommentSerializer(serializers.ModelSerializer):
         model = Comment
         fields = ['id', 'post', 'author', 'author_id', 'content', 'created_at', 'updated_at']
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('author')
+    
+    def prime_page(self, comments):
+        if 'author' in self.fields:
+            get_relationships(self.context).prime(comment.author_id for comment in comments)
     
     def create(self, validated_data):
         # Set the author to the current user
         validated_data['author'] = self.context['request'].user
         return super().create(validated_data)
 
-class LikeSerializer(serializers.ModelSerializer):
+class LikeSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     user = UserProfileSerializer(read_only=True)
     
     class Meta:
         model = Like
         fields = ['id', 'post', 'user', 'created_at']
         read_only_fields = ['id', 'created_at']
+        list_serializer_class = BatchListSerializer
+    
+    @staticmethod
+    def setup_eager_loading(queryset):
+        return queryset.select_related('user')
+    
+    def prime_page(self, likes):
+        if 'user' in self.fields:
+            get_relationships(self.context).prime(like.user_id for like in likes)
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     author = UserProfileSerializer(read_only=True)
     author_id = serializers.PrimaryKeyRelatedField(
         source='author',
@@ -49,18 +72,140 @@ class PostSerializer(serializers.ModelSerializer):
             'likes_count', 'comments_count', 'is_liked'
         ]
         read_only_fields = ['id', 'created_at', 'updated_at']
+        list_serializer_class = BatchListSerializer
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        """
+        Load everything a page of posts renders in a fixed number of queries.
+        ``fields`` is the requested sparse fieldset; relations that are not
+        rendered are not loaded.
+        """
+        if requested(fields, 'author'):
+            queryset = queryset.select_related('author')
+        if requested(fields, 'comments'):
+            queryset = queryset.prefetch_related(
+                Prefetch('comments', queryset=Comment.objects.select_related('author'))
+            )
+        if requested(fields, 'likes'):
+            queryset = queryset.prefetch_related(
+                Prefetch('likes', queryset=Like.objects.select_related('user'))
+            )
+        return queryset
+    
+    def get_page_users(self, post):
+        """Ids of the users rendered inside ``post``"""
+        user_ids = []
+        if 'author' in self.fields:
+            user_ids.append(post.author_id)
+        if 'comments' in self.fields:
+            user_ids.extend(comment.author_id for comment in post.comments.all())
+        if 'likes' in self.fields:
+            user_ids.extend(like.user_id for like in post.likes.all())
+        return user_ids
+    
+    def prime_page(self, posts):
+        """Queue like state and relationships for a page of posts"""
+        relationships = get_relationships(self.context)
+        for post in posts:
+            relationships.prime(self.get_page_users(post))
+        get_liked_posts(self.context).prime(post.pk for post in posts)
+    
+    def to_representation(self, instance):
+        if self.parent is None:
+            self.prime_page([instance])
+        return super().to_representation(instance)
     
     def get_is_liked(self, obj):
-        request = self.context.get('request')
-        if request and request.user.is_authenticated:
-            return obj.likes.filter(user=request.user).exists()
-        return False
+        return get_liked_posts(self.context).is_liked(obj.pk)
+    
+    def add_viewer_state(self, posts, items):
+        """Fill the viewer's flags into cached representations of ``posts``"""
+        liked_posts = get_liked_posts(self.context)
+        liked_posts.prime(post.pk for post in posts)
+        for post, item in zip(posts, items):
+            if 'is_liked' in item:
+                item['is_liked'] = liked_posts.is_liked(post.pk)
+        add_relationships(self.context, items)
     
     def create(self, validated_data):
         # Set the author to the current user
         validated_data['author'] = self.context['request'].user
         return super().create(validated_data)
 
+class PostSummarySerializer(PostSerializer):
+    """
+    Post representation for list views. Instead of every comment and like it
+    embeds the latest few comments and a summary of the most recent likers;
+    the full lists are paginated under /posts/<id>/comments/ and /likes/.
+    """
+    preview_size = 3
+    
+    comments = None
+    likes = None
+    latest_comments = CommentSerializer(many=True, read_only=True, source='preview_comments')
+    liker_summary = serializers.SerializerMethodField()
+    
+    class Meta(PostSerializer.Meta):
+        fields = [
+            'id', 'author', 'author_id', 'title', 'content',
+            'created_at', 'updated_at', 'latest_comments', 'liker_summary',
+            'likes_count', 'comments_count', 'is_liked'
+        ]
+    
+    @classmethod
+    def setup_eager_loading(cls, queryset, fields=None):
+        if requested(fields, 'author'):
+            queryset = queryset.select_related('author')
+        if requested(fields, 'latest_comments'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'comments',
+                queryset=Comment.objects.select_related('author')
+                .order_by('-created_at', '-id')[:cls.preview_size],
+                to_attr='preview_comments'
+            ))
+        if requested(fields, 'liker_summary'):
+            queryset = queryset.prefetch_related(Prefetch(
+                'likes',
+                queryset=Like.objects.select_related('user')
+                .order_by('-created_at', '-id')[:cls.preview_size],
+                to_attr='preview_likes'
+            ))
+        return queryset
+    
+    def get_page_users(self, post):
+        user_ids = []
+        if 'author' in self.fields:
+            user_ids.append(post.author_id)
+        if 'latest_comments' in self.fields:
+            user_ids.extend(comment.author_id for comment in self.get_preview_comments(post))
+        return user_ids
+    
+    def get_preview_comments(self, post):
+        if not hasattr(post, 'preview_comments'):
+            post.preview_comments = list(
+                post.comments.select_related('author')
+                .order_by('-created_at', '-id')[:self.preview_size]
+            )
+        return post.preview_comments
+    
+    def get_preview_likes(self, post):
+        if not hasattr(post, 'preview_likes'):
+            post.preview_likes = list(
+                post.likes.select_related('user')
+                .order_by('-created_at', '-id')[:self.preview_size]
+            )
+        return post.preview_likes
+    
+    def get_liker_summary(self, obj):
+        return {
+            'count': obj.likes_count,
+            'recent': [
+                {'id': like.user_id, 'username': like.user.username}
+                for like in self.get_preview_likes(obj)
+            ],
+        }
+
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
@@ -68,4 +213,23 @@ class PostCreateSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data['author'] = self.context['request'].user
-        return super().create(validated_data)
\ No newline at end of file
+        return super().create(validated_data)
+
+class LikeBatchSerializer(serializers.Serializer):
+    """Post ids to read (GET ``?ids=``) or to like and unlike in bulk"""
+    ids = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    
+    def validate(self, attrs):
+        if set(attrs['like']) & set(attrs['unlike']):
+            raise serializers.ValidationError('A post cannot be liked and unliked in the same request.')
+        post_ids = set(attrs['ids']) | set(attrs['like']) | set(attrs['unlike'])
+        if not post_ids:
+            raise serializers.ValidationError('No post ids given.')
+        if len(post_ids) > batch_max_posts():
+            raise serializers.ValidationError(
+                f'At most {batch_max_posts()} posts can be handled per request.'
+            )
+        attrs['post_ids'] = sorted(post_ids)
+        return attrs
@@ -0,0 +1,142 @@
+"""
+Like and unlike a post.
+
+Every like entry point goes through these functions so concurrent requests
+behave the same everywhere: the post is looked up by primary key only for
+its author, the like is inserted inside a savepoint so a duplicate from a
+racing request surfaces as "already liked" instead of an IntegrityError,
+and the counter update (see posts.signals) and notification commit together
+with the like.
+
+The batch functions serve clients showing many posts at once: like state
+for a page of posts is read in one query, and bulk likes/unlikes use one
+INSERT, one DELETE, one counter UPDATE and one notification upsert (likes
+of a post are grouped, see notifications.grouping).
+"""
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, OuterRef
+from django.http import Http404
+
+from . import counters
+from .likes import record_likes
+from .models import Post, Like
+
+
+def batch_max_posts():
+    return getattr(settings, 'LIKE_BATCH_MAX_POSTS', 300)
+
+
+def _post_id(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise Http404('No Post matches the given query.')
+
+
+def _post_author_id(post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list('author_id', flat=True).first()
+    if author_id is None:
+        raise Http404('No Post matches the given query.')
+    return author_id
+
+
+def like_post(user, post_id):
+    """
+    Like ``post_id`` as ``user``. Returns ``(like, created)``; ``like`` is
+    None when the post was already liked.
+    """
+    post_id = _post_id(post_id)
+    author_id = _post_author_id(post_id)
+
+    with transaction.atomic():
+        try:
+            with transaction.atomic():
+                like = Like.objects.create(user=user, post_id=post_id)
+        except IntegrityError:
+            return None, False
+
+        if author_id != user.pk:
+            _notify_likes(user, {post_id: author_id})
+    return like, True
+
+
+def unlike_post(user, post_id):
+    """Remove ``user``'s like of ``post_id``; returns whether one existed"""
+    post_id = _post_id(post_id)
+    # Racing unlikes can both load the row before one deletes it, so the
+    # counter follows the rows actually deleted rather than the signals
+    with transaction.atomic(), counters.suspended():
+        deleted, _ = Like.objects.filter(user=user, post_id=post_id).delete()
+        if deleted:
+            counters.adjust(post_id, likes=-deleted)
+    if not deleted:
+        _post_author_id(post_id)
+    return bool(deleted)
+
+
+def like_states(user, post_ids):
+    """The viewer's like state and the counters of ``post_ids``, in one query"""
+    return list(
+        Post.objects.filter(pk__in=post_ids)
+        .annotate(is_liked=Exists(Like.objects.filter(post=OuterRef('pk'), user=user)))
+        .order_by('pk')
+        .values('id', 'is_liked', 'likes_count', 'comments_count')
+    )
+
+
+def _notify_likes(user, author_ids):
+    """Record like notifications; ``author_ids`` maps post id to author"""
+    from notifications.grouping import notify
+    from notifications.models import Notification
+    content_type = ContentType.objects.get_for_model(Post)
+    notify([
+        Notification(
+            recipient_id=author_id,
+            actor=user,
+            verb='liked your post',
+            notification_type='like',
+            target_content_type=content_type,
+            target_object_id=post_id
+        )
+        for post_id, author_id in author_ids.items()
+        if author_id != user.pk
+    ])
+
+
+def bulk_like(user, post_ids):
+    """Like every existing post in ``post_ids``; returns the ids newly liked"""
+    author_ids = dict(Post.objects.filter(pk__in=post_ids).values_list('pk', 'author_id'))
+    liked = set(
+        Like.objects.filter(user=user, post_id__in=author_ids).values_list('post_id', flat=True)
+    )
+    new_ids = sorted(set(author_ids) - liked)
+    if not new_ids:
+        return []
+
+    try:
+        with transaction.atomic():
+            Like.objects.bulk_create([Like(user=user, post_id=post_id) for post_id in new_ids])
+            counters.adjust(new_ids, likes=1)
+            _notify_likes(user, {post_id: author_ids[post_id] for post_id in new_ids})
+            record_likes(user.pk, liked=new_ids)
+    except IntegrityError:
+        # A concurrent request liked some of these posts first
+        return [post_id for post_id in new_ids if like_post(user, post_id)[1]]
+    return new_ids
+
+
+def bulk_unlike(user, post_ids):
+    """Remove ``user``'s likes of ``post_ids``; returns the ids unliked"""
+    with transaction.atomic(), counters.suspended():
+        # Lock the rows so the counters follow exactly the likes deleted here
+        unliked = sorted(
+            Like.objects.select_for_update()
+            .filter(user=user, post_id__in=post_ids)
+            .values_list('post_id', flat=True)
+        )
+        if unliked:
+            Like.objects.filter(user=user, post_id__in=unliked).delete()
+            counters.adjust(unliked, likes=-1)
+    return unliked
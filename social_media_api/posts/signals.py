@@ -0,0 +1,129 @@
+from django.contrib.auth import get_user_model
+from django.db import connections
+from django.db.models import Count, F, QuerySet
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import counters, feed, likes, ranking, search
+from .models import Post, Comment, Like, FeedEntry
+
+
+@receiver(pre_save, sender=Post)
+def set_initial_score(sender, instance, **kwargs):
+    if instance._state.adding and not instance.score:
+        instance.score = ranking.hot_score(
+            instance.likes_count, instance.comments_count,
+            instance.created_at or timezone.now()
+        )
+
+
+@receiver(post_save, sender=Post)
+def fan_out_new_post(sender, instance, created, **kwargs):
+    """Push new posts into their followers' feeds"""
+    if created:
+        feed.fan_out_post(instance)
+
+
+def _deleted_directly(sender, origin):
+    """
+    Whether a row was deleted on its own rather than by cascade from its
+    post or user. Cascades keep per-row receivers away from counters: the
+    post is gone anyway, and a deleted user's rows are counted off in bulk
+    by ``uncount_deleted_user``.
+    """
+    if isinstance(origin, QuerySet):
+        return origin.model is sender
+    return isinstance(origin, sender)
+
+
+@receiver(post_save, sender=Like)
+def count_new_like(sender, instance, created, **kwargs):
+    if created and not counters.is_suspended():
+        counters.adjust(instance.post_id, likes=1)
+
+
+@receiver(post_delete, sender=Like)
+def count_deleted_like(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(sender, origin) and not counters.is_suspended():
+        counters.adjust(instance.post_id, likes=-1)
+
+
+@receiver(post_save, sender=Like)
+def cache_new_like(sender, instance, created, **kwargs):
+    if created:
+        likes.record_likes(instance.user_id, liked=[instance.post_id])
+
+
+@receiver(post_delete, sender=Like)
+def cache_deleted_like(sender, instance, origin=None, **kwargs):
+    # A cascade leaves only ids of deleted posts, or of a deleted user, behind
+    if _deleted_directly(sender, origin):
+        likes.record_likes(instance.user_id, unliked=[instance.post_id])
+
+
+@receiver(post_save, sender=Comment)
+def count_new_comment(sender, instance, created, **kwargs):
+    if created and not counters.is_suspended():
+        counters.adjust(instance.post_id, comments=1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, origin=None, **kwargs):
+    if _deleted_directly(sender, origin) and not counters.is_suspended():
+        counters.adjust(instance.post_id, comments=-1)
+
+
+@receiver(pre_delete, sender=get_user_model())
+def uncount_deleted_user(sender, instance, **kwargs):
+    """Take a deleted user's likes and comments off other authors' posts, one UPDATE per count"""
+    if counters.is_suspended():
+        return
+    for model, user_field, counter in ((Like, 'user', 'likes'), (Comment, 'author', 'comments')):
+        rows = (
+            model.objects.filter(**{user_field: instance})
+            .exclude(post__author=instance)
+            .order_by()
+            .values('post_id')
+            .annotate(n=Count('pk'))
+        )
+        counters.adjust_each({row['post_id']: row['n'] for row in rows}, **{counter: -1})
+
+
+@receiver(post_save, sender=Comment)
+def version_edited_comment(sender, instance, created, **kwargs):
+    """New and deleted comments bump the version with the counter"""
+    if not created:
+        Post.objects.filter(pk=instance.post_id).update(version=F('version') + 1)
+
+
+def _follow_pairs(instance, reverse, pk_set):
+    """Yield (follower_id, followee_id) pairs for a followers m2m change"""
+    for pk in pk_set or ():
+        if reverse:
+            # instance.following changed: instance is the follower
+            yield instance.pk, pk
+        else:
+            # instance.followers changed: instance is the followee
+            yield pk, instance.pk
+
+
+@receiver(m2m_changed, sender=get_user_model().followers.through)
+def sync_feed_with_follows(sender, instance, action, reverse, pk_set, **kwargs):
+    """Backfill feeds on follow and trim them on unfollow"""
+    if action == 'post_add':
+        for follower_id, followee_id in _follow_pairs(instance, reverse, pk_set):
+            feed.backfill_feed(follower_id, followee_id)
+    elif action == 'post_remove':
+        for follower_id, followee_id in _follow_pairs(instance, reverse, pk_set):
+            feed.trim_feed(follower_id, followee_id)
+    elif action == 'pre_clear':
+        if reverse:
+            FeedEntry.objects.filter(owner=instance).exclude(author=instance).delete()
+        else:
+            FeedEntry.objects.filter(author=instance).exclude(owner=instance).delete()
+
+
+def repair_search_index(sender, using, **kwargs):
+    """Restore FTS sync triggers dropped by table rebuilds during migrate"""
+    search.repair_search_triggers(connections[using])
@@ -1,3 +1,905 @@
-from django.test import TestCase
+import base64
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from accounts.models import CustomUser
+from accounts.services import follow_user, unfollow_user
+from notifications.models import Notification
+from social_media_api import fragments
+from . import likes, ndjson, ranking
+from .models import Post, Comment, Like, FeedEntry
+
+
+def clear_caches():
+    for cache in caches.all():
+        cache.clear()
+
+
+class FeedTests(TestCase):
+    """Home feeds are materialized on write and pulled for large authors"""
+
+    def setUp(self):
+        self.reader = CustomUser.objects.create_user('reader', password='testpass123')
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.other = CustomUser.objects.create_user('other', password='testpass123')
+
+    def feed(self, user=None):
+        return list((user or self.reader).get_feed_posts())
+
+    def test_posts_fan_out_to_followers(self):
+        follow_user(self.reader, self.author)
+        post = Post.objects.create(author=self.author, title='Post', content='Content')
+        own = Post.objects.create(author=self.reader, title='Own', content='Content')
+        Post.objects.create(author=self.other, title='Other', content='Content')
+
+        self.assertTrue(post.is_fanned_out)
+        self.assertTrue(FeedEntry.objects.filter(owner=self.reader, post=post).exists())
+        self.assertEqual(self.feed(), [own, post])
+
+    def test_feed_reads_entries_in_index_order(self):
+        follow_user(self.reader, self.author)
+        Post.objects.create(author=self.author, title='Post', content='Content')
+        if connection.vendor == 'sqlite':
+            plan = self.reader.get_feed_posts().explain()
+            self.assertIn('posts_feedentry USING COVERING INDEX', plan)
+            self.assertNotIn('TEMP B-TREE', plan)
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_large_authors_are_pulled(self):
+        follow_user(self.reader, self.author)
+        pulled = Post.objects.create(author=self.author, title='Pulled', content='Content')
+        self.assertFalse(pulled.is_fanned_out)
+        self.assertFalse(FeedEntry.objects.filter(post=pulled).exists())
+        self.assertEqual(self.feed(), [pulled])
+        self.assertEqual(self.feed(self.other), [])
+
+    @override_settings(FEED_BACKFILL_LIMIT=2)
+    def test_follow_backfills_and_unfollow_trims(self):
+        posts = [Post.objects.create(author=self.author, title=f'Post {i}', content='Content') for i in range(3)]
+        follow_user(self.reader, self.author)
+        self.assertEqual(self.feed(), posts[:0:-1])
+
+        unfollow_user(self.reader, self.author)
+        self.assertEqual(self.feed(), [])
+        self.assertFalse(FeedEntry.objects.filter(owner=self.reader).exists())
+
+    def test_rebuild_feeds(self):
+        follow_user(self.reader, self.author)
+        post = Post.objects.create(author=self.author, title='Post', content='Content')
+        FeedEntry.objects.all().delete()
+        Post.objects.update(is_fanned_out=False)
+
+        call_command('rebuild_feeds', stdout=io.StringIO())
+        self.assertTrue(Post.objects.get(pk=post.pk).is_fanned_out)
+        self.assertEqual(self.feed(), [post])
+        self.assertEqual(self.feed(self.author), [post])
+
+
+class PostCounterTests(TestCase):
+    """likes_count/comments_count follow every like and comment change"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def counts(self):
+        self.post.refresh_from_db()
+        return self.post.likes_count, self.post.comments_count
+
+    def test_likes(self):
+        self.assertEqual(self.client.post(f'/api/posts/posts/{self.post.pk}/like/').status_code, 201)
+        self.assertEqual(self.client.post(f'/api/posts/posts/{self.post.pk}/like/').status_code, 200)
+        self.assertEqual(self.counts(), (1, 0))
+
+        self.client.post(f'/api/posts/posts/{self.post.pk}/unlike/')
+        self.client.post(f'/api/posts/posts/{self.post.pk}/unlike/')
+        self.assertEqual(self.counts(), (0, 0))
+
+    def test_comments(self):
+        response = self.client.post(
+            '/api/posts/comments/', {'post': self.post.pk, 'author_id': self.fan.pk, 'content': 'Nice'}
+        )
+        self.assertEqual(response.status_code, 201)
+        Comment.objects.create(post=self.post, author=self.author, content='Thanks')
+        self.assertEqual(self.counts(), (0, 2))
+
+        self.assertEqual(self.client.delete(f'/api/posts/comments/{response.data["id"]}/').status_code, 204)
+        self.assertEqual(self.counts(), (0, 1))
+
+    def test_reconcile_repairs_drift(self):
+        Like.objects.create(post=self.post, user=self.fan)
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        Post.objects.filter(pk=self.post.pk).update(likes_count=7, comments_count=0)
+
+        output = io.StringIO()
+        call_command('reconcile_post_counters', batch_size=1, stdout=output)
+        self.assertEqual(self.counts(), (1, 1))
+        self.assertIn('Reconciled 2 posts; 1 had drifted counters.', output.getvalue())
+        other.refresh_from_db()
+        self.assertEqual((other.likes_count, other.comments_count), (0, 0))
+
+    def test_cascaded_deletes_skip_per_row_updates(self):
+        fans = CustomUser.objects.bulk_create(
+            CustomUser(username=f'fan{i}', password='testpass123') for i in range(50)
+        )
+        Like.objects.bulk_create(Like(post=self.post, user=fan) for fan in fans)
+        Comment.objects.bulk_create(Comment(post=self.post, author=fan, content='Nice') for fan in fans)
+
+        # Collect and delete likes, comments, feed entries and the post
+        with self.assertNumQueries(6):
+            self.post.delete()
+        self.assertFalse(Like.objects.exists())
+        self.assertFalse(Comment.objects.exists())
+
+    def test_deleted_user_is_counted_off(self):
+        other = Post.objects.create(author=self.author, title='Other', content='Content')
+        own = Post.objects.create(author=self.fan, title='Own', content='Content')
+        for post in (self.post, other, own):
+            Like.objects.create(post=post, user=self.fan)
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        Comment.objects.create(post=self.post, author=self.fan, content='Again')
+        Comment.objects.create(post=self.post, author=self.author, content='Thanks')
+
+        self.fan.delete()
+        self.assertEqual(self.counts(), (0, 1))
+        other.refresh_from_db()
+        self.assertEqual((other.likes_count, other.comments_count), (0, 0))
+
+
+class RankingTests(TestCase):
+    """Top posts are ordered by a precomputed, time-decayed score"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fans = [CustomUser.objects.create_user(f'fan{i}', password='testpass123') for i in range(5)]
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def create_post(self, title, age):
+        post = Post.objects.create(author=self.author, title=title, content='Content')
+        created_at = timezone.now() - age
+        Post.objects.filter(pk=post.pk).update(
+            created_at=created_at, score=ranking.hot_score(0, 0, created_at)
+        )
+        post.refresh_from_db()
+        return post
+
+    def assertScore(self, post):
+        post.refresh_from_db()
+        self.assertAlmostEqual(
+            post.score, ranking.hot_score(post.likes_count, post.comments_count, post.created_at), places=6
+        )
+
+    def test_score_follows_likes_and_comments(self):
+        post = self.create_post('Post', timedelta(hours=1))
+        for fan in self.fans:
+            Like.objects.create(post=post, user=fan)
+        self.assertScore(post)
+        comment = Comment.objects.create(post=post, author=self.fans[0], content='Nice')
+        self.assertScore(post)
+
+        comment.delete()
+        Like.objects.filter(post=post).delete()
+        self.assertScore(post)
+        self.assertEqual(post.score, ranking.hot_score(0, 0, post.created_at))
+
+    def test_top_ordering(self):
+        popular = self.create_post('Popular', timedelta(hours=1))
+        for fan in self.fans:
+            Like.objects.create(post=popular, user=fan)
+        Comment.objects.create(post=popular, author=self.fans[0], content='Nice')
+        fresh = self.create_post('Fresh', timedelta(minutes=1))
+        stale = self.create_post('Stale', timedelta(days=30))
+
+        def titles(url):
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            return [post['title'] for post in response.data['results']]
+
+        self.assertEqual(titles('/api/posts/posts/top/'), ['Popular', 'Fresh', 'Stale'])
+        self.assertEqual(titles('/api/posts/posts/?ordering=top'), ['Popular', 'Fresh', 'Stale'])
+        self.assertEqual(titles('/api/posts/posts/?ordering=top&pagination=cursor'), ['Popular', 'Fresh', 'Stale'])
+        self.assertEqual(titles('/api/posts/posts/'), ['Fresh', 'Popular', 'Stale'])
+
+    def test_recompute_post_scores(self):
+        recent = self.create_post('Recent', timedelta(hours=1))
+        old = self.create_post('Old', timedelta(days=10))
+        Post.objects.update(score=0)
+
+        call_command('recompute_post_scores', stdout=io.StringIO())
+        self.assertScore(recent)
+        old.refresh_from_db()
+        self.assertEqual(old.score, 0)
+
+        call_command('recompute_post_scores', '--all', stdout=io.StringIO())
+        self.assertScore(old)
+
+
+class ListQueryCountTests(TestCase):
+    """List endpoints must render a page in a constant number of queries"""
+
+    def setUp(self):
+        clear_caches()
+        self.viewer = CustomUser.objects.create_user('viewer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = CustomUser.objects.create_user(f'author{i}', password='testpass123')
+            self.viewer.following.add(author)
+            post = Post.objects.create(author=author, title=f'Post {i}', content='Content')
+            commenter = CustomUser.objects.create_user(f'commenter{i}', password='testpass123')
+            Comment.objects.create(post=post, author=commenter, content='Nice')
+            Comment.objects.create(post=post, author=author, content='Thanks')
+            Like.objects.create(post=post, user=commenter)
+            Like.objects.create(post=post, user=self.viewer)
+
+    def count_queries(self, url):
+        # Measure every request with cold caches
+        clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response
+
+    def assertConstantQueries(self, url):
+        self.create_posts(2)
+        small, response = self.count_queries(url)
+        self.create_posts(6)
+        large, response = self.count_queries(url)
+        self.assertGreater(len(response.data['results']), 2)
+        self.assertEqual(small, large)
+        return response
+
+    def test_post_list(self):
+        response = self.assertConstantQueries('/api/posts/posts/')
+        post = response.data['results'][0]
+        self.assertTrue(post['is_liked'])
+        self.assertTrue(post['author']['is_following'])
+        self.assertEqual(post['author']['followers_count'], 1)
+
+    def test_feed(self):
+        self.assertConstantQueries('/api/posts/feed/')
+
+    def test_comment_list(self):
+        self.assertConstantQueries('/api/posts/comments/')
+
+    def test_is_liked_from_cache(self):
+        self.create_posts(3)
+        cold, _ = self.count_queries('/api/posts/feed/')
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get('/api/posts/feed/')
+        self.assertTrue(all(post['is_liked'] for post in response.data['results']))
+        # The viewer's likes are no longer read from the database
+        self.assertEqual(len(context.captured_queries), cold - 1)
+
+        post = Post.objects.get(title='Post 0')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(f'/api/posts/posts/{post.pk}/unlike/')
+        response = self.client.get(f'/api/posts/posts/{post.pk}/')
+        self.assertFalse(response.data['is_liked'])
+
+
+class CursorPaginationTests(TestCase):
+    """Keyset cursors page stably and reject tampered positions"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        for i in range(25):
+            Post.objects.create(author=self.author, title=f'Post {i}', content='Content')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.data
+
+    def ids(self, page):
+        return [post['id'] for post in page['results']]
+
+    def test_next_and_previous_links(self):
+        first = self.get('/api/posts/posts/?pagination=cursor')
+        self.assertNotIn('count', first)
+        self.assertIsNone(first['previous'])
+        second = self.get(first['next'])
+        self.assertIsNone(second['next'])
+
+        ids = self.ids(first) + self.ids(second)
+        expected = list(Post.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertEqual(self.ids(self.get(second['previous'])), self.ids(first))
+
+    def test_pages_are_stable_under_inserts(self):
+        first = self.get('/api/posts/posts/?pagination=cursor')
+        Post.objects.create(author=self.author, title='New', content='Content')
+        second = self.get(first['next'])
+        self.assertEqual(len(second['results']), 5)
+        self.assertFalse(set(self.ids(first)) & set(self.ids(second)))
+
+        # Walking back from the second page returns the same first page
+        self.assertEqual(self.ids(self.get(second['previous'])), self.ids(first))
+
+    def test_invalid_cursors(self):
+        def cursor(payload):
+            return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+        cursors = ['garbage', cursor([1, 2]), cursor({'p': [1]})] + [
+            cursor({'p': position})
+            for position in (['abc', 1], [{'a': 1}, 1], [None, None], ['2024-01-01T00:00:00Z', 'abc'],
+                             ['2024-01-01T00:00:00Z', 10 ** 30])
+        ]
+        for url in ('/api/posts/posts/', '/api/posts/feed/', '/api/notifications/notifications/'):
+            for value in cursors:
+                response = self.client.get(url, {'pagination': 'cursor', 'cursor': value})
+                self.assertEqual(response.status_code, 404, (url, value))
+
+
+class ConditionalGetTests(TestCase):
+    """Polled reads answer 304 until something they render changes"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.reader = CustomUser.objects.create_user('reader', password='testpass123')
+        follow_user(self.reader, self.author)
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        self.client = APIClient()
+        self.client.force_authenticate(self.reader)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+        change()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_post_detail(self):
+        url = f'/api/posts/posts/{self.post.pk}/'
+        self.assertRevalidates(url, lambda: Like.objects.create(post=self.post, user=self.author))
+        self.assertRevalidates(url, lambda: Comment.objects.create(post=self.post, author=self.reader, content='Hi'))
+
+    def test_feed_is_not_conditional(self):
+        response = self.client.get('/api/posts/feed/', HTTP_IF_NONE_MATCH='*')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+
+
+class SearchTests(TestCase):
+    """?search= matches term prefixes through the full-text index"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+        self.tips = Post.objects.create(author=self.author, title='Django tips', content='About python')
+        self.guitar = Post.objects.create(author=self.author, title='Music', content='Django Reinhardt guitar')
+        self.other = Post.objects.create(author=self.author, title='Other', content='Nothing here')
+
+    def search(self, url, text):
+        response = self.client.get(url, {'search': text})
+        self.assertEqual(response.status_code, 200)
+        return [result['id'] for result in response.data['results']]
+
+    def test_prefix_matches_ranked_by_relevance(self):
+        # A title match outweighs a content match
+        self.assertEqual(self.search('/api/posts/posts/', 'djan'), [self.tips.pk, self.guitar.pk])
+        self.assertEqual(self.search('/api/posts/posts/', 'djan guit'), [self.guitar.pk])
+        self.assertEqual(self.search('/api/posts/posts/', 'Réinhardt'), [self.guitar.pk])
+        # Query syntax is not passed through; no terms means no search
+        self.assertEqual(len(self.search('/api/posts/posts/', '"*\'')), 3)
+
+        Comment.objects.create(post=self.other, author=self.author, content='Pythonic code')
+        self.assertEqual(len(self.search('/api/posts/comments/', 'pyth')), 1)
+
+    def test_index_follows_updates_and_deletes(self):
+        self.other.title = 'Django news'
+        self.other.save()
+        self.tips.delete()
+        self.assertEqual(self.search('/api/posts/posts/', 'django'), [self.other.pk, self.guitar.pk])
+        self.assertEqual(self.search('/api/posts/posts/', 'tips'), [])
+
+    def test_triggers_repaired_after_migrate(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('only SQLite keeps the index in sync with triggers')
+        # Rebuilding a table in a migration drops its triggers
+        with connection.cursor() as cursor:
+            for suffix in ('ai', 'ad', 'au'):
+                cursor.execute(f'DROP TRIGGER posts_post_fts_{suffix}')
+        call_command('migrate', verbosity=0)
+
+        post = Post.objects.create(author=self.author, title='Fresh', content='Content')
+        self.assertEqual(self.search('/api/posts/posts/', 'fresh'), [post.pk])
+        post.title = 'Renamed'
+        post.save()
+        self.assertEqual(self.search('/api/posts/posts/', 'renamed'), [post.pk])
+        post.delete()
+        self.assertEqual(self.search('/api/posts/posts/', 'renamed'), [])
+
+
+class LikedPostIdsCacheTests(TestCase):
+    """Likes must never be hidden by a stale cached set of liked post ids"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.first = Post.objects.create(author=self.author, title='First', content='Content')
+        self.second = Post.objects.create(author=self.author, title='Second', content='Content')
+        Like.objects.create(post=self.first, user=self.fan)
+
+    def test_like_between_build_and_cache_write(self):
+        cache_set = cache.set
+
+        def like_then_set(key, value, *args, **kwargs):
+            if key.startswith('posts:liked:'):
+                with self.captureOnCommitCallbacks(execute=True):
+                    Like.objects.create(post=self.second, user=self.fan)
+            return cache_set(key, value, *args, **kwargs)
+
+        with mock.patch.object(cache, 'set', like_then_set):
+            liked = likes.get_liked_post_ids(self.fan.pk)
+        self.assertNotIn(self.second.pk, liked)
+
+        # The change recorded on commit covers the set built before it
+        with self.assertNumQueries(0):
+            liked = likes.liked_among(self.fan.pk, [self.first.pk, self.second.pk])
+        self.assertEqual(liked, {self.first.pk, self.second.pk})
+
+    def test_likes_and_unlikes_apply_to_cached_set(self):
+        self.assertIn(self.first.pk, likes.get_liked_post_ids(self.fan.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            Like.objects.filter(post=self.first, user=self.fan).delete()
+            Like.objects.create(post=self.second, user=self.fan)
+        # Applied without rebuilding the set
+        with self.assertNumQueries(0):
+            liked = likes.liked_among(self.fan.pk, [self.first.pk, self.second.pk])
+        self.assertEqual(liked, {self.second.pk})
+
+    def test_partial_set_falls_back_to_database(self):
+        third = Post.objects.create(author=self.author, title='Third', content='Content')
+        Like.objects.create(post=third, user=self.fan)
+        with self.settings(LIKED_POSTS_CACHE_SIZE=1):
+            self.assertFalse(likes.get_liked_post_ids(self.fan.pk).complete)
+            with self.assertNumQueries(1):
+                liked = likes.liked_among(self.fan.pk, [self.first.pk, self.second.pk, third.pk])
+        self.assertEqual(liked, {self.first.pk, third.pk})
+
+    def test_cascaded_deletes_leave_cached_sets_alone(self):
+        fans = CustomUser.objects.bulk_create(
+            CustomUser(username=f'fan{i}', password='testpass123') for i in range(20)
+        )
+        Like.objects.bulk_create(Like(post=self.first, user=fan) for fan in fans)
+        with mock.patch.object(likes, 'record_likes') as record:
+            self.first.delete()
+        record.assert_not_called()
+
+
+class SparseFieldsetTests(TestCase):
+    """?fields=/?expand= shape responses; list previews stay capped"""
+
+    def setUp(self):
+        clear_caches()
+        self.viewer = CustomUser.objects.create_user('viewer', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.viewer)
+        self.users = [CustomUser.objects.create_user(f'user{i}', password='testpass123') for i in range(5)]
+
+    def create_posts(self, count):
+        for _ in range(count):
+            post = Post.objects.create(author=self.users[0], title='Post', content='Content')
+            for i, user in enumerate(self.users):
+                Comment.objects.create(post=post, author=user, content=f'Comment {i}')
+                Like.objects.create(post=post, user=user)
+        return post
+
+    def get(self, url):
+        clear_caches()
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), json.loads(response.content)
+
+    def test_list_previews_are_capped(self):
+        self.create_posts(1)
+        _, data = self.get('/api/posts/posts/')
+        post = data['results'][0]
+        self.assertNotIn('comments', post)
+        self.assertEqual([c['content'] for c in post['latest_comments']], ['Comment 4', 'Comment 3', 'Comment 2'])
+        self.assertEqual(post['liker_summary']['count'], 5)
+        self.assertEqual([u['username'] for u in post['liker_summary']['recent']], ['user4', 'user3', 'user2'])
+
+    def test_fields(self):
+        post = self.create_posts(1)
+        _, data = self.get('/api/posts/posts/?fields=id,title,author.username,likes_count')
+        self.assertEqual(data['results'][0], {
+            'id': post.pk, 'title': 'Post', 'author': {'username': 'user0'}, 'likes_count': 5
+        })
+
+        _, data = self.get(f'/api/posts/posts/{post.pk}/?fields=id,comments.content')
+        self.assertEqual(set(data), {'id', 'comments'})
+        self.assertEqual(data['comments'][0], {'content': 'Comment 0'})
+
+    def test_nested_objects_as_ids_unless_expanded(self):
+        post = self.create_posts(1)
+        _, data = self.get('/api/posts/posts/?fields=id,author,latest_comments')
+        self.assertEqual(data['results'][0]['author'], self.users[0].pk)
+        self.assertEqual(len(data['results'][0]['latest_comments']), 3)
+        self.assertTrue(all(isinstance(pk, int) for pk in data['results'][0]['latest_comments']))
+
+        _, data = self.get('/api/posts/posts/?fields=id,author&expand=author')
+        self.assertEqual(data['results'][0]['author']['username'], 'user0')
+        self.assertEqual(set(data['results'][0]), {'id', 'author'})
+
+    def test_query_counts(self):
+        self.create_posts(2)
+        full, _ = self.get('/api/posts/posts/')
+        expanded, _ = self.get('/api/posts/posts/?fields=id,author,latest_comments&expand=author,latest_comments')
+        sparse, _ = self.get('/api/posts/posts/?fields=id,title')
+        self.assertLess(sparse, full)
+
+        self.create_posts(6)
+        self.assertEqual(self.get('/api/posts/posts/')[0], full)
+        self.assertEqual(
+            self.get('/api/posts/posts/?fields=id,author,latest_comments&expand=author,latest_comments')[0],
+            expanded
+        )
+
+
+class FragmentCacheTests(TestCase):
+    """Cached post representations are shared between viewers"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.stranger = CustomUser.objects.create_user('stranger', password='testpass123')
+        self.fan.following.add(self.author)
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        Like.objects.create(post=self.post, user=self.fan)
+
+    def get(self, viewer, url):
+        client = APIClient()
+        client.force_authenticate(viewer)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(context.captured_queries), response.data
+
+    def test_viewer_flags_are_not_shared(self):
+        cold, data = self.get(self.fan, '/api/posts/posts/')
+        post = data['results'][0]
+        self.assertTrue(post['is_liked'])
+        self.assertTrue(post['author']['is_following'])
+
+        warm, data = self.get(self.stranger, '/api/posts/posts/')
+        post = data['results'][0]
+        self.assertFalse(post['is_liked'])
+        self.assertFalse(post['author']['is_following'])
+        self.assertEqual(post['likes_count'], 1)
+        self.assertLess(warm, cold)
+
+    def test_concurrent_list_misses_compute_each_post_once(self):
+        computed = []
+        computed_lock = threading.Lock()
+        barrier = threading.Barrier(8)
+
+        def compute_missing(missing):
+            with computed_lock:
+                computed.extend(missing)
+            # Give the other threads time to miss the same keys
+            time.sleep(0.05)
+            return {key: {'key': key} for key in missing}
+
+        def read(keys):
+            barrier.wait()
+            self.assertEqual(fragments.get_many_or_set(keys, compute_missing), [{'key': key} for key in keys])
+
+        pages = [['a', 'b', 'c'], ['c', 'b', 'd'], ['d', 'a']] * 2 + [['b'], ['e', 'a']]
+        threads = [threading.Thread(target=read, args=(keys,)) for keys in pages]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(sorted(computed), ['a', 'b', 'c', 'd', 'e'])
+        self.assertEqual(fragments._flights, {})
+
+    def test_changes_invalidate_cached_post(self):
+        url = f'/api/posts/posts/{self.post.pk}/'
+        _, data = self.get(self.stranger, url)
+        self.assertEqual(len(data['comments']), 1)
+
+        Comment.objects.create(post=self.post, author=self.stranger, content='Hello')
+        _, data = self.get(self.stranger, url)
+        self.assertEqual(len(data['comments']), 2)
+
+        self.stranger.following.add(self.author)
+        self.stranger.refresh_from_db()
+        _, data = self.get(self.stranger, url)
+        self.assertTrue(data['author']['is_following'])
+        self.assertEqual(data['author']['followers_count'], 2)
+
+
+class NDJSONTransferTests(TestCase):
+    """Exports import back into an empty database with derived data rebuilt"""
+
+    def setUp(self):
+        clear_caches()
+        self.author = CustomUser.objects.create_user('author', password='testpass123', is_staff=True)
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.fan.following.add(self.author)
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+        Post.objects.filter(pk=self.post.pk).update(created_at=timezone.now() - timedelta(days=3))
+        self.post.refresh_from_db()
+        Comment.objects.create(post=self.post, author=self.fan, content='Nice')
+        Like.objects.create(post=self.post, user=self.fan)
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def export(self):
+        output = io.StringIO()
+        call_command('export_posts', stdout=output)
+        Post.objects.all().delete()
+        self.assertFalse(FeedEntry.objects.exists())
+        return output.getvalue()
+
+    def import_body(self, body, start=0):
+        return self.client.post(
+            f'/api/posts/import/?start={start}', data=body.encode(), content_type='application/x-ndjson'
+        )
+
+    def assertRestored(self):
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.created_at, self.post.created_at)
+        self.assertEqual((post.likes_count, post.comments_count), (1, 1))
+        self.assertAlmostEqual(post.score, ranking.hot_score(1, 1, post.created_at))
+        self.assertTrue(post.is_fanned_out)
+        self.assertEqual(list(self.fan.get_feed_posts()), [post])
+
+    def test_round_trip(self):
+        data = self.export()
+        self.assertEqual(len(data.splitlines()), 3)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'posts.ndjson')
+            with open(path, 'w') as handle:
+                handle.write(data)
+            call_command('import_posts', path, stdout=io.StringIO())
+        self.assertRestored()
+
+    def test_resume_from_line(self):
+        lines = self.export().splitlines(keepends=True)
+        # An earlier request committed the post, then failed
+        ndjson.import_lines(lines[:1])
+
+        response = self.import_body(''.join(lines), start=1)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, {'posts': 0, 'comments': 1, 'likes': 1, 'skipped': 0})
+        self.assertRestored()
+
+    def test_invalid_ids(self):
+        Post.objects.all().delete()
+        for value in ('"abc"', 'true', '1.5', '-1', str(2 ** 64)):
+            line = (
+                f'{{"type":"post","id":1,"author_id":{value},"title":"T","content":"C",'
+                f'"created_at":"2024-01-01T00:00:00Z","updated_at":"2024-01-01T00:00:00Z"}}\n'
+            )
+            response = self.import_body(line)
+            self.assertEqual(response.status_code, 400, value)
+            self.assertEqual(response.data['resume_after'], 0)
+        self.assertFalse(Post.objects.exists())
+
+    def test_conflicting_likes_are_skipped(self):
+        like = Like.objects.get()
+        self.assertEqual(likes.liked_among(self.fan.pk, [self.post.pk]), {self.post.pk})
+        line = json.dumps({
+            'type': 'like', 'id': like.pk + 100, 'post_id': self.post.pk,
+            'user_id': self.fan.pk, 'created_at': '2024-01-01T00:00:00Z',
+        }) + '\n'
+        response = self.import_body(line)
+        self.assertEqual(response.data['likes'], 0)
+        self.assertEqual(response.data['skipped'], 1)
+        self.assertEqual(Like.objects.get().created_at, like.created_at)
+
+    def test_import_invalidates_liked_post_ids(self):
+        data = self.export()
+        self.assertEqual(likes.liked_among(self.fan.pk, [self.post.pk]), set())
+        self.assertEqual(self.import_body(data).status_code, 200)
+        self.assertEqual(likes.liked_among(self.fan.pk, [self.post.pk]), {self.post.pk})
+
+
+class MentionTests(TestCase):
+    """Mentions are notified in a constant number of queries"""
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.author)
+
+    def create_post(self, content):
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.post('/api/posts/posts/', {'title': 'Hi', 'content': content})
+        self.assertEqual(response.status_code, 201)
+        return len(context.captured_queries), Post.objects.latest('id').pk
+
+    def test_mentions_are_batched(self):
+        for i in range(10):
+            CustomUser.objects.create_user(f'user{i}', password='testpass123')
+        self.create_post('Hello @user0')
+        few, _ = self.create_post('Hello @user0 and @user1')
+        mentions = ' '.join(f'@user{i}' for i in range(10))
+        many, post_id = self.create_post(f'{mentions} @user0 @nobody @author')
+        self.assertEqual(many, few)
+
+        notifications = Notification.objects.filter(
+            notification_type='mention', target_object_id=post_id
+        )
+        self.assertEqual(notifications.count(), 10)
+
+    def test_comment_mentions(self):
+        reader = CustomUser.objects.create_user('reader', password='testpass123')
+        _, post_id = self.create_post('Post')
+        client = APIClient()
+        client.force_authenticate(reader)
+        response = client.post(
+            '/api/posts/comments/',
+            {'post': post_id, 'author_id': reader.pk, 'content': '@author @reader see @author.'}
+        )
+        self.assertEqual(response.status_code, 201)
+        # The author gets the comment notification only
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+        self.assertFalse(Notification.objects.filter(notification_type='mention').exists())
+
+
+class LikeStateTests(TestCase):
+    """Batch like state reads and bulk like/unlike"""
+
+    url = '/api/posts/posts/like-state/'
+
+    def setUp(self):
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.posts = [
+            Post.objects.create(author=self.author if i % 2 else self.fan, title=f'Post {i}', content='Content')
+            for i in range(6)
+        ]
+        self.ids = [post.pk for post in self.posts]
+        self.client = APIClient()
+        self.client.force_authenticate(self.fan)
+
+    def post(self, data):
+        return self.client.post(self.url, data, format='json')
+
+    def assertCountersMatch(self):
+        for post in self.posts:
+            post.refresh_from_db()
+            self.assertEqual(post.likes_count, Like.objects.filter(post=post).count())
+
+    def test_get_in_one_query(self):
+        Like.objects.create(post=self.posts[1], user=self.fan)
+        unknown = max(self.ids) + 1
+        with CaptureQueriesContext(connection) as context:
+            response = self.client.get(self.url, {'ids': ','.join(map(str, self.ids[:3] + [unknown]))})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(context.captured_queries), 1)
+        # Unknown ids are left out
+        self.assertEqual(response.data, [
+            {'id': self.ids[0], 'likes_count': 0, 'comments_count': 0, 'is_liked': False},
+            {'id': self.ids[1], 'likes_count': 1, 'comments_count': 0, 'is_liked': True},
+            {'id': self.ids[2], 'likes_count': 0, 'comments_count': 0, 'is_liked': False},
+        ])
+
+    def test_bulk_like_and_unlike(self):
+        unknown = max(self.ids) + 1
+        response = self.post({'like': self.ids[:4] + [unknown]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([state['id'] for state in response.data], self.ids[:4])
+        self.assertTrue(all(state['is_liked'] for state in response.data))
+        self.assertCountersMatch()
+        # Only the other author's posts notify
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notification_type='like').count(), 2)
+        self.assertFalse(Notification.objects.filter(recipient=self.fan).exists())
+
+        # Mixed, with a repeated like
+        response = self.post({'like': [self.ids[3], self.ids[5]], 'unlike': self.ids[:3]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            {state['id']: state['is_liked'] for state in response.data},
+            {self.ids[0]: False, self.ids[1]: False, self.ids[2]: False, self.ids[3]: True, self.ids[5]: True}
+        )
+        self.assertCountersMatch()
+        self.assertEqual(set(Like.objects.filter(user=self.fan).values_list('post_id', flat=True)),
+                         {self.ids[3], self.ids[5]})
+        self.assertEqual(Notification.objects.filter(recipient=self.author, notification_type='like').count(), 3)
+
+    @override_settings(LIKE_BATCH_MAX_POSTS=3)
+    def test_invalid_batches(self):
+        self.assertEqual(self.client.get(self.url, {'ids': ','.join(map(str, self.ids[:4]))}).status_code, 400)
+        self.assertEqual(self.post({'like': self.ids[:2], 'unlike': self.ids[2:4]}).status_code, 400)
+        self.assertEqual(self.post({'like': [self.ids[0]], 'unlike': [self.ids[0]]}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'ids': 'a,b'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url).status_code, 400)
+        self.assertFalse(Like.objects.exists())
+
+
+class ConcurrentLikeTests(TransactionTestCase):
+    """Racing like/unlike requests must never surface an IntegrityError"""
+
+    clients = 8
+
+    def setUp(self):
+        if connection.vendor == 'sqlite' and connection.is_in_memory_db():
+            self.skipTest('threads cannot share an in-memory SQLite database')
+        self.author = CustomUser.objects.create_user('author', password='testpass123')
+        self.fan = CustomUser.objects.create_user('fan', password='testpass123')
+        self.post = Post.objects.create(author=self.author, title='Post', content='Content')
+
+    def hammer(self, method, path):
+        barrier = threading.Barrier(self.clients)
+        statuses = []
+        errors = []
+
+        def request():
+            client = APIClient()
+            client.force_authenticate(self.fan)
+            barrier.wait()
+            try:
+                statuses.append(getattr(client, method)(path).status_code)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=request) for _ in range(self.clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        return statuses
+
+    def test_concurrent_likes(self):
+        statuses = self.hammer('post', f'/api/posts/posts/{self.post.pk}/like/')
+        self.assertEqual(statuses.count(201), 1)
+        self.assertEqual(statuses.count(200), self.clients - 1)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(Like.objects.filter(post=self.post).count(), 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.author).count(), 1)
+
+    def test_concurrent_unlikes(self):
+        if connection.vendor == 'sqlite':
+            self.skipTest('SQLite cannot upgrade concurrent read transactions to writes')
+        Like.objects.create(post=self.post, user=self.fan)
+        statuses = self.hammer('post', f'/api/posts/posts/{self.post.pk}/unlike/')
+        self.assertEqual(statuses, [200] * self.clients)
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(Like.objects.filter(post=self.post).exists())
@@ -1,6 +1,9 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PostViewSet, CommentViewSet, LikeViewSet, FeedView, LikePostAPIView, UnlikePostAPIView
+from .views import (
+    PostViewSet, CommentViewSet, LikeViewSet, FeedView, LikePostAPIView, UnlikePostAPIView,
+    ExportView, ImportView
+)
 
 router = DefaultRouter()
 router.register(r'posts', PostViewSet, basename='post')
@@ -10,6 +13,8 @@ router.register(r'likes', LikeViewSet, basename='like')
 urlpatterns = [
     path('', include(router.urls)),
     path('feed/', FeedView.as_view(), name='feed'),
+    path('export/', ExportView.as_view(), name='posts-export'),
+    path('import/', ImportView.as_view(), name='posts-import'),
     
     # Explicit URL patterns for liking and unliking posts
     # Use the exact patterns the checker expects: <int:pk>/like/ and <int:pk>/unlike/
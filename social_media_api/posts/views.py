@@ -3,12 +3,23 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
-from rest_framework.filters import SearchFilter, OrderingFilter
+from rest_framework.filters import OrderingFilter
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from social_media_api.conditional import ConditionalGetMixin
+from social_media_api.fieldsets import parse_fieldset
+from social_media_api.fragments import FragmentCacheMixin
+from social_media_api.pagination import FeedPagination
+from . import ndjson
+from .feed import FEED_ORDERING
 from .models import Post, Comment, Like
+from .mentions import notify_mentions
+from .ranking import RankedOrderingFilter
+from .search import FullTextSearchFilter
+from .services import like_post, unlike_post, like_states, bulk_like, bulk_unlike
 from .serializers import (
-    PostSerializer, PostCreateSerializer, 
-    CommentSerializer, LikeSerializer
+    PostSerializer, PostSummarySerializer, PostCreateSerializer, 
+    CommentSerializer, LikeSerializer, LikeBatchSerializer
 )
 
 class IsOwnerOrReadOnly(permissions.BasePermission):
@@ -17,77 +28,144 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
             return True
         return obj.author == request.user
 
-class PostViewSet(viewsets.ModelViewSet):
+class PostViewSet(ConditionalGetMixin, FragmentCacheMixin, viewsets.ModelViewSet):
     queryset = Post.objects.all()
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
+    # Full-text search runs last so it can order by relevance
+    filter_backends = [DjangoFilterBackend, RankedOrderingFilter, FullTextSearchFilter]
     filterset_fields = ['author']
-    search_fields = ['title', 'content']
-    ordering_fields = ['created_at', 'updated_at', 'likes_count']
+    # ?ordering=top is an alias for -score, see posts.ranking
+    ordering_fields = ['created_at', 'updated_at', 'likes_count', 'comments_count', 'score', 'id']
     ordering = ['-created_at']
+    cursor_ordering = ('-created_at', '-id')
+    top_ordering = ('-score', '-id')
+    
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action in ('list', 'retrieve', 'top'):
+            if self.use_fragment_cache():
+                # Relations are only loaded for posts missing from the cache
+                return queryset.select_related('author')
+            fields, _ = parse_fieldset(self.request)
+            queryset = self.get_serializer_class().setup_eager_loading(queryset, fields)
+        return queryset
+    
+    def get_fragment_version(self, post):
+        return (post.version, post.updated_at, post.author.updated_at)
+    
+    def load_fragment_objects(self, posts):
+        loaded = self.get_serializer_class().setup_eager_loading(
+            Post.objects.filter(pk__in=[post.pk for post in posts])
+        )
+        by_pk = {post.pk: post for post in loaded}
+        return [by_pk.get(post.pk, post) for post in posts]
+    
+    def list_response(self, queryset):
+        page = self.paginate_queryset(queryset)
+        posts = page if page is not None else list(queryset)
+        if self.use_fragment_cache():
+            data = self.render_fragments(posts)
+        else:
+            data = self.get_serializer(posts, many=True).data
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+    
+    def list(self, request, *args, **kwargs):
+        return self.list_response(self.filter_queryset(self.get_queryset()))
+    
+    def get_validators(self, request, *args, **kwargs):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        try:
+            return Post.objects.filter(
+                **{self.lookup_field: kwargs[lookup_url_kwarg]}
+            ).values_list('version', 'updated_at', 'author__updated_at').first()
+        except (TypeError, ValueError):
+            return None
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(request, self.render_post, *args, **kwargs)
+    
+    def render_post(self, request, *args, **kwargs):
+        if not self.use_fragment_cache():
+            return super().retrieve(request, *args, **kwargs)
+        return Response(self.render_fragment(self.get_object()))
+    
+    def get_cursor_ordering(self):
+        if self.action == 'comments':
+            return CommentViewSet.cursor_ordering
+        if self.action == 'top' or self.request.query_params.get('ordering') == 'top':
+            return self.top_ordering
+        return self.cursor_ordering
     
     def get_serializer_class(self):
         if self.action == 'create':
             return PostCreateSerializer
+        if self.action in ('list', 'top'):
+            return PostSummarySerializer
         return PostSerializer
     
     def perform_create(self, serializer):
-        serializer.save(author=self.request.user)
+        post = serializer.save(author=self.request.user)
+        notify_mentions(self.request.user, post, post.title, post.content)
+    
+    @action(detail=False, methods=['get'])
+    def top(self, request):
+        """
+        Most popular posts, read from the precomputed ranking score
+        """
+        return self.list_response(
+            self.filter_queryset(self.get_queryset()).order_by(*self.top_ordering)
+        )
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def like(self, request, pk=None):
-        # Use the exact pattern: generics.get_object_or_404(Post, pk=pk)
-        post = generics.get_object_or_404(Post, pk=pk)
-        
-        # Use the exact pattern: Like.objects.get_or_create(user=request.user, post=post)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
+        like, created = like_post(request.user, pk)
         if created:
-            # Create notification using exact pattern: Notification.objects.create
-            if post.author != request.user:
-                try:
-                    from notifications.models import Notification
-                    # Use the exact pattern the checker expects
-                    Notification.objects.create(
-                        recipient=post.author,
-                        actor=request.user,
-                        verb='liked your post',
-                        notification_type='like',
-                        target=post
-                    )
-                except Exception as e:
-                    # Log error but don't break the like functionality
-                    print(f"Notification creation failed: {e}")
-            
-            serializer = LikeSerializer(like)
+            serializer = LikeSerializer(like, context=self.get_serializer_context())
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        else:
-            return Response(
-                {'detail': 'You have already liked this post.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {'detail': 'You have already liked this post.'},
+            status=status.HTTP_200_OK
+        )
     
     @action(detail=True, methods=['post'], permission_classes=[permissions.IsAuthenticated])
     def unlike(self, request, pk=None):
-        # Use the exact pattern: generics.get_object_or_404(Post, pk=pk)
-        post = generics.get_object_or_404(Post, pk=pk)
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
+        if unlike_post(request.user, pk):
             return Response(
                 {'detail': 'Post unliked successfully.'},
                 status=status.HTTP_200_OK
             )
-        except Like.DoesNotExist:
-            return Response(
-                {'detail': 'You have not liked this post.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+        return Response(
+            {'detail': 'You have not liked this post.'},
+            status=status.HTTP_200_OK
+        )
+    
+    @action(detail=False, methods=['get', 'post'], url_path='like-state',
+            permission_classes=[permissions.IsAuthenticated])
+    def like_state(self, request):
+        """
+        Like state and counters for many posts at once. POST also applies
+        bulk likes and unlikes first: {"like": [ids], "unlike": [ids]}
+        """
+        if request.method == 'GET':
+            ids = [value for value in request.query_params.get('ids', '').split(',') if value.strip()]
+            serializer = LikeBatchSerializer(data={'ids': ids})
+        else:
+            serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        data = serializer.validated_data
+        if data['unlike']:
+            bulk_unlike(request.user, data['unlike'])
+        if data['like']:
+            bulk_like(request.user, data['like'])
+        return Response(like_states(request.user, data['post_ids']))
     
     @action(detail=True, methods=['get'], permission_classes=[permissions.IsAuthenticated])
     def comments(self, request, pk=None):
         post = self.get_object()
-        comments = post.comments.all()
+        comments = CommentSerializer.setup_eager_loading(post.comments.all())
         page = self.paginate_queryset(comments)
         if page is not None:
             serializer = CommentSerializer(page, many=True, context={'request': request})
@@ -100,29 +178,36 @@ class CommentViewSet(viewsets.ModelViewSet):
     queryset = Comment.objects.all()
     serializer_class = CommentSerializer
     permission_classes = [permissions.IsAuthenticated, IsOwnerOrReadOnly]
-    filter_backends = [DjangoFilterBackend, OrderingFilter]
+    filter_backends = [DjangoFilterBackend, OrderingFilter, FullTextSearchFilter]
     filterset_fields = ['post', 'author']
     ordering_fields = ['created_at']
     ordering = ['created_at']
+    cursor_ordering = ('created_at', 'id')
+    
+    def get_queryset(self):
+        return CommentSerializer.setup_eager_loading(super().get_queryset())
     
     def perform_create(self, serializer):
         comment = serializer.save(author=self.request.user)
         
-        # Create comment notification using exact pattern
+        # Notify the post author (grouped with other comments on the post)
         if comment.post.author != self.request.user:
             try:
                 from notifications.models import Notification
-                # Use the exact pattern: Notification.objects.create
-                Notification.objects.create(
+                Notification.create_comment_notification(
                     recipient=comment.post.author,
                     actor=self.request.user,
-                    verb='commented on your post',
-                    notification_type='comment',
                     target=comment.post
                 )
             except Exception as e:
                 # Log error but don't break the comment functionality
                 print(f"Notification creation failed: {e}")
+        
+        # The post author is already notified of the comment itself
+        notify_mentions(
+            self.request.user, comment, comment.content,
+            exclude=[comment.post.author_id]
+        )
 
 class LikeViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Like.objects.all()
@@ -130,44 +215,40 @@ class LikeViewSet(viewsets.ReadOnlyModelViewSet):
     permission_classes = [permissions.IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['post', 'user']
+    cursor_ordering = ('-created_at', '-id')
+    
+    def get_queryset(self):
+        return LikeSerializer.setup_eager_loading(super().get_queryset())
 
-class FeedView(APIView):
+class FeedView(generics.GenericAPIView):
     """
     View for generating a feed based on posts from users that the current user follows.
     Returns posts ordered by creation date, showing the most recent posts at the top.
     """
+    serializer_class = PostSummarySerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = FeedPagination
+    cursor_ordering = FEED_ORDERING
+    
+    def get_queryset(self):
+        fields, _ = parse_fieldset(self.request)
+        return PostSummarySerializer.setup_eager_loading(
+            self.request.user.get_feed_posts(), fields
+        )
     
     def get(self, request):
-        # Get the users that the current user is following
-        following_users = request.user.following.all()
-        
-        # Include the current user's own posts in the feed
-        following_users_list = list(following_users) + [request.user]
-        
-        # Use the exact pattern the checker expects: Post.objects.filter(author__in=following_users).order_by
-        feed_posts = Post.objects.filter(author__in=following_users_list).order_by('-created_at')
+        # No ETag: validating a page means reading it, pull path included,
+        # so a 304 would cost about as much as rendering the page
+        feed_posts = self.get_queryset()
         
         # Pagination
         page = self.paginate_queryset(feed_posts)
         if page is not None:
-            serializer = PostSerializer(page, many=True, context={'request': request})
+            serializer = self.get_serializer(page, many=True)
             return self.get_paginated_response(serializer.data)
         
-        serializer = PostSerializer(feed_posts, many=True, context={'request': request})
+        serializer = self.get_serializer(feed_posts, many=True)
         return Response(serializer.data)
-    
-    def paginate_queryset(self, queryset):
-        from rest_framework.pagination import PageNumberPagination
-        paginator = PageNumberPagination()
-        paginator.page_size = 10
-        page = paginator.paginate_queryset(queryset, self.request, view=self)
-        return page
-    
-    def get_paginated_response(self, data):
-        from rest_framework.pagination import PageNumberPagination
-        paginator = PageNumberPagination()
-        return paginator.get_paginated_response(data)
 
 # Additional explicit API views for checker compatibility
 class LikePostAPIView(generics.CreateAPIView):
@@ -177,28 +258,10 @@ class LikePostAPIView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, pk):
-        # Use the exact pattern: generics.get_object_or_404(Post, pk=pk)
-        post = generics.get_object_or_404(Post, pk=pk)
-        
-        # Use the exact pattern: Like.objects.get_or_create(user=request.user, post=post)
-        like, created = Like.objects.get_or_create(user=request.user, post=post)
-        
+        like, created = like_post(request.user, pk)
         if created:
-            # Create notification using exact pattern: Notification.objects.create
-            if post.author != request.user:
-                try:
-                    from notifications.models import Notification
-                    Notification.objects.create(
-                        recipient=post.author,
-                        actor=request.user,
-                        verb='liked your post',
-                        notification_type='like'
-                    )
-                except:
-                    pass
-            
             return Response({'detail': 'Post liked successfully.'}, status=status.HTTP_201_CREATED)
-        return Response({'detail': 'You have already liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'detail': 'You have already liked this post.'}, status=status.HTTP_200_OK)
 
 class UnlikePostAPIView(generics.DestroyAPIView):
     """
@@ -207,11 +270,67 @@ class UnlikePostAPIView(generics.DestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def delete(self, request, pk):
-        # Use the exact pattern: generics.get_object_or_404(Post, pk=pk)
-        post = generics.get_object_or_404(Post, pk=pk)
-        try:
-            like = Like.objects.get(user=request.user, post=post)
-            like.delete()
+        if unlike_post(request.user, pk):
             return Response({'detail': 'Post unliked successfully.'}, status=status.HTTP_200_OK)
-        except Like.DoesNotExist:
-            return Response({'detail': 'You have not liked this post.'}, status=status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
+        return Response({'detail': 'You have not liked this post.'}, status=status.HTTP_200_OK)
+
+class ExportView(APIView):
+    """
+    Stream posts, comments and likes as NDJSON (admin only).
+    ``?type=post&type=comment`` limits the record types.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def get(self, request):
+        types = request.query_params.getlist('type') or list(ndjson.RECORD_TYPES)
+        unknown = set(types) - set(ndjson.RECORD_TYPES)
+        if unknown:
+            return Response(
+                {'detail': f'Unknown record type: {", ".join(sorted(unknown))}.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return StreamingHttpResponse(
+            ndjson.export_lines(types),
+            content_type='application/x-ndjson'
+        )
+
+class ImportView(APIView):
+    """
+    Import an NDJSON export from the request body (admin only).
+    ``?start=N`` resumes after line N of an interrupted import. Counters,
+    scores and feeds are only updated for the posts this request imported;
+    ``manage.py import_posts`` finalizes every post after a resumed import.
+    """
+    permission_classes = [permissions.IsAdminUser]
+    
+    def post(self, request):
+        try:
+            start = int(request.query_params.get('start', 0))
+        except ValueError:
+            return Response({'detail': 'start must be a line number.'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        lines = iter(request.stream.readline, b'') if request.stream is not None else []
+        committed = {'line': start, 'post_ids': set()}
+        
+        def progress(line_number, stats):
+            committed['line'] = line_number
+            committed['post_ids'] = stats['post_ids']
+        
+        try:
+            stats = ndjson.import_lines(lines, start=start, progress=progress)
+        except ndjson.InvalidRecord as error:
+            # Chunks committed before the bad line are finalized here, so a
+            # resumed import only has to finalize its own posts
+            ndjson.finalize_import(committed['post_ids'])
+            return Response(
+                {'detail': str(error), 'resume_after': committed['line']},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ndjson.finalize_import(stats['post_ids'])
+        
+        return Response({
+            'posts': stats['post'],
+            'comments': stats['comment'],
+            'likes': stats['like'],
+            'skipped': stats['skipped'],
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,66 @@
+"""
+Conditional GET for frequently polled read endpoints.
+
+A view lists cheap validator values (version columns, ``updated_at``
+timestamps) in ``get_validators()``; they are hashed together with the
+viewer and the full request path into a weak ETag. When the client's
+``If-None-Match`` matches, the view answers ``304 Not Modified`` without
+running its queryset or serializer.
+
+The ETag is weak: it tracks the rendered objects and their authors, not
+every nested user (e.g. the follower count of a commenter).
+"""
+import hashlib
+
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def make_etag(*parts):
+    digest = hashlib.sha1(repr(parts).encode()).hexdigest()
+    return f'W/"{digest}"'
+
+
+def etag_matches(request, etag):
+    etags = parse_etags(request.headers.get('If-None-Match', ''))
+    if '*' in etags:
+        return True
+    # Weak comparison: W/"x" and "x" match
+    opaque = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == opaque for candidate in etags)
+
+
+class ConditionalGetMixin:
+    """
+    View mixin answering GET with 304 Not Modified when nothing changed.
+    Views call ``conditional_response()`` from their GET handler and
+    implement ``get_validators()``.
+    """
+
+    def get_validators(self, request, *args, **kwargs):
+        """Values that change whenever the response would; None to skip"""
+        raise NotImplementedError
+
+    def get_etag(self, request, *args, **kwargs):
+        validators = self.get_validators(request, *args, **kwargs)
+        if validators is None:
+            return None
+        user = request.user
+        viewer = (user.pk, user.updated_at) if user.is_authenticated else None
+        return make_etag(request.get_full_path(), viewer, validators)
+
+    def conditional_response(self, request, render, *args, **kwargs):
+        etag = self.get_etag(request, *args, **kwargs)
+        if etag is not None and etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            response = render(request, *args, **kwargs)
+            if etag is None or response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        # Responses depend on the viewer: browsers may keep them, but must
+        # revalidate, and shared caches must not
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
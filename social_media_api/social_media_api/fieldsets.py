@@ -0,0 +1,99 @@
+"""
+Sparse fieldsets for read endpoints.
+
+``?fields=id,title,author.username`` limits a response to the listed
+fields; dotted names select fields of nested objects. When ``fields`` is
+given, a nested object named without sub-fields is rendered as its primary
+key unless it is also listed in ``?expand=``.
+"""
+from rest_framework import serializers
+from rest_framework.permissions import SAFE_METHODS
+
+FIELDS_PARAM = 'fields'
+EXPAND_PARAM = 'expand'
+
+
+def _split(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def parse_fieldset(request):
+    """
+    Return ``(fields, expand)`` for a request. ``fields`` is a nested dict of
+    requested names, or None when the client did not restrict the fields;
+    ``expand`` is a set of dotted paths.
+    """
+    if request is None or request.method not in SAFE_METHODS:
+        return None, set()
+
+    expand = set(_split(request.query_params.get(EXPAND_PARAM, '')))
+    requested = request.query_params.get(FIELDS_PARAM)
+    if not requested:
+        return None, expand
+
+    tree = {}
+    for path in _split(requested):
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    # Expanding a nested object implies requesting it
+    for path in expand:
+        node = tree
+        for name in path.split('.'):
+            node = node.setdefault(name, {})
+    return tree, expand
+
+
+def get_fieldset(context):
+    """Parsed fieldset shared by every serializer rendering with ``context``"""
+    if 'fieldset' not in context:
+        context['fieldset'] = parse_fieldset(context.get('request'))
+    return context['fieldset']
+
+
+def requested(fields, name):
+    """Whether a top-level field is part of the response"""
+    return fields is None or name in fields
+
+
+class SparseFieldsetMixin:
+    """Serializer mixin honouring ``?fields=`` and ``?expand=``"""
+
+    def _fieldset_path(self):
+        path = []
+        node = self
+        while node.parent is not None:
+            if node.field_name:
+                path.append(node.field_name)
+            node = node.parent
+        return list(reversed(path))
+
+    def get_fields(self):
+        fields = super().get_fields()
+        tree, expand = get_fieldset(self.context)
+        if tree is None:
+            return fields
+
+        path = self._fieldset_path()
+        for name in path:
+            tree = tree.get(name)
+            if not tree:
+                # Nested object requested as a whole: keep every field
+                return fields
+
+        prefix = '.'.join(path + [''])
+        for name in list(fields):
+            if name not in tree:
+                fields.pop(name)
+                continue
+            field = fields[name]
+            if tree[name] or f'{prefix}{name}' in expand:
+                continue
+            if isinstance(field, serializers.BaseSerializer):
+                kwargs = {'read_only': True}
+                if field.source and field.source != name:
+                    kwargs['source'] = field.source
+                if isinstance(field, serializers.ListSerializer):
+                    kwargs['many'] = True
+                fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+        return fields
@@ -0,0 +1,152 @@
+"""
+Read-through cache of viewer-independent representations.
+
+Posts and users are serialized once without a viewer and cached under keys
+built from their version columns (``Post.version``, ``updated_at``). The
+signals that keep those columns current on post, comment, like and follow
+changes therefore invalidate stale entries without deleting anything; old
+entries are evicted by the cache's LRU bound (``MAX_ENTRIES`` of the
+``fragments`` cache). Nested users that are not part of the key, such as
+commenters, may lag behind by up to FRAGMENT_CACHE_TIMEOUT seconds.
+
+Viewer-dependent flags (``is_liked``, ``is_following``, ...) are filled in
+by the serializer's ``add_viewer_state()`` after every read. Concurrent
+misses on one key within a process, from detail or list reads, are
+computed once (single flight).
+"""
+import hashlib
+import threading
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .fieldsets import parse_fieldset
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'FRAGMENT_CACHE_ALIAS', 'fragments')]
+
+
+def fragment_timeout():
+    return getattr(settings, 'FRAGMENT_CACHE_TIMEOUT', 60)
+
+
+def make_key(*parts):
+    return 'fragment:' + hashlib.sha1(repr(parts).encode()).hexdigest()
+
+
+_flights = {}
+_flights_lock = threading.Lock()
+
+
+@contextmanager
+def single_flight(key):
+    """Hold the lock of ``key`` so that only one thread recomputes it"""
+    with _flights_lock:
+        lock, holders = _flights.get(key, (threading.Lock(), 0))
+        _flights[key] = (lock, holders + 1)
+    try:
+        with lock:
+            yield
+    finally:
+        with _flights_lock:
+            lock, holders = _flights[key]
+            if holders == 1:
+                del _flights[key]
+            else:
+                _flights[key] = (lock, holders - 1)
+
+
+def get_or_set(key, compute):
+    cache = fragment_cache()
+    value = cache.get(key)
+    if value is None:
+        with single_flight(key):
+            # Another thread may have filled the key while we waited
+            value = cache.get(key)
+            if value is None:
+                value = compute()
+                cache.set(key, value, fragment_timeout())
+    return value
+
+
+def get_many_or_set(keys, compute_missing):
+    """
+    Cached values of ``keys`` in order; ``compute_missing(missing_keys)``
+    returns a dict with the values of the keys that were not cached.
+    """
+    cache = fragment_cache()
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        with ExitStack() as stack:
+            # Sorted, so that pages sharing keys cannot deadlock
+            for key in sorted(set(missing)):
+                stack.enter_context(single_flight(key))
+            # Other threads may have filled some keys while we waited
+            found.update(cache.get_many(missing))
+            missing = [key for key in missing if key not in found]
+            if missing:
+                computed = compute_missing(missing)
+                cache.set_many(computed, fragment_timeout())
+                found.update(computed)
+    return [found[key] for key in keys]
+
+
+class FragmentCacheMixin:
+    """
+    View mixin serving objects from cached viewer-independent
+    representations. Views implement ``get_fragment_version()`` and
+    ``load_fragment_objects()``; serializers implement
+    ``add_viewer_state()``.
+    """
+
+    def use_fragment_cache(self):
+        # Sparse fieldsets are cheap to render and would fragment the cache
+        fields, expand = parse_fieldset(self.request)
+        return fields is None and not expand
+
+    def get_fragment_version(self, instance):
+        """Values that change whenever the public representation does"""
+        raise NotImplementedError
+
+    def load_fragment_objects(self, instances):
+        """``instances`` with everything their serializer renders loaded"""
+        return instances
+
+    def get_fragment_key(self, instance):
+        return make_key(
+            self.get_serializer_class().__name__,
+            instance.pk,
+            self.get_fragment_version(instance),
+            self.request.build_absolute_uri('/')
+        )
+
+    def get_public_serializer(self, *args, **kwargs):
+        context = self.get_serializer_context()
+        # Resolvers see no viewer, leaving viewer flags at their defaults
+        context['public'] = True
+        return self.get_serializer_class()(*args, context=context, **kwargs)
+
+    def render_fragments(self, instances):
+        """Representations of ``instances`` for the current viewer"""
+        keys = [self.get_fragment_key(instance) for instance in instances]
+        by_key = dict(zip(keys, instances))
+
+        def compute_missing(missing):
+            objects = self.load_fragment_objects([by_key[key] for key in missing])
+            return dict(zip(missing, self.get_public_serializer(objects, many=True).data))
+
+        items = get_many_or_set(keys, compute_missing)
+        self.get_serializer().add_viewer_state(instances, items)
+        return items
+
+    def render_fragment(self, instance):
+        def compute():
+            [loaded] = self.load_fragment_objects([instance])
+            return self.get_public_serializer(loaded).data
+
+        item = get_or_set(self.get_fragment_key(instance), compute)
+        self.get_serializer().add_viewer_state([instance], [item])
+        return item
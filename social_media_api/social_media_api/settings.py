@@ -126,18 +126,17 @@ AUTH_USER_MODEL = 'accounts.CustomUser'
 # REST Framework configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'social_media_api.pagination.ApiPagination',
     'PAGE_SIZE': 20,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
-        'rest_framework.authentication.TokenAuthentication',
     ],
 }
 
@@ -149,6 +148,107 @@ SIMPLE_JWT = {
     'BLACKLIST_AFTER_ROTATION': True,
 }
 
+# Home feed settings
+# Authors with more followers than this are not fanned out on write;
+# their posts are pulled into followers' feeds at read time instead.
+FEED_FANOUT_MAX_FOLLOWERS = int(os.environ.get('FEED_FANOUT_MAX_FOLLOWERS', 10000))
+FEED_FANOUT_BATCH_SIZE = 1000
+# Number of an author's recent posts copied into a feed on follow
+FEED_BACKFILL_LIMIT = 200
+
+# Top posts ranking: engagement weights and seconds of age worth a tenfold
+# increase in engagement
+RANKING_LIKE_WEIGHT = 1
+RANKING_COMMENT_WEIGHT = 3
+RANKING_DECAY_SECONDS = 45000
+
+# Cache configuration. The local memory cache is private to each process,
+# so deployments running several workers must set REDIS_URL for cached data
+# (e.g. per-user liked post sets, see posts.likes) to stay in sync. Redis
+# should run with an LRU maxmemory-policy; locally, entries beyond
+# MAX_ENTRIES are culled.
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'social-media-api',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', 10000)),
+                'CULL_FREQUENCY': 4,
+            },
+        }
+    }
+
+# Viewer-independent post and user representations (see
+# social_media_api.fragments). Keys are versioned by database columns, so a
+# per-process, LRU-bounded cache stays correct with several workers.
+CACHES['fragments'] = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'fragments',
+    'OPTIONS': {
+        'MAX_ENTRIES': int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 5000)),
+        'CULL_FREQUENCY': 4,
+    },
+}
+FRAGMENT_CACHE_TIMEOUT = 60
+
+# Liked post ids cached per user, and for how long (seconds)
+LIKED_POSTS_CACHE_SIZE = 5000
+LIKED_POSTS_CACHE_TIMEOUT = 6 * 60 * 60
+
+# Maximum number of post ids accepted by /api/posts/posts/like-state/
+LIKE_BATCH_MAX_POSTS = 300
+
+# Profile pictures are resized by the process_profile_pictures worker into
+# square variants of these sizes (pixels), in WEBP or JPEG
+PROFILE_PICTURE_SIZES = {'small': 64, 'medium': 256}
+PROFILE_PICTURE_FORMAT = 'WEBP'
+PROFILE_PICTURE_MAX_UPLOAD_SIZE = 10 * 1024 * 1024
+PROFILE_PICTURE_MAX_PIXELS = 40_000_000
+
+# Users resolved by accounts.authentication.CachedJWTAuthentication are cached
+# for AUTH_USER_CACHE_TIMEOUT seconds in the shared cache, and for
+# AUTH_USER_CACHE_LOCAL_TIMEOUT seconds in each process (at most
+# AUTH_USER_CACHE_LOCAL_SIZE users)
+AUTH_USER_CACHE_TIMEOUT = 300
+AUTH_USER_CACHE_LOCAL_TIMEOUT = 5
+AUTH_USER_CACHE_LOCAL_SIZE = 1000
+
+# Maximum number of users followed per /api/auth/follow/bulk/ request
+FOLLOW_BATCH_MAX_USERS = 100
+
+# "Who to follow" suggestions stored per user by refresh_follow_suggestions
+FOLLOW_SUGGESTIONS_PER_USER = 20
+# Seconds after which refresh_follow_suggestions rebuilds every user's
+# suggestions instead of only the changed ones
+FOLLOW_SUGGESTIONS_FULL_REFRESH_INTERVAL = 24 * 60 * 60
+
+# Likes, comments and follows of one target within NOTIFICATION_GROUP_WINDOW
+# seconds share one notification while it is unread, which keeps the last
+# NOTIFICATION_GROUP_RECENT_ACTORS actor ids
+NOTIFICATION_GROUP_WINDOW = 24 * 60 * 60
+NOTIFICATION_GROUP_RECENT_ACTORS = 5
+
+# Maximum number of users notified of an @mention per post or comment
+MENTIONS_MAX_PER_WRITE = 20
+
+# /api/auth/users/autocomplete/ returns at most USER_AUTOCOMPLETE_MAX_RESULTS
+# users; matches of prefixes up to USER_AUTOCOMPLETE_CACHE_PREFIX_LENGTH
+# characters are cached for USER_AUTOCOMPLETE_CACHE_TIMEOUT seconds
+USER_AUTOCOMPLETE_MAX_RESULTS = 10
+USER_AUTOCOMPLETE_CACHE_PREFIX_LENGTH = 3
+USER_AUTOCOMPLETE_CACHE_TIMEOUT = 60
+
+# Text search configuration used by the PostgreSQL full-text index
+SEARCH_TEXT_CONFIG = 'english'
+
 # CORS settings
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",